@@ -0,0 +1,61 @@
+"""Render time vs object count, linear scan vs BVH.
+
+Renders a field of random spheres and triangles over a plane with the
+wavefront engine, once with the linear scan and once with `accel='bvh'`.
+
+    python benchmarks/bvh_scaling.py [width] [height]
+"""
+import sys
+import time
+
+import numpy as np
+from spritz import *
+
+COUNTS = (10, 100, 1000, 5000, 20000)
+LINEAR_LIMIT = 5000 # the linear scan gets too slow to bother past this
+
+def build(count, accel):
+    """Random scene with `count` spheres and `count` triangles."""
+    rng = np.random.default_rng(246)
+    scene = Scene(background_color=BLACK, max_bounces=1, engine='wavefront', accel=accel)
+    scene.change_camera(Camera(eye=(0, -40, 15), direction=(0, 1, -0.35), fov=70))
+    scene.add_light(PointLight((0, -10, 30), (900, 900, 900)))
+    scene.add_light(AmbientLight((0.2, 0.2, 0.2)))
+
+    matte = Material((0.1, 0.1, 0.1), (0.6, 0.5, 0.4), (0, 0, 0), 0)
+    glossy = Material((0.1, 0.1, 0.1), (0.3, 0.4, 0.6), (0.4, 0.4, 0.4), 64)
+    scene.add_surface(Plane((0, 0, 1), (0, 0, -12), matte))
+
+    extent = 10 * np.cbrt(count / 10)
+    for _ in range(count):
+        center = rng.uniform(-extent, extent, 3)
+        scene.add_surface(Sphere(center, rng.uniform(0.2, 0.8), glossy))
+        a = rng.uniform(-extent, extent, 3)
+        scene.add_surface(Triangle(a, a + rng.uniform(-1, 1, 3), a + rng.uniform(-1, 1, 3), matte))
+    return scene
+
+def timed_render(scene, width, height):
+    start = time.perf_counter()
+    scene.compile()
+    built = time.perf_counter()
+    scene.render(width, height)
+    end = time.perf_counter()
+    return built - start, end - built
+
+if __name__ == "__main__":
+    width = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    height = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    # Compile the kernels before timing anything
+    build(10, None).render(8, 8)
+    build(10, 'bvh').render(8, 8)
+
+    print(f"{width}x{height}, 1 bounce, 1 point light")
+    print(f"{'objects':>8} | {'linear (s)':>10} | {'bvh compile (s)':>15} | {'bvh (s)':>8} | {'speedup':>7}")
+    for count in COUNTS:
+        _, linear = timed_render(build(count, None), width, height) if count <= LINEAR_LIMIT else (0, None)
+        build_time, bvh = timed_render(build(count, 'bvh'), width, height)
+
+        linear_col = f"{linear:10.3f}" if linear is not None else f"{'-':>10}"
+        speedup_col = f"{linear / bvh:6.1f}x" if linear is not None else f"{'-':>7}"
+        print(f"{2 * count:8d} | {linear_col} | {build_time:15.3f} | {bvh:8.3f} | {speedup_col}")
@@ -1,3 +1,5 @@
+from . import jit # sets up the kernel cache, before any kernel is defined
+
 from .camera import (
     Camera
 )
@@ -20,6 +22,7 @@ from .lighting import (
     Light,
     PointLight,
     AmbientLight,
+    LightManager,
 )
 
 from .materials import (
@@ -36,18 +39,35 @@ from .surfaces import (
     Sphere,
     Triangle,
     Plane,
+    TriangleMesh,
+    Instance,
+)
+
+from .loaders import (
+    load_mesh,
+    load_obj,
+    load_ply,
 )
 
 from .scene import (
     Scene,
+    CompiledScene,
+    EnvironmentMap,
+)
+
+from .engine import (
+    RenderStats,
+    VisibilityCache,
 )
 
 __all__ = [
     'Camera',
     'Color', 'WHITE', 'GRAY', 'BLACK', 'RED', 'ORANGE', 'YELLOW', 'GREEN', 'BLUE', 'INDIGO', 'VIOLET',
-    'Light', 'PointLight', 'AmbientLight',
+    'Light', 'PointLight', 'AmbientLight', 'LightManager',
     'Material',
     'Intersection', 'Ray',
-    'Surface', 'SurfaceGroup', 'Sphere', 'Triangle', 'Plane',
-    'Scene',
+    'Surface', 'SurfaceGroup', 'Sphere', 'Triangle', 'Plane', 'TriangleMesh', 'Instance',
+    'load_mesh', 'load_obj', 'load_ply',
+    'Scene', 'CompiledScene', 'EnvironmentMap',
+    'RenderStats', 'VisibilityCache',
 ]
\ No newline at end of file
@@ -0,0 +1,282 @@
+"""Standard benchmark suite.
+
+Renders a fixed set of scenes with the wavefront engine and reports, per
+scene, the steady-state render time, the time spent compiling kernels,
+and primary, shadow and secondary rays per second, as JSON. A run can be
+compared against a saved baseline to flag regressions.
+
+    spritz bench --output baseline.json
+    spritz bench --baseline baseline.json      # exits with 1 on a regression
+
+Scenes:
+    basic: the spheres, plane and mirror triangle of test.py, 2 bounces
+    spheres: 2000 random spheres over a plane, BVH
+    mesh: a 180k triangle height field, BVH
+    lights: a few surfaces lit by 64 point lights
+    bounces: a box of mirror spheres, 8 bounces
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numba
+import numpy as np
+from numba.core import event
+
+from .camera import Camera
+from .colors import BLACK
+from .engine import RenderStats
+from .engine.buffers import PRECISIONS
+from .lighting import PointLight, AmbientLight
+from .materials import Material
+from .scene import Scene
+from .surfaces import Sphere, Plane, Triangle, TriangleMesh
+
+TOLERANCE = 0.1 # slowdown (as a fraction) flagged as a regression
+
+RED = Material((0.1, 0.0, 0.0), (0.8, 0.1, 0.1), (0.0, 0.0, 0.0), 0)
+GOLD = Material((0.05, 0.04, 0.0), (0.83, 0.68, 0.21), (0.9, 0.8, 0.4), 128)
+MIRROR = Material((0.0, 0.0, 0.1), (0.0, 0.0, 0.2), (1.0, 1.0, 1.0), 256)
+FLOOR = Material((0.3, 0.3, 0.3), (1.0, 1.0, 1.0), (1.0, 1.0, 1.0), 64)
+MATTE = Material((0.1, 0.1, 0.1), (0.6, 0.5, 0.4), (0.0, 0.0, 0.0), 0)
+GLOSSY = Material((0.1, 0.1, 0.1), (0.3, 0.4, 0.6), (0.4, 0.4, 0.4), 64)
+
+def basic_scene():
+    scene = Scene(background_color=BLACK, max_bounces=2, engine='wavefront')
+    scene.change_camera(Camera(eye=(4, 8, 1.5), direction=(-1, -3, -0.5)))
+    scene.add_light(PointLight((10, 3, 0), (25, 25, 25)))
+    scene.add_light(PointLight((-2, 0, 5), (25, 25, 25)))
+    scene.add_light(AmbientLight((0.5, 0.5, 0.5)))
+    scene.add_surface(Sphere((0, 0, 0), 2, RED))
+    scene.add_surface(Sphere((5, 0, 0), 2, GOLD))
+    scene.add_surface(Plane((0, 0, 1), (0, 0, -2), FLOOR))
+    scene.add_surface(Triangle(a=(-3, 2, 3), c=(-1.5, 5, 5), b=(-2, 7, 2), material=MIRROR))
+    return scene
+
+def spheres_scene(count=2000):
+    rng = np.random.default_rng(246)
+    scene = Scene(background_color=BLACK, max_bounces=1, engine='wavefront', accel='bvh')
+    scene.change_camera(Camera(eye=(0, -40, 15), direction=(0, 1, -0.35), fov=70))
+    scene.add_light(PointLight((0, -10, 30), (900, 900, 900)))
+    scene.add_light(AmbientLight((0.2, 0.2, 0.2)))
+    scene.add_surface(Plane((0, 0, 1), (0, 0, -12), MATTE))
+    for _ in range(count):
+        scene.add_surface(Sphere(rng.uniform(-12, 12, 3), rng.uniform(0.2, 0.8), GLOSSY))
+    return scene
+
+def mesh_scene(resolution=300):
+    """Height field of 2 * resolution^2 triangles"""
+    xs = np.linspace(-10, 10, resolution + 1)
+    x, y = np.meshgrid(xs, xs)
+    z = np.sin(x) * np.cos(0.7 * y) + 0.1 * np.sin(5 * x + 3 * y)
+    vertices = np.stack((x, y, z), axis=-1).reshape(-1, 3)
+
+    corner = (np.arange(resolution)[:, None] * (resolution + 1) + np.arange(resolution)).ravel()
+    right, below = corner + 1, corner + resolution + 1
+    faces = np.concatenate((
+        np.stack((corner, right, below + 1), axis=1),
+        np.stack((corner, below + 1, below), axis=1),
+    ))
+
+    scene = Scene(background_color=BLACK, max_bounces=1, engine='wavefront', accel='bvh')
+    scene.change_camera(Camera(eye=(0, -14, 8), direction=(0, 1, -0.6), fov=80))
+    scene.add_light(PointLight((5, -5, 10), (150, 150, 150)))
+    scene.add_light(AmbientLight((0.2, 0.2, 0.2)))
+    scene.add_surface(TriangleMesh(vertices, faces, GLOSSY))
+    return scene
+
+def lights_scene(count=64):
+    rng = np.random.default_rng(246)
+    scene = basic_scene()
+    scene.max_bounces = 1
+    scene.lights = [AmbientLight((0.1, 0.1, 0.1))]
+    for _ in range(count):
+        center = rng.uniform((-10, -10, 1), (10, 10, 10))
+        scene.add_light(PointLight(center, rng.uniform(0, 4, 3)))
+    return scene
+
+def bounces_scene(bounces=8):
+    scene = Scene(background_color=BLACK, max_bounces=bounces, engine='wavefront')
+    scene.change_camera(Camera(eye=(0, -7, 1), direction=(0, 1, -0.1), fov=90))
+    scene.add_light(PointLight((0, 0, 6), (60, 60, 60)))
+    scene.add_light(AmbientLight((0.1, 0.1, 0.1)))
+    for normal, point in (((0, 0, 1), (0, 0, -3)), ((0, 0, -1), (0, 0, 8)), ((1, 0, 0), (-8, 0, 0)),
+                          ((-1, 0, 0), (8, 0, 0)), ((0, -1, 0), (0, 8, 0))):
+        scene.add_surface(Plane(normal, point, MIRROR))
+    for x in (-4, 0, 4):
+        for y in (-1, 3):
+            scene.add_surface(Sphere((x, y, 0), 1.5, GOLD))
+    return scene
+
+SCENES = {
+    'basic': basic_scene,
+    'spheres': spheres_scene,
+    'mesh': mesh_scene,
+    'lights': lights_scene,
+    'bounces': bounces_scene,
+}
+
+def import_seconds():
+    """Time a fresh interpreter takes to import spritz, which compiles or loads every eager kernel"""
+    code = "import time; t = time.perf_counter(); import spritz; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+    return float(out.split()[-1])
+
+def bench_scene(scene, width, height, repeat=3, workers=1):
+    """Benchmark one scene.
+
+    The first render (which packs the scene and compiles anything that
+    isn't cached yet) is reported separately, the best of `repeat` later
+    renders is the steady-state time. One more render collects RenderStats.
+
+    Returns:
+        dict: timings, ray counts and rays per second
+    """
+    jit = []
+    with event.install_timer('numba:compile', jit.append):
+        start = time.perf_counter()
+        scene.compile()
+        built = time.perf_counter()
+        scene.render(width, height, workers=workers)
+        first = time.perf_counter()
+
+        times = []
+        for _ in range(repeat):
+            start_render = time.perf_counter()
+            scene.render(width, height, workers=workers)
+            times.append(time.perf_counter() - start_render)
+
+    # Counted separately so the timed renders don't pay for counting
+    stats = RenderStats()
+    scene.render(width, height, workers=workers, stats=stats)
+
+    wall = min(times)
+    result = {
+        'wall_seconds': wall,
+        'first_seconds': first - built,
+        'build_seconds': built - start,
+        'jit_seconds': sum(jit),
+    }
+    for name in ('primary_rays', 'shadow_rays', 'secondary_rays'):
+        result[name] = getattr(stats, name)
+        result[f'{name}_per_second'] = getattr(stats, name) / wall
+    result['rays_per_second'] = stats.rays / wall
+    result['stats'] = stats.as_dict()
+    return result
+
+def run(scenes=None, width=256, height=256, repeat=3, workers=1, precision='float64'):
+    """Run the suite.
+
+    Args:
+        scenes (list[str], optional): names from SCENES, defaults to all of them
+        width (int, optional): image width. Defaults to 256.
+        height (int, optional): image height. Defaults to 256.
+        repeat (int, optional): timed renders per scene. Defaults to 3.
+        workers (int, optional): render threads, see `Scene.render`. Defaults to 1.
+        precision (str, optional): see `Scene`. Defaults to 'float64'.
+
+    Returns:
+        dict: machine and settings, and a result per scene
+    """
+    scenes = list(SCENES) if scenes is None else scenes
+    unknown = set(scenes) - set(SCENES)
+    if unknown:
+        raise ValueError(f"Unknown benchmark scenes {sorted(unknown)}, expected some of {list(SCENES)}")
+
+    def build(name):
+        scene = SCENES[name]()
+        scene.precision = precision
+        return scene
+
+    return {
+        'python': platform.python_version(),
+        'numba': numba.__version__,
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'width': width,
+        'height': height,
+        'repeat': repeat,
+        'workers': workers,
+        'precision': precision,
+        'import_seconds': import_seconds(),
+        'scenes': {name: bench_scene(build(name), width, height, repeat, workers) for name in scenes},
+    }
+
+def compare(result, baseline, tolerance=TOLERANCE):
+    """Regressions of a run against a baseline run.
+
+    A scene regresses when its steady-state time grows, or its rays per
+    second drop, by more than `tolerance`. Scenes missing from either run
+    are skipped.
+
+    Raises:
+        ValueError: if the runs used different image sizes, worker counts or precisions
+
+    Returns:
+        list[str]: one message per regression, empty if there are none
+    """
+    # Reports from before the precision option are float64 runs
+    defaults = {'precision': 'float64'}
+    for key in ('width', 'height', 'workers', 'precision'):
+        now, before = result.get(key, defaults.get(key)), baseline.get(key, defaults.get(key))
+        if now != before:
+            raise ValueError(f"Can't compare runs with different {key}: {now} vs {before}")
+
+    regressions = []
+    for name, now in result['scenes'].items():
+        before = baseline.get('scenes', {}).get(name)
+        if before is None:
+            continue
+        if now['wall_seconds'] > before['wall_seconds'] * (1 + tolerance):
+            regressions.append(f"{name}: {now['wall_seconds']:.3f}s, was {before['wall_seconds']:.3f}s")
+        for key in ('primary_rays_per_second', 'shadow_rays_per_second', 'secondary_rays_per_second'):
+            if before.get(key) and now[key] < before[key] * (1 - tolerance):
+                regressions.append(f"{name}: {key} {now[key]:.4g}, was {before[key]:.4g}")
+    return regressions
+
+def add_arguments(parser):
+    parser.add_argument('--scenes', help=f"comma separated scenes out of {','.join(SCENES)}, defaults to all")
+    parser.add_argument('--size', default='256x256', help="image size as WIDTHxHEIGHT (default 256x256)")
+    parser.add_argument('--repeat', type=int, default=3, help="timed renders per scene (default 3)")
+    parser.add_argument('--workers', type=int, default=1, help="render threads, 0 for one per core (default 1)")
+    parser.add_argument('--precision', default='float64', choices=PRECISIONS,
+                        help="float type of the render (default float64)")
+    parser.add_argument('--output', help="also write the JSON report to this file")
+    parser.add_argument('--baseline', help="JSON report of an earlier run to compare against")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help=f"slowdown flagged as a regression (default {TOLERANCE})")
+
+def run_command(args):
+    """Run the suite from parsed arguments, print the report. Returns the exit status."""
+    width, height = (int(n) for n in args.size.lower().split('x'))
+    result = run(
+        args.scenes.split(',') if args.scenes else None,
+        width, height, args.repeat, args.workers or None, args.precision,
+    )
+
+    report = json.dumps(result, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(report + '\n')
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(result, json.load(file), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m spritz.bench', description="Spritz benchmark suite")
+    add_arguments(parser)
+    return run_command(parser.parse_args(argv))
+
+if __name__ == '__main__':
+    raise SystemExit(main())
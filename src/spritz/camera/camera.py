@@ -8,6 +8,8 @@ Orientation: 'up' is the positive z-axis.
 import numpy as np
 from numba import njit
 
+from ..engine.buffers import f8, i8, f8_1d, signatures
+
 class Camera: 
     """For now, just a barebones pinhole camera"""
     def __init__(self, eye, direction, up=(0, 0, 1), aspect=1.0, fov=114):
@@ -60,8 +62,23 @@ class Camera:
         direction /= np.sqrt(np.dot(direction, direction))
         return direction
     
-    def generate_rays(self, width, height):
-        return Camera._generate_rays(
+    def generate_rays(self, width, height, out=None, dtype=np.float64):
+        """Generate a ray through the center of every pixel.
+
+        Args:
+            width (int): image width
+            height (int): image height
+            out (tuple[np.ndarray, np.ndarray], optional): (height, width, 3) float64
+                or float32 origin and direction arrays to fill instead of allocating new ones
+            dtype (np.dtype, optional): float type of newly allocated arrays. Rays are
+                always computed in float64. Defaults to float64.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: (height, width, 3) origins and directions
+        """
+        if out is None:
+            out = (np.empty((height, width, 3), dtype=dtype), np.empty((height, width, 3), dtype=dtype))
+        Camera._generate_rays(
             width,
             height,
             self.eye,
@@ -70,9 +87,12 @@ class Camera:
             self.u,
             self.v,
             self.w,
+            out[0],
+            out[1],
         )
+        return out
 
-    @njit(cache=True)
+    @njit(signatures(lambda p: (i8, i8, f8_1d, f8, f8, f8_1d, f8_1d, f8_1d, p.img, p.img)), cache=True)
     def _generate_rays(width: int,
                     height: int,
                     eye: np.ndarray,
@@ -80,7 +100,9 @@ class Camera:
                     aspect: float,
                     u: np.ndarray,
                     v: np.ndarray,
-                    w: np.ndarray):
+                    w: np.ndarray,
+                    origins: np.ndarray,
+                    dirs: np.ndarray):
         
         fov = np.deg2rad(fov)
 
@@ -92,10 +114,6 @@ class Camera:
         px = (2.0 * (np.arange(width) + 0.5) / width - 1.0) * half_width
         py = (1.0 - 2.0 * (np.arange(height) + 0.5) / height) * half_height
 
-        # Allocate arrays
-        dirs = np.zeros((height, width, 3), dtype=np.float64)
-        origins = np.zeros((height, width, 3), dtype=np.float64)
-
         # Fill in each direction
         for j in range(height):
             for i in range(width):
@@ -113,4 +131,66 @@ class Camera:
                 origins[j, i, 1] = eye[1]
                 origins[j, i, 2] = eye[2]
 
+    def generate_rays_at(self, xs, ys, width, height):
+        """Generate rays through arbitrary points of the image plane.
+
+        Points are in pixel units, so pixel (x, y) has its center at
+        (x + 0.5, y + 0.5) and gets the same ray as `generate_rays`.
+
+        Args:
+            xs (ArrayLike): horizontal sample positions
+            ys (ArrayLike): vertical sample positions
+            width (int): image width
+            height (int): image height
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: (N, 3) origins and directions
+        """
+        return Camera._generate_rays_at(
+            np.ascontiguousarray(xs, dtype=np.float64),
+            np.ascontiguousarray(ys, dtype=np.float64),
+            width,
+            height,
+            self.eye,
+            self.fov,
+            self.aspect,
+            self.u,
+            self.v,
+            self.w,
+        )
+
+    @njit([(f8_1d, f8_1d, i8, i8, f8_1d, f8, f8, f8_1d, f8_1d, f8_1d)], cache=True, nogil=True)
+    def _generate_rays_at(xs: np.ndarray,
+                          ys: np.ndarray,
+                          width: int,
+                          height: int,
+                          eye: np.ndarray,
+                          fov: float,
+                          aspect: float,
+                          u: np.ndarray,
+                          v: np.ndarray,
+                          w: np.ndarray):
+
+        fov = np.deg2rad(fov)
+        half_height = np.tan(fov / 2.0)
+        half_width = aspect * half_height
+
+        n = xs.shape[0]
+        dirs = np.empty((n, 3), dtype=np.float64)
+        origins = np.empty((n, 3), dtype=np.float64)
+        for k in range(n):
+            # Same arithmetic as _generate_rays, so pixel centers match exactly
+            px = (2.0 * xs[k] / width - 1.0) * half_width
+            py = (1.0 - 2.0 * ys[k] / height) * half_height
+            dir_vec = px * u + py * v - w
+
+            norm = np.sqrt(dir_vec[0]**2 + dir_vec[1]**2 + dir_vec[2]**2)
+            dirs[k, 0] = dir_vec[0] / norm
+            dirs[k, 1] = dir_vec[1] / norm
+            dirs[k, 2] = dir_vec[2] / norm
+
+            origins[k, 0] = eye[0]
+            origins[k, 1] = eye[1]
+            origins[k, 2] = eye[2]
+
         return origins, dirs
\ No newline at end of file
@@ -0,0 +1,99 @@
+"""Command line interface, installed as `spritz`.
+
+    spritz warmup    compile every kernel into the cache (see spritz.jit)
+    spritz bench     run the benchmark suite (see spritz.bench)
+    spritz worker    render tiles for coordinators (see spritz.distributed)
+    spritz serve     answer render requests over HTTP (see spritz.server)
+"""
+import argparse
+
+from . import bench, distributed, jit, server
+
+def _warmup(args):
+    seconds = jit.warmup()
+    print(f"kernels ready in {seconds:.2f} seconds, cached in {jit.cache_dir() or 'the package directory'}")
+    return 0
+
+def _worker(args):
+    server = distributed.worker_server(args.address)
+    with server:
+        # local_workers reads the address off this line
+        print(f"listening on {distributed.server_address(server)}", flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+def _serve(args):
+    scenes = {}
+    for spec in args.scene:
+        name, _, path = spec.partition('=')
+        if not name or not path:
+            raise SystemExit(f"spritz serve: --scene takes NAME=PATH, got {spec!r}")
+        scenes[name] = path
+    renderer = server.RenderServer(scenes, args.concurrency, args.queue, args.threads)
+    with server.http_server(renderer, args.listen, args.verbose) as http:
+        print(f"serving {len(scenes)} scenes on {distributed.server_address(http)}", flush=True)
+        try:
+            http.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+def main(argv=None):
+    """Run the `spritz` command.
+
+    Args:
+        argv (list[str], optional): arguments, defaults to sys.argv[1:]
+
+    Returns:
+        int: exit status
+    """
+    parser = argparse.ArgumentParser(prog='spritz', description="Spritz raytracer")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    warmup = commands.add_parser(
+        'warmup',
+        help="compile every kernel into the cache",
+        description=f"Compile every kernel into the cache, e.g. while building a container image. "
+                    f"Set {jit.CACHE_DIR_VARIABLE} to choose the cache directory.",
+    )
+    warmup.set_defaults(run=_warmup)
+
+    suite = commands.add_parser(
+        'bench',
+        help="run the benchmark suite",
+        description="Render the standard benchmark scenes and report timings and rays per second as JSON.",
+    )
+    bench.add_arguments(suite)
+    suite.set_defaults(run=bench.run_command)
+
+    worker = commands.add_parser(
+        'worker',
+        help="render tiles for coordinators",
+        description="Listen for coordinators (see spritz.distributed.Coordinator) and render the tiles they send. "
+                    "Messages are pickled: only listen where trusted coordinators can connect.",
+    )
+    worker.add_argument('address', help="'host:port' (port 0 picks a free one) or 'unix:/path'")
+    worker.set_defaults(run=_worker)
+
+    serve = commands.add_parser(
+        'serve',
+        help="answer render requests over HTTP",
+        description="Load saved scenes once (see Scene.save) and render them on request, "
+                    "with warm kernels. See spritz.server for the API.",
+    )
+    serve.add_argument('--scene', action='append', required=True, metavar='NAME=PATH',
+                       help="scene directory to serve under NAME, repeatable")
+    serve.add_argument('--listen', default='127.0.0.1:8800', help="'host:port' or 'unix:/path' (default: %(default)s)")
+    serve.add_argument('--concurrency', type=int, default=server.CONCURRENCY,
+                       help="renders running at once (default: %(default)s)")
+    serve.add_argument('--queue', type=int, default=server.QUEUE,
+                       help="requests waiting for a render before more are refused (default: %(default)s)")
+    serve.add_argument('--threads', type=int, default=1, help="tile threads per render (default: %(default)s)")
+    serve.add_argument('--verbose', action='store_true', help="log every request")
+    serve.set_defaults(run=_serve)
+
+    args = parser.parse_args(argv)
+    return args.run(args)
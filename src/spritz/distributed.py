@@ -0,0 +1,374 @@
+"""Rendering across worker processes, over sockets.
+
+A worker (`spritz worker ADDRESS`, see `worker_server`) listens on a TCP
+or Unix socket. A `Coordinator` connects to every worker, ships it the
+packed scene and the cameras of every frame once, then deals out jobs,
+one tile of one frame each, and writes the tiles it gets back into the
+frames.
+
+Every connection keeps a few jobs in flight, so a worker always has the
+next tile queued when it finishes one. When a worker dies, or doesn't
+answer in time, its connection is dropped and its unfinished jobs go back
+to the queue for the other workers.
+
+    $ spritz worker 127.0.0.1:9100 &
+    $ spritz worker unix:/tmp/spritz.sock &
+
+    frames = Coordinator(['127.0.0.1:9100', 'unix:/tmp/spritz.sock']).render(scene, 640, 480, cameras)
+
+Messages are pickled, so workers must only listen where nothing but
+trusted coordinators can reach them (localhost, a private network).
+"""
+import os
+import pickle
+import socket
+import socketserver
+import stat
+import struct
+import subprocess
+import sys
+import threading
+import traceback
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+from .engine.tiles import TILE_SIZE, split_tiles
+from .scene import Scene, sceneio
+
+INFLIGHT = 2 # jobs sent to a worker ahead of its answers
+ATTEMPTS = 3 # times a job is handed out before the render fails
+TIMEOUT = 60.0 # seconds a worker has to answer, before it counts as dead
+
+_HEADER = struct.Struct('!Q') # size of the pickled message that follows
+_SMALL = 1 << 16 # messages sent along with their header in one call
+
+def parse_address(address):
+    """Socket family and address of 'host:port' or 'unix:/path'
+
+    Raises:
+        ValueError: if the address is neither
+    """
+    if address.startswith('unix:'):
+        return socket.AF_UNIX, address[len('unix:'):]
+    host, _, port = address.rpartition(':')
+    if not host or not port.isdigit():
+        raise ValueError(f"Expected 'host:port' or 'unix:/path', got {address!r}")
+    return socket.AF_INET, (host, int(port))
+
+def _connect(address, timeout):
+    family, target = parse_address(address)
+    if family == socket.AF_UNIX:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        sock.connect(target)
+    else:
+        sock = socket.create_connection(target, timeout)
+    _no_delay(sock)
+    return sock
+
+def _no_delay(sock):
+    """Send small messages right away, tiles are latency bound"""
+    if sock.family != getattr(socket, 'AF_UNIX', None):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+def _send_bytes(sock, data):
+    if len(data) < _SMALL:
+        sock.sendall(_HEADER.pack(len(data)) + data)
+    else:
+        sock.sendall(_HEADER.pack(len(data)))
+        sock.sendall(data)
+
+def send_message(sock, message):
+    """Pickle a message and send it, prefixed with its size"""
+    _send_bytes(sock, pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL))
+
+def _receive_exactly(sock, size):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    while view:
+        received = sock.recv_into(view)
+        if received == 0:
+            raise ConnectionError("connection closed")
+        view = view[received:]
+    return buffer
+
+def receive_message(sock):
+    """Next message sent by `send_message`
+
+    Raises:
+        ConnectionError: if the connection is closed first
+    """
+    size, = _HEADER.unpack(_receive_exactly(sock, _HEADER.size))
+    return pickle.loads(_receive_exactly(sock, size))
+
+def _serve(sock):
+    """Render the jobs of one coordinator until it hangs up.
+
+    Messages in, each answered in order:
+        ('scene', state, cameras) -> ('ready',) or ('error', None, traceback),
+            state being from `sceneio.packed_state`
+        ('tile', job, frame, tile, width, height) -> ('tile', job, colors) or ('error', job, traceback)
+        ('close',)
+    """
+    _no_delay(sock)
+    scene = compiled = cameras = current = None
+    while True:
+        try:
+            message = receive_message(sock)
+        except ConnectionError:
+            return
+        if message[0] == 'close':
+            return
+        if message[0] == 'scene':
+            _, state, cameras = message
+            try:
+                scene = Scene._from_packed(*state)
+                compiled, current = scene.compile(), None
+                reply = ('ready',)
+            except Exception:
+                reply = ('error', None, traceback.format_exc())
+            send_message(sock, reply)
+            continue
+
+        _, job, frame, tile, width, height = message
+        try:
+            if frame != current:
+                scene.change_camera(cameras[frame])
+                current = frame
+            reply = ('tile', job, scene._trace_tile(compiled, width, height, tile))
+        except Exception:
+            reply = ('error', job, traceback.format_exc())
+        send_message(sock, reply)
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        _serve(self.request)
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+if hasattr(socketserver, 'ThreadingUnixStreamServer'):
+    class _UnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+def worker_server(address):
+    """Socket server rendering the jobs of every coordinator that connects.
+
+    Each connection is served by its own thread. Call `serve_forever()` on
+    the result, see `spritz worker`.
+
+    Args:
+        address (str): 'host:port' ('127.0.0.1:0' picks a free port) or 'unix:/path'.
+            A socket file left at the path by an earlier worker is replaced.
+
+    Returns:
+        socketserver.BaseServer
+    """
+    family, target = parse_address(address)
+    if family != socket.AF_UNIX:
+        return _TCPServer(target, _Handler)
+    if os.path.exists(target) and stat.S_ISSOCK(os.stat(target).st_mode):
+        os.unlink(target)
+    return _UnixServer(target, _Handler)
+
+def server_address(server):
+    """Address a `worker_server` listens on, in the form coordinators take"""
+    if server.address_family == getattr(socket, 'AF_UNIX', None):
+        return f"unix:{server.server_address}"
+    host, port = server.server_address[:2]
+    return f"{host}:{port}"
+
+class _Jobs:
+    """Jobs of a render, shared by the threads talking to the workers"""
+
+    def __init__(self, jobs, workers, attempts):
+        self._queue = deque(jobs)
+        self._tries = {job[0]: 1 for job in jobs}
+        self._pending = len(self._queue)
+        self._workers = workers
+        self._attempts = attempts
+        self._done = threading.Condition()
+        self.error = None
+
+    def take(self, wait):
+        """Next job to send, None once there are none left (or the render failed).
+        With `wait`, blocks while every remaining job is in flight on other workers."""
+        with self._done:
+            while True:
+                if self.error is not None or self._pending == 0:
+                    return None
+                if self._queue:
+                    return self._queue.popleft()
+                if not wait:
+                    return None
+                self._done.wait()
+
+    def finish(self):
+        with self._done:
+            self._pending -= 1
+            if self._pending == 0:
+                self._done.notify_all()
+
+    def fail(self, error):
+        with self._done:
+            self.error = self.error or error
+            self._done.notify_all()
+
+    def lose(self, address, jobs, reason):
+        """A worker died: its jobs go back to the front of the queue"""
+        with self._done:
+            self._workers -= 1
+            for job in reversed(jobs):
+                self._tries[job[0]] += 1
+                if self._tries[job[0]] > self._attempts:
+                    self.error = self.error or RuntimeError(
+                        f"tile {job[2]} of frame {job[1]} failed on {self._attempts} workers, last {address}: {reason}")
+                self._queue.appendleft(job)
+            if self._workers == 0 and self._pending > 0:
+                self.error = self.error or RuntimeError(f"every worker is gone, {self._pending} tiles left "
+                                                        f"(last one lost: {address}: {reason})")
+            self._done.notify_all()
+
+class Coordinator:
+    """Renders scenes on remote workers, see `spritz.distributed`.
+
+    Attributes:
+        workers (list[str]): worker addresses, 'host:port' or 'unix:/path'
+        inflight (int): jobs sent to a worker ahead of its answers
+        attempts (int): workers a job is tried on before the render fails
+        timeout (float): seconds to connect to a worker, and to wait for each of its answers
+    """
+
+    def __init__(self, workers, inflight=INFLIGHT, attempts=ATTEMPTS, timeout=TIMEOUT):
+        if not workers:
+            raise ValueError("A coordinator needs at least one worker")
+        for address in workers:
+            parse_address(address)
+        self.workers = list(workers)
+        self.inflight = inflight
+        self.attempts = attempts
+        self.timeout = timeout
+
+    def __repr__(self):
+        return f"<Coordinator of {len(self.workers)} workers>"
+
+    def render(self, scene, width=50, height=50, cameras=None, tile_size=TILE_SIZE):
+        """Render frames of a scene on the workers.
+
+        The scene is packed here and sent to every worker once, along with
+        the cameras. Workers render with the 'wavefront' engine, so the
+        frames are the same as `scene.render(width, height)` with it.
+        Anti-aliasing and the visibility cache aren't supported.
+
+        Args:
+            scene (Scene): scene to render
+            width (int, optional): frame width. Defaults to 50.
+            height (int, optional): frame height. Defaults to 50.
+            cameras (Iterable[Camera], optional): camera of every frame. Defaults to
+                None, a single frame from the scene's camera.
+            tile_size (int, optional): tile edge in pixels, the size of a job. Defaults to 64.
+
+        Raises:
+            RuntimeError: if a worker fails to render a tile, a tile was lost
+                with `attempts` workers, or every worker is gone
+
+        Returns:
+            np.ndarray | list[np.ndarray]: the (height, width, 3) frame, or a list of
+                them with `cameras`
+        """
+        state = sceneio.packed_state(scene)
+        path = [scene.camera] if cameras is None else list(cameras)
+        # pickled once, whatever the number of workers
+        setup = pickle.dumps(('scene', state, path), protocol=pickle.HIGHEST_PROTOCOL)
+        dtype = state[0]['geometry'].triangle_v0.dtype
+        frames = [np.zeros((height, width, 3), dtype=dtype) for _ in path]
+
+        tiles = split_tiles(width, height, tile_size)
+        jobs = _Jobs([(k * len(tiles) + t, k, tile) for k in range(len(path)) for t, tile in enumerate(tiles)],
+                     len(self.workers), self.attempts)
+        threads = [
+            threading.Thread(target=self._drive, args=(address, setup, jobs, frames, width, height),
+                             name=f'spritz-coordinator-{k}', daemon=True)
+            for k, address in enumerate(self.workers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if jobs.error is not None:
+            raise jobs.error
+        return frames[0] if cameras is None else frames
+
+    def _drive(self, address, setup, jobs, frames, width, height):
+        """Feed one worker jobs until there are none left"""
+        sent = deque()
+        sock = None
+        try:
+            sock = _connect(address, self.timeout)
+            _send_bytes(sock, setup)
+            reply = receive_message(sock)
+            if reply[0] == 'error':
+                jobs.fail(RuntimeError(f"worker {address} couldn't load the scene:\n{reply[2]}"))
+            while jobs.error is None:
+                while len(sent) < self.inflight:
+                    job = jobs.take(wait=not sent)
+                    if job is None:
+                        break
+                    job_id, frame, tile = job
+                    send_message(sock, ('tile', job_id, frame, tile, width, height))
+                    sent.append(job)
+                if not sent:
+                    break
+
+                reply = receive_message(sock)
+                job_id, frame, (x0, y0, x1, y1) = sent[0]
+                if reply[0] == 'error':
+                    jobs.fail(RuntimeError(f"worker {address} failed on tile {(x0, y0, x1, y1)} of frame {frame}:\n"
+                                           f"{reply[2]}"))
+                    break
+                if reply[0] != 'tile' or reply[1] != job_id:
+                    raise ValueError(f"expected tile {job_id}, got {reply[:2]!r}")
+                frames[frame][y0:y1, x0:x1] = reply[2].reshape(y1 - y0, x1 - x0, 3)
+                sent.popleft()
+                jobs.finish()
+            send_message(sock, ('close',))
+        except Exception as error:
+            # dead or not talking the protocol (a tile of the wrong size, a reply that
+            # doesn't unpickle here), either way its jobs go to the others
+            jobs.lose(address, list(sent), error)
+        finally:
+            if sock is not None:
+                sock.close()
+
+@contextmanager
+def local_workers(count, host='127.0.0.1'):
+    """Start worker processes on this machine, for as long as the block runs.
+
+    Args:
+        count (int): number of workers
+        host (str, optional): interface they listen on. Defaults to 127.0.0.1.
+
+    Yields:
+        list[str]: their addresses
+    """
+    processes = []
+    try:
+        for _ in range(count):
+            processes.append(subprocess.Popen([sys.executable, '-m', 'spritz', 'worker', f'{host}:0'],
+                                              stdout=subprocess.PIPE, text=True))
+        addresses = []
+        for process in processes:
+            line = process.stdout.readline()
+            if not line.startswith('listening on '):
+                raise RuntimeError(f"worker {process.pid} didn't start")
+            addresses.append(line.split()[-1])
+        yield addresses
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+            process.stdout.close()
@@ -0,0 +1,19 @@
+from .wavefront import (
+    trace,
+    trace_tile,
+)
+
+from .stats import (
+    RenderStats,
+)
+
+from .visibility import (
+    VisibilityCache,
+)
+
+__all__ = [
+    'trace',
+    'trace_tile',
+    'RenderStats',
+    'VisibilityCache',
+]
@@ -0,0 +1,99 @@
+"""Layouts of the packed buffers handed to the compiled kernels.
+
+Every buffer is a namedtuple of C-contiguous float and integer arrays, the
+floats being float64 or float32 depending on the scene's precision. The
+matching numba types are spelled out here so the kernels can be compiled
+eagerly, with explicit signatures, when spritz is imported.
+"""
+from collections import namedtuple
+
+from numba import types
+
+Geometry = namedtuple('Geometry', [
+    'sphere_center', 'sphere_radius', 'sphere_material',
+    'plane_normal', 'plane_point', 'plane_material',
+    'triangle_v0', 'triangle_e1', 'triangle_e2', 'triangle_normal', 'triangle_material',
+    'bvh_min', 'bvh_max', 'bvh_start', 'bvh_count', 'bvh_kind', 'bvh_index',
+    'instance_inverse', 'instance_root', 'instance_material',
+])
+
+Materials = namedtuple('Materials', ['ambient', 'diffuse', 'specular', 'shininess'])
+
+# Point lights are stored cluster by cluster, see LightManager
+Lights = namedtuple('Lights', [
+    'point_center', 'point_intensity', 'ambient',
+    'cluster_start', 'cluster_count', 'cluster_center', 'cluster_radius', 'cluster_intensity',
+    'cutoff', 'cluster_distance', 'shadow_budget',
+])
+
+# Mip levels of an environment map, level after level, with the faces of a
+# level one above the other, see EnvironmentMap
+Environment = namedtuple('Environment', ['texels', 'level_start', 'level_width', 'level_height', 'faces'])
+
+View = namedtuple('View', ['eye', 'u', 'v', 'w', 'half_width', 'half_height'])
+
+# Shared and private tables of shadow ray results, see VisibilityCache
+Visibility = namedtuple('Visibility', [
+    'keys', 'rows', 'visible', 'new_keys', 'new_rows', 'new_visible', 'new_count', 'cell_size',
+])
+
+class Precision:
+    """Numba types of the packed buffers at one floating point precision.
+
+    Integer buffers (material ids, BVH topology) are int64 at every precision.
+    """
+
+    def __init__(self, real):
+        self.real = real
+        self.vec = real[::1]
+        self.mat = real[:, ::1]
+        self.img = real[:, :, ::1]
+        self.geometry = types.NamedTuple([
+            self.mat, self.vec, i8_1d,
+            self.mat, self.mat, i8_1d,
+            self.mat, self.mat, self.mat, self.mat, i8_1d,
+            self.mat, self.mat, i8_1d, i8_1d, i8_1d, i8_1d,
+            self.img, i8_1d, i8_1d,
+        ], Geometry)
+        self.materials = types.NamedTuple([self.mat, self.mat, self.mat, self.vec], Materials)
+        self.lights = types.NamedTuple([
+            self.mat, self.mat, self.vec,
+            i8_1d, i8_1d, self.mat, self.vec, self.mat,
+            real, real, i8,
+        ], Lights)
+
+i8 = types.int64
+i8_1d = types.int64[::1]
+i8_2d = types.int64[:, ::1]
+b1 = types.boolean
+u1_2d = types.uint8[:, ::1]
+
+PRECISIONS = {
+    'float64': Precision(types.float64),
+    'float32': Precision(types.float32),
+}
+
+def signatures(build):
+    """Kernel signatures for every precision.
+
+    Args:
+        build (Callable): maps a Precision to one signature (a tuple of argument types)
+    """
+    return [build(p) for p in PRECISIONS.values()]
+
+# float64 shorthands, for kernels that only run at double precision
+f8 = types.float64
+f8_1d = types.float64[::1]
+f8_2d = types.float64[:, ::1]
+f8_3d = types.float64[:, :, ::1]
+f8_any = types.float64[:] # 1d of any layout, for arrays coming from Python code
+f4_2d = types.float32[:, ::1]
+
+GeometryType = PRECISIONS['float64'].geometry
+MaterialsType = PRECISIONS['float64'].materials
+LightsType = PRECISIONS['float64'].lights
+
+ViewType = types.NamedTuple([f8_1d, f8_1d, f8_1d, f8_1d, f8, f8], View)
+VisibilityType = types.NamedTuple([i8_1d, i8_1d, u1_2d, i8_1d, i8_1d, u1_2d, i8_1d, f8], Visibility)
+# Textures are float32 whatever the scene's precision
+EnvironmentType = types.NamedTuple([f4_2d, i8_1d, i8_1d, i8_1d, i8], Environment)
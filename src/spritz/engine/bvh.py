@@ -0,0 +1,159 @@
+"""Bounding volume hierarchy construction.
+
+The tree is flattened into arrays so compiled kernels can walk it:
+    - node_min, node_max: (M, 3) bounding box of every node
+    - node_start, node_count: a leaf (count > 0) holds primitives
+      order[start:start + count]. An interior node (count == 0) has its
+      two children at indices start and start + 1.
+
+Splits are chosen with a binned Surface Area Heuristic (SAH).
+"""
+import numpy as np
+from numba import njit
+
+from .buffers import signatures
+
+BINS = 16
+LEAF_SIZE = 4
+MAX_LEAF_SIZE = 16
+MAX_DEPTH = 64
+# Enough for any traversal of a tree capped at MAX_DEPTH, twice over for the
+# tree of an instance entered from a leaf of the world's tree
+STACK_SIZE = 2 * (2 * MAX_DEPTH + 2) + MAX_LEAF_SIZE
+
+@njit(signatures(lambda p: (p.real, p.real, p.real)), cache=True, nogil=True)
+def _area(dx, dy, dz):
+    return dx*dy + dy*dz + dz*dx
+
+@njit(signatures(lambda p: (p.mat, p.mat)), cache=True, nogil=True)
+def build_bvh(bmin, bmax):
+    """Build a BVH over primitives with the given bounding boxes.
+
+    Args:
+        bmin (np.ndarray): (N, 3) lower corner of every primitive
+        bmax (np.ndarray): (N, 3) upper corner of every primitive
+
+    Returns:
+        tuple: (node_min, node_max, node_start, node_count, order)
+    """
+    n = bmin.shape[0]
+    centroid = 0.5 * (bmin + bmax)
+    order = np.arange(n)
+
+    max_nodes = max(1, 2 * n - 1)
+    node_min = np.empty((max_nodes, 3), dtype=bmin.dtype)
+    node_max = np.empty((max_nodes, 3), dtype=bmin.dtype)
+    node_start = np.zeros(max_nodes, dtype=np.int64)
+    node_count = np.zeros(max_nodes, dtype=np.int64)
+
+    bin_count = np.empty(BINS, dtype=np.int64)
+    bin_min = np.empty((BINS, 3), dtype=bmin.dtype)
+    bin_max = np.empty((BINS, 3), dtype=bmin.dtype)
+    right_area = np.empty(BINS, dtype=np.float64)
+    right_count = np.empty(BINS, dtype=np.int64)
+
+    # Work stack of (node, start, end, depth)
+    stack = np.empty((MAX_DEPTH + 2, 4), dtype=np.int64)
+    stack[0, 0], stack[0, 1], stack[0, 2], stack[0, 3] = 0, 0, n, 0
+    top, used = 1, 1
+
+    while top > 0:
+        top -= 1
+        node, start, end, depth = stack[top, 0], stack[top, 1], stack[top, 2], stack[top, 3]
+        count = end - start
+
+        lo = np.full(3, np.inf)
+        hi = np.full(3, -np.inf)
+        clo = np.full(3, np.inf)
+        chi = np.full(3, -np.inf)
+        for k in range(start, end):
+            p = order[k]
+            for a in range(3):
+                lo[a] = min(lo[a], bmin[p, a])
+                hi[a] = max(hi[a], bmax[p, a])
+                clo[a] = min(clo[a], centroid[p, a])
+                chi[a] = max(chi[a], centroid[p, a])
+        for a in range(3):
+            node_min[node, a] = lo[a]
+            node_max[node, a] = hi[a]
+        node_start[node] = start
+        node_count[node] = count
+
+        if count <= LEAF_SIZE or depth >= MAX_DEPTH or n == 0:
+            continue
+
+        # Binned SAH over all three axes
+        best_cost, best_axis, best_bin = np.inf, -1, -1
+        for a in range(3):
+            extent = chi[a] - clo[a]
+            if extent <= 0:
+                continue
+            scale = BINS / extent
+            bin_count[:] = 0
+            bin_min[:] = np.inf
+            bin_max[:] = -np.inf
+            for k in range(start, end):
+                p = order[k]
+                b = min(BINS - 1, int((centroid[p, a] - clo[a]) * scale))
+                bin_count[b] += 1
+                for c in range(3):
+                    bin_min[b, c] = min(bin_min[b, c], bmin[p, c])
+                    bin_max[b, c] = max(bin_max[b, c], bmax[p, c])
+
+            # Sweep from the right to get the cost of every right-hand side
+            rx0 = ry0 = rz0 = np.inf
+            rx1 = ry1 = rz1 = -np.inf
+            rc = 0
+            for b in range(BINS - 1, 0, -1):
+                rc += bin_count[b]
+                if bin_count[b] > 0:
+                    rx0, ry0, rz0 = min(rx0, bin_min[b, 0]), min(ry0, bin_min[b, 1]), min(rz0, bin_min[b, 2])
+                    rx1, ry1, rz1 = max(rx1, bin_max[b, 0]), max(ry1, bin_max[b, 1]), max(rz1, bin_max[b, 2])
+                right_count[b] = rc
+                right_area[b] = _area(rx1 - rx0, ry1 - ry0, rz1 - rz0) if rc > 0 else 0.0
+
+            lx0 = ly0 = lz0 = np.inf
+            lx1 = ly1 = lz1 = -np.inf
+            lc = 0
+            for b in range(BINS - 1):
+                lc += bin_count[b]
+                if bin_count[b] > 0:
+                    lx0, ly0, lz0 = min(lx0, bin_min[b, 0]), min(ly0, bin_min[b, 1]), min(lz0, bin_min[b, 2])
+                    lx1, ly1, lz1 = max(lx1, bin_max[b, 0]), max(ly1, bin_max[b, 1]), max(lz1, bin_max[b, 2])
+                if lc == 0 or right_count[b + 1] == 0:
+                    continue
+                cost = lc * _area(lx1 - lx0, ly1 - ly0, lz1 - lz0) + right_count[b + 1] * right_area[b + 1]
+                if cost < best_cost:
+                    best_cost, best_axis, best_bin = cost, a, b
+
+        node_area = _area(hi[0] - lo[0], hi[1] - lo[1], hi[2] - lo[2])
+        if best_axis == -1:
+            if count <= MAX_LEAF_SIZE:
+                continue
+            # Every centroid coincides, split in half so leaves stay small
+            mid = start + count // 2
+        else:
+            # Splitting costs one traversal step plus the expected intersections
+            if node_area > 0 and 1.0 + best_cost / node_area >= count and count <= MAX_LEAF_SIZE:
+                continue
+            scale = BINS / (chi[best_axis] - clo[best_axis])
+            i, j = start, end - 1
+            while i <= j:
+                p = order[i]
+                b = min(BINS - 1, int((centroid[p, best_axis] - clo[best_axis]) * scale))
+                if b <= best_bin:
+                    i += 1
+                else:
+                    order[i], order[j] = order[j], order[i]
+                    j -= 1
+            mid = i
+
+        left = used
+        used += 2
+        node_start[node] = left
+        node_count[node] = 0
+        stack[top, 0], stack[top, 1], stack[top, 2], stack[top, 3] = left + 1, mid, end, depth + 1
+        stack[top + 1, 0], stack[top + 1, 1], stack[top + 1, 2], stack[top + 1, 3] = left, start, mid, depth + 1
+        top += 2
+
+    return node_min[:used].copy(), node_max[:used].copy(), node_start[:used].copy(), node_count[:used].copy(), order
@@ -0,0 +1,144 @@
+"""Environment map lookups for the rays that escape the scene.
+
+An environment map is an image wrapped around the scene, z being up:
+
+- a latitude-longitude image (one face) has its columns go once around
+  the z axis and its rows from +z (top row) to -z (bottom row), the center
+  of the image being towards +x.
+- a cube map has six square faces, seen from the center of the cube:
+  front (+x), right (-y), back (-x) and left (+y), all upright, then top
+  (+z) and bottom (-z), which meet the front along their bottom and top
+  edges respectively.
+
+It's stored as a float32 mip pyramid, every level half the size of the
+one before, so a ray can read the level whose texels are about the size
+of its pixel instead of aliasing over a texture much finer than the image.
+"""
+import numpy as np
+from numba import njit
+
+from .buffers import Environment, EnvironmentType, i8, f8, signatures
+
+NO_ENVIRONMENT = Environment(np.empty((0, 3), dtype=np.float32), np.empty(0, dtype=np.int64),
+                             np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), 0)
+
+LATLONG = 1
+CUBE = 6
+
+def _halve(level, wrap):
+    """Next mip level: 2x2 texel averages. Odd heights repeat their last row,
+    odd widths their first column if the image wraps around, else their last."""
+    height, width = level.shape[:2]
+    if height > 1:
+        if height % 2:
+            level = np.concatenate((level, level[-1:]))
+        level = 0.5 * (level[0::2] + level[1::2])
+    if width > 1:
+        if width % 2:
+            level = np.concatenate((level, level[:, :1] if wrap else level[:, -1:]), axis=1)
+        level = 0.5 * (level[:, 0::2] + level[:, 1::2])
+    return level
+
+def mip_levels(faces):
+    """Mip pyramid of an environment map, down to a single texel per face.
+
+    Args:
+        faces (list[np.ndarray]): the (height, width, 3) RGB image of a
+            latitude-longitude map, or the 6 square faces of a cube map in
+            the order front, right, back, left, top, bottom
+
+    Returns:
+        Environment
+    """
+    faces = [np.asarray(face, dtype=np.float32) for face in faces]
+    levels = [faces]
+    while faces[0].shape[0] > 1 or faces[0].shape[1] > 1:
+        faces = [_halve(face, len(faces) == LATLONG) for face in faces]
+        levels.append(faces)
+
+    sizes = np.array([len(level) * level[0].shape[0] * level[0].shape[1] for level in levels], dtype=np.int64)
+    return Environment(
+        texels=np.ascontiguousarray(np.concatenate([face.reshape(-1, 3) for level in levels for face in level])),
+        level_start=np.concatenate(([0], np.cumsum(sizes)[:-1])).astype(np.int64),
+        level_width=np.array([level[0].shape[1] for level in levels], dtype=np.int64),
+        level_height=np.array([level[0].shape[0] for level in levels], dtype=np.int64),
+        faces=len(levels[0]),
+    )
+
+def footprint_level(environment, half_height, height):
+    """Level of detail whose texels are about one pixel wide, for a camera with
+    an image plane `2 * half_height` tall (at distance 1) seen over `height` pixels"""
+    if environment.level_height.shape[0] == 0:
+        return 0.0
+    pixel = 2.0 * half_height / height # radians, near the center of the image
+    # a face spans 180 degrees of latitude, or 90 of a cube
+    texel = (np.pi if environment.faces == LATLONG else np.pi / 2) / environment.level_height[0]
+    return max(float(np.log2(pixel / texel)), 0.0)
+
+@njit((EnvironmentType, i8, i8, f8, f8), cache=True, nogil=True, inline='always')
+def _bilinear(env, level, face, u, v):
+    """Bilinear lookup of texture coordinates (u, v) in [0, 1] in a face of one level.
+    Latitude-longitude maps wrap around horizontally, cube faces are clamped."""
+    width, height = env.level_width[level], env.level_height[level]
+    start = env.level_start[level] + face * width * height
+    x = u * width - 0.5
+    y = min(max(v * height - 0.5, 0.0), height - 1.0)
+    if env.faces == CUBE:
+        x = min(max(x, 0.0), width - 1.0)
+    x0, y0 = np.floor(x), np.floor(y)
+    fx, fy = x - x0, y - y0
+    left = np.int64(x0) % width
+    right = (left + 1) % width if env.faces == LATLONG else min(left + 1, width - 1)
+    top = start + np.int64(y0) * width
+    bottom = start + min(np.int64(y0) + 1, height - 1) * width
+
+    r, g, b = 0.0, 0.0, 0.0
+    for k, weight in ((top + left, (1 - fx) * (1 - fy)), (top + right, fx * (1 - fy)),
+                      (bottom + left, (1 - fx) * fy), (bottom + right, fx * fy)):
+        r += weight * env.texels[k, 0]
+        g += weight * env.texels[k, 1]
+        b += weight * env.texels[k, 2]
+    return r, g, b
+
+@njit((EnvironmentType, f8, f8, f8), cache=True, nogil=True, inline='always')
+def _texture_coordinates(env, dx, dy, dz):
+    """Face and (u, v) texture coordinates of a direction"""
+    if env.faces == LATLONG:
+        u = 0.5 - np.arctan2(dy, dx) / (2.0 * np.pi) # seen from inside, so longitude runs right to left
+        v = np.arccos(min(max(dz / np.sqrt(dx*dx + dy*dy + dz*dz), -1.0), 1.0)) / np.pi
+        return 0, u, v
+
+    # the major axis picks the face, (right, up) are its axes seen from the center
+    ax, ay, az = abs(dx), abs(dy), abs(dz)
+    if az >= ax and az >= ay:
+        if dz > 0:
+            face, right, up, forward = 4, -dy, -dx, az
+        else:
+            face, right, up, forward = 5, -dy, dx, az
+    elif ax >= ay:
+        if dx > 0:
+            face, right, up, forward = 0, -dy, dz, ax
+        else:
+            face, right, up, forward = 2, dy, dz, ax
+    elif dy < 0:
+        face, right, up, forward = 1, -dx, dz, ay
+    else:
+        face, right, up, forward = 3, dx, dz, ay
+    return face, 0.5 * (1.0 + right / forward), 0.5 * (1.0 - up / forward)
+
+@njit(signatures(lambda p: (EnvironmentType, p.real, p.real, p.real, f8)), cache=True, nogil=True)
+def sample_environment(env, dx, dy, dz, lod):
+    """Color of the environment along a direction, filtered trilinearly at level of detail `lod`
+
+    Returns:
+        tuple[float, float, float]: RGB color
+    """
+    face, u, v = _texture_coordinates(env, np.float64(dx), np.float64(dy), np.float64(dz))
+    lod = min(max(lod, 0.0), env.level_start.shape[0] - 1.0)
+    level = np.int64(lod)
+    blend = lod - level
+    r, g, b = _bilinear(env, level, face, u, v)
+    if blend > 0:
+        r1, g1, b1 = _bilinear(env, level + 1, face, u, v)
+        r, g, b = r + blend * (r1 - r), g + blend * (g1 - g), b + blend * (b1 - b)
+    return r, g, b
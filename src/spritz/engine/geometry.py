@@ -0,0 +1,212 @@
+"""Packed geometry buffers shared by the compiled kernels."""
+import numpy as np
+
+from .buffers import Geometry
+from .bvh import build_bvh
+from .kernels import SPHERE, TRIANGLE, INSTANCE
+from ..surfaces.surface import ACCELERATORS
+from ..surfaces.mesh import face_normals
+
+# Corners of the unit cube
+_CORNERS = np.array([(x, y, z) for x in (0, 1) for y in (0, 1) for z in (0, 1)], dtype=float)
+
+def primitive_bounds(geometry):
+    """Bounding boxes of the bounded primitives (spheres, then triangles).
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: bmin, bmax, kind and index of every primitive
+    """
+    c, r = geometry.sphere_center, np.abs(geometry.sphere_radius)[:, None]
+    v0 = geometry.triangle_v0
+    v1 = v0 + geometry.triangle_e1
+    v2 = v0 + geometry.triangle_e2
+
+    bmin = np.concatenate((c - r, np.minimum(np.minimum(v0, v1), v2)))
+    bmax = np.concatenate((c + r, np.maximum(np.maximum(v0, v1), v2)))
+    kind = np.concatenate((
+        np.full(c.shape[0], SPHERE, dtype=np.int64),
+        np.full(v0.shape[0], TRIANGLE, dtype=np.int64),
+    ))
+    index = np.concatenate((
+        np.arange(c.shape[0], dtype=np.int64),
+        np.arange(v0.shape[0], dtype=np.int64),
+    ))
+    return bmin, bmax, kind, index
+
+def pack_geometry(spheres, planes, triangles, material_id, accel=None, meshes=(), dtype=np.float64, instances=()):
+    """Pack surfaces into a Geometry.
+
+    Args:
+        spheres (list[Sphere])
+        planes (list[Plane])
+        triangles (list[Triangle])
+        material_id (Callable): maps a surface to its material id
+        accel (str, optional): 'bvh' builds a bounding volume hierarchy over the
+            spheres and triangles. Planes are unbounded and always tested linearly.
+        meshes (list[TriangleMesh], optional): meshes whose faces are appended after `triangles`
+        dtype (np.dtype, optional): float type of the packed arrays, float64 or float32.
+            Everything is computed in float64 first and rounded once. Defaults to float64.
+        instances (list[Instance], optional): placements of shared geometry, see
+            `with_instances`. The geometry always gets a BVH when there are some.
+
+    Returns:
+        Geometry
+    """
+    if accel not in ACCELERATORS:
+        raise ValueError(f"Unknown accelerator {accel!r}, expected one of {ACCELERATORS}")
+
+    def material_ids(group):
+        return np.array([material_id(s) for s in group], dtype=np.int64)
+
+    v1 = np.array([t.v1 for t in triangles], dtype=float).reshape(-1, 3)
+    e1 = np.array([t.v2 for t in triangles], dtype=float).reshape(-1, 3) - v1
+    e2 = np.array([t.v3 for t in triangles], dtype=float).reshape(-1, 3) - v1
+    normals = face_normals(e1, e2)
+    triangle_material = material_ids(triangles)
+
+    if meshes:
+        v1 = np.concatenate([v1] + [m.vertices[m.faces[:, 0]] for m in meshes])
+        e1 = np.concatenate([e1] + [m.edges[:, 0] for m in meshes])
+        e2 = np.concatenate([e2] + [m.edges[:, 1] for m in meshes])
+        normals = np.concatenate([normals] + [m.normals for m in meshes])
+        triangle_material = np.concatenate([triangle_material] + [
+            np.full(m.faces.shape[0], material_id(m), dtype=np.int64) for m in meshes
+        ])
+
+    geometry = Geometry(
+        sphere_center=np.array([s.center for s in spheres], dtype=float).reshape(-1, 3),
+        sphere_radius=np.array([s.radius for s in spheres], dtype=float),
+        sphere_material=material_ids(spheres),
+        plane_normal=np.array([p.normal for p in planes], dtype=float).reshape(-1, 3),
+        plane_point=np.array([p.point for p in planes], dtype=float).reshape(-1, 3),
+        plane_material=material_ids(planes),
+        triangle_v0=v1,
+        triangle_e1=np.ascontiguousarray(e1),
+        triangle_e2=np.ascontiguousarray(e2),
+        triangle_normal=normals,
+        triangle_material=triangle_material,
+        bvh_min=np.empty((0, 3), dtype=float),
+        bvh_max=np.empty((0, 3), dtype=float),
+        bvh_start=np.empty(0, dtype=np.int64),
+        bvh_count=np.empty(0, dtype=np.int64),
+        bvh_kind=np.empty(0, dtype=np.int64),
+        bvh_index=np.empty(0, dtype=np.int64),
+        instance_inverse=np.empty((0, 3, 4), dtype=float),
+        instance_root=np.empty(0, dtype=np.int64),
+        instance_material=np.empty(0, dtype=np.int64),
+    )
+    geometry = geometry._replace(**{
+        name: np.ascontiguousarray(array, dtype=dtype)
+        for name, array in geometry._asdict().items() if array.dtype.kind == 'f'
+    })
+    if instances:
+        geometry = with_instances(geometry, instances, material_id)
+    elif accel == 'bvh':
+        geometry = with_bvh(geometry)
+    return geometry
+
+def widen(bmin, bmax):
+    """Boxes as the BVH holds them: float32 ones are widened by an ulp, since
+    vertices rebuilt as v0 + e1 round differently"""
+    if bmin.dtype == np.float32:
+        return np.nextafter(bmin, -np.inf), np.nextafter(bmax, np.inf)
+    return bmin, bmax
+
+def placed_bounds(low, high, transform):
+    """World space box of an instance, from the 8 corners of its geometry's box (low, high)"""
+    points = (low + _CORNERS * (high - low)) @ transform[:3, :3].T + transform[:3, 3]
+    return points.min(axis=0), points.max(axis=0)
+
+def with_bvh(geometry):
+    """Return a copy of the geometry with a BVH built over its spheres and triangles"""
+    bmin, bmax, kind, index = primitive_bounds(geometry)
+    if bmin.shape[0] == 0:
+        return geometry
+
+    node_min, node_max, node_start, node_count, order = build_bvh(*widen(bmin, bmax))
+    return geometry._replace(
+        bvh_min=node_min,
+        bvh_max=node_max,
+        bvh_start=node_start,
+        bvh_count=node_count,
+        bvh_kind=kind[order],
+        bvh_index=index[order],
+    )
+
+def with_instances(geometry, instances, material_id):
+    """Return a copy of the geometry holding instances of shared geometry.
+
+    The primitives of every distinct instanced surface are packed once,
+    after the geometry's own, with a BVH of their own in object space.
+    Their trees follow the world's tree in the BVH arrays. The world's tree
+    is built over the geometry's spheres and triangles and the world space
+    bounds of the instances, which show up in its leaves as INSTANCE entries.
+
+    Args:
+        geometry (Geometry): packed surfaces outside of instances, without a BVH
+        instances (list[Instance]): instances, whose `primitives()` are the
+            (spheres, triangles, meshes) of the surface they place
+        material_id (Callable): maps a surface to its material id
+
+    Returns:
+        Geometry
+    """
+    dtype = geometry.triangle_v0.dtype
+    prototypes, slots = [], {}
+    for instance in instances:
+        if id(instance.geometry) not in slots:
+            slots[id(instance.geometry)] = len(prototypes)
+            spheres, triangles, meshes = instance.primitives()
+            prototypes.append(pack_geometry(spheres, [], triangles, material_id, 'bvh', meshes, dtype))
+
+    lower, upper, placed = [], [], []
+    for k, instance in enumerate(instances):
+        prototype = prototypes[slots[id(instance.geometry)]]
+        if prototype.bvh_count.shape[0] == 0:
+            continue # nothing to hit
+        low, high = placed_bounds(prototype.bvh_min[0].astype(float), prototype.bvh_max[0].astype(float),
+                                  instance.transform)
+        lower.append(low)
+        upper.append(high)
+        placed.append(k)
+
+    bmin, bmax, kind, index = primitive_bounds(geometry)
+    if bmin.shape[0] + len(placed) == 0:
+        return geometry
+    bmin = np.concatenate((bmin, np.array(lower, dtype=dtype).reshape(-1, 3)))
+    bmax = np.concatenate((bmax, np.array(upper, dtype=dtype).reshape(-1, 3)))
+    kind = np.concatenate((kind, np.full(len(placed), INSTANCE, dtype=np.int64)))
+    index = np.concatenate((index, np.array(placed, dtype=np.int64)))
+    node_min, node_max, node_start, node_count, order = build_bvh(*widen(bmin, bmax))
+
+    # Append the primitives and trees of the prototypes
+    spheres, triangles = geometry.sphere_radius.shape[0], geometry.triangle_v0.shape[0]
+    parts = {name: [array] for name, array in geometry._asdict().items()}
+    parts.update(bvh_min=[node_min], bvh_max=[node_max], bvh_start=[node_start], bvh_count=[node_count],
+                 bvh_kind=[kind[order]], bvh_index=[index[order]])
+    nodes, entries = node_start.shape[0], order.shape[0]
+    roots = []
+    for prototype in prototypes:
+        for name in ('sphere_center', 'sphere_radius', 'sphere_material',
+                     'triangle_v0', 'triangle_e1', 'triangle_e2', 'triangle_normal', 'triangle_material'):
+            parts[name].append(getattr(prototype, name))
+        leaf = prototype.bvh_count > 0
+        parts['bvh_min'].append(prototype.bvh_min)
+        parts['bvh_max'].append(prototype.bvh_max)
+        parts['bvh_start'].append(prototype.bvh_start + np.where(leaf, entries, nodes))
+        parts['bvh_count'].append(prototype.bvh_count)
+        parts['bvh_kind'].append(prototype.bvh_kind)
+        parts['bvh_index'].append(prototype.bvh_index + np.where(prototype.bvh_kind == SPHERE, spheres, triangles))
+        roots.append(nodes)
+        spheres += prototype.sphere_radius.shape[0]
+        triangles += prototype.triangle_v0.shape[0]
+        nodes += prototype.bvh_count.shape[0]
+        entries += prototype.bvh_kind.shape[0]
+
+    packed = geometry._replace(**{name: np.ascontiguousarray(np.concatenate(arrays)) for name, arrays in parts.items()})
+    material = [-1 if instance.material is None else material_id(instance) for instance in instances]
+    return packed._replace(
+        instance_inverse=np.ascontiguousarray([instance.inverse[:3] for instance in instances], dtype=dtype),
+        instance_root=np.array([roots[slots[id(instance.geometry)]] for instance in instances], dtype=np.int64),
+        instance_material=np.array(material, dtype=np.int64),
+    )
@@ -0,0 +1,53 @@
+"""BVHs of the 'python' engine's surface groups and meshes.
+
+`SurfaceGroup` and `TriangleMesh` import this when they first build a
+hierarchy, so the surfaces package doesn't load the kernels by itself.
+"""
+from .geometry import pack_geometry
+from .kernels import MISS, closest_hit_ray, occluded_ray
+
+class Hierarchy:
+    """BVH over the spheres and triangles of a list of surfaces, or over the faces of a mesh.
+
+    Attributes:
+        geometry (Geometry): the packed primitives and their BVH
+        others (list[Surface]): surfaces of the list it doesn't hold (planes, meshes, groups...),
+            left to a linear scan
+    """
+
+    def __init__(self, surfaces=(), mesh=None):
+        """Pack the bounded surfaces and build the hierarchy over them.
+
+        Args:
+            surfaces (Iterable[Surface], optional): surfaces of a group. Defaults to none.
+            mesh (TriangleMesh, optional): mesh whose faces to hold. Defaults to None.
+        """
+        from ..surfaces import Sphere, Triangle
+
+        spheres, triangles, self.others = [], [], []
+        for surface in surfaces:
+            if isinstance(surface, Sphere):
+                spheres.append(surface)
+            elif isinstance(surface, Triangle):
+                triangles.append(surface)
+            else:
+                self.others.append(surface)
+        self._packed = (spheres, [], triangles)
+        self._mesh = mesh
+        self.geometry = pack_geometry(spheres, [], triangles, lambda s: 0, accel='bvh',
+                                      meshes=() if mesh is None else [mesh])
+
+    def closest(self, origin, direction, t0, t1):
+        """Closest hit of a ray in [t0, t1] among the held primitives
+
+        Returns:
+            tuple | None: (surface, t, normal), the surface being the mesh for its faces
+        """
+        t, kind, index, normal = closest_hit_ray(self.geometry, origin, direction, t0, t1)
+        if kind == MISS:
+            return None
+        return self._packed[kind][index] if self._mesh is None else self._mesh, t, normal
+
+    def occluded(self, origin, direction, t0, t1):
+        """Whether any held primitive blocks the ray in [t0, t1]"""
+        return occluded_ray(self.geometry, origin, direction, t0, t1)
@@ -0,0 +1,638 @@
+"""Compiled ray-surface routines shared by the array engines.
+
+Everything here works on scalars and packed arrays, so no small NumPy
+arrays get allocated per ray. Surfaces are identified by a (kind, index)
+pair into the packed geometry. A primitive hit inside an instance is
+reported as (INSTANCE, index), see `instance_primitive`.
+
+The traversal routines take a `counts` array. When it is empty nothing is
+counted, otherwise intersection tests are added to counts[SPHERE],
+counts[PLANE], counts[TRIANGLE] and bounding box tests to counts[BOX_TESTS]. Every
+increment sits behind an always-false branch when counting is off, which
+the CPU predicts away.
+"""
+import numpy as np
+from numba import njit, types
+from numba.extending import overload
+
+from .bvh import STACK_SIZE
+from .buffers import f8, i8, b1, i8_1d, f8_any, GeometryType, signatures
+
+MISS = -1
+SPHERE = 0
+PLANE = 1
+TRIANGLE = 2
+INSTANCE = 3 # BVH entries that are instances, and surfaces hit inside one
+
+# BVH traversal stack markers: back to world space after an instance's tree,
+# and (ENTER - k) to enter instance k
+LEAVE = -1
+ENTER = -2
+
+# Extra slots of the counts array
+BOX_TESTS = 3
+SHADOW_HITS = 4
+OCCLUDER_HITS = 5
+VISIBILITY_HITS = 6
+COUNTERS = 7
+
+def real(value, like):
+    """`value` as a float of the precision of `like`, a float or a float array.
+
+    Kernels compiled at both precisions build their constants with it, a
+    float64 literal would turn float32 arithmetic into float64.
+    """
+    return np.asarray(like).dtype.type(value)
+
+@overload(real, inline='always')
+def _real(value, like):
+    dtype = like.dtype if isinstance(like, types.Array) else like
+    return lambda value, like: dtype(value)
+
+KINDS = 4 # surface kinds, see primitive_id
+
+@njit((i8, i8), cache=True, nogil=True, inline='always')
+def primitive_id(kind, index):
+    """One int for a (kind, index) pair: index * KINDS + kind, -1 for a miss"""
+    return -1 if kind == MISS else index * KINDS + kind
+
+@njit(signatures(lambda p: (p.real, p.real, p.real, p.real, p.real, p.real, p.real, p.real, p.real, p.real, p.real, p.real)), cache=True, nogil=True)
+def hit_sphere(cx, cy, cz, r, ox, oy, oz, dx, dy, dz, t0, t1):
+    """Same quadratic as `Sphere._hit`, returns np.inf on a miss."""
+    px, py, pz = ox - cx, oy - cy, oz - cz
+    A = dx*dx + dy*dy + dz*dz
+    B = dx*px + dy*py + dz*pz
+    C = px*px + py*py + pz*pz - r*r
+
+    discriminant = B*B - A*C
+    if discriminant < 0:
+        return real(np.inf, t1)
+
+    dsqrt = np.sqrt(discriminant)
+    h_1 = (-B + dsqrt) / A
+    h_2 = (-B - dsqrt) / A
+    if t0 <= h_2 <= t1:
+        return h_2 # h_2 <= h_1 always
+    if t0 <= h_1 <= t1:
+        return h_1
+    return real(np.inf, t1)
+
+@njit(signatures(lambda p: (p.real, p.real, p.real, p.real, p.real, p.real, p.real, p.real, p.real, p.real, p.real, p.real, p.real, p.real)), cache=True, nogil=True)
+def hit_plane(nx, ny, nz, qx, qy, qz, ox, oy, oz, dx, dy, dz, t0, t1):
+    """Same test as `Plane._hit`, returns np.inf on a miss."""
+    denom = nx*dx + ny*dy + nz*dz
+    if np.abs(denom) < real(1e-8, denom): # parallel to the plane
+        return real(np.inf, t1)
+    t = (nx*(qx - ox) + ny*(qy - oy) + nz*(qz - oz)) / denom
+    if t0 <= t <= t1:
+        return t
+    return real(np.inf, t1)
+
+@njit(signatures(lambda p: (p.vec, p.vec, p.vec, p.real, p.real, p.real, p.real, p.real, p.real, p.real, p.real)), cache=True, nogil=True)
+def hit_triangle(v0, e1, e2, ox, oy, oz, dx, dy, dz, t0, t1):
+    """Moller-Trumbore test against a triangle stored as a vertex and two edges.
+
+    Covers the same barycentric region as `Triangle._hit`. Returns np.inf on a miss.
+    """
+    # p = d x e2
+    px = dy*e2[2] - dz*e2[1]
+    py = dz*e2[0] - dx*e2[2]
+    pz = dx*e2[1] - dy*e2[0]
+    det = e1[0]*px + e1[1]*py + e1[2]*pz
+    if det == 0:
+        return real(np.inf, t1)
+    inv = real(1.0, det) / det
+
+    sx, sy, sz = ox - v0[0], oy - v0[1], oz - v0[2]
+    beta = (sx*px + sy*py + sz*pz) * inv
+    if beta < 0 or beta > 1:
+        return real(np.inf, t1)
+
+    # q = s x e1
+    qx = sy*e1[2] - sz*e1[1]
+    qy = sz*e1[0] - sx*e1[2]
+    qz = sx*e1[1] - sy*e1[0]
+    gamma = (dx*qx + dy*qy + dz*qz) * inv
+    if gamma < 0 or beta + gamma > 1:
+        return real(np.inf, t1)
+
+    t = (e2[0]*qx + e2[1]*qy + e2[2]*qz) * inv
+    if t0 <= t <= t1:
+        return t
+    return real(np.inf, t1)
+
+@njit(signatures(lambda p: (p.vec, p.vec, p.real, p.real, p.real, p.real, p.real, p.real, p.real, p.real)), cache=True, nogil=True)
+def hit_box(bmin, bmax, ox, oy, oz, ix, iy, iz, t0, t1):
+    """Slab test against an axis aligned box, given the inverse ray direction.
+
+    Returns the entry time, or np.inf if the box is missed within [t0, t1].
+    """
+    tx0, tx1 = (bmin[0] - ox) * ix, (bmax[0] - ox) * ix
+    ty0, ty1 = (bmin[1] - oy) * iy, (bmax[1] - oy) * iy
+    tz0, tz1 = (bmin[2] - oz) * iz, (bmax[2] - oz) * iz
+    tmin = max(t0, min(tx0, tx1), min(ty0, ty1), min(tz0, tz1))
+    tmax = min(t1, max(tx0, tx1), max(ty0, ty1), max(tz0, tz1))
+    if tmin <= tmax:
+        return tmin
+    return real(np.inf, t1)
+
+@njit(signatures(lambda p: (p.real,)), cache=True, nogil=True)
+def _inverse(d):
+    if d == 0:
+        return real(1e30, d)
+    return real(1.0, d) / d
+
+@njit(signatures(lambda p: (p.geometry, i8)), cache=True, nogil=True, inline='always')
+def instance_primitive(geo, index):
+    """Decode the index of a primitive hit inside an instance.
+
+    Primitives are numbered spheres first, then triangles, and the index is
+    the instance in the high 32 bits and the primitive in the low ones. No
+    division, which would bring a zero check into every kernel asking for a
+    normal or a material.
+
+    Returns:
+        tuple: (instance, kind, index) of the primitive in the packed arrays
+    """
+    spheres = geo.sphere_radius.shape[0]
+    instance, primitive = index >> 32, index & 0xFFFFFFFF
+    if primitive < spheres:
+        return instance, SPHERE, primitive
+    return instance, TRIANGLE, primitive - spheres
+
+@njit(signatures(lambda p: (p.geometry, i8, i8, i8)), cache=True, nogil=True, inline='always')
+def instanced(geo, instance, kind, index):
+    """Index that primitive (kind, index) of `instance` is reported with, see `instance_primitive`"""
+    spheres = geo.sphere_radius.shape[0]
+    primitive = index if kind == SPHERE else spheres + index
+    return (instance << 32) | primitive
+
+@njit(signatures(lambda p: (p.mat, p.real, p.real, p.real)), cache=True, nogil=True, inline='always')
+def point_to_object(m, x, y, z):
+    """Point in the space of an instance, m being its (3, 4) world to object transform"""
+    return (m[0, 0]*x + m[0, 1]*y + m[0, 2]*z + m[0, 3],
+            m[1, 0]*x + m[1, 1]*y + m[1, 2]*z + m[1, 3],
+            m[2, 0]*x + m[2, 1]*y + m[2, 2]*z + m[2, 3])
+
+@njit(signatures(lambda p: (p.mat, p.real, p.real, p.real)), cache=True, nogil=True, inline='always')
+def vector_to_object(m, x, y, z):
+    """Direction in the space of an instance. It isn't normalized, so distances
+    along a ray are the same in both spaces."""
+    return (m[0, 0]*x + m[0, 1]*y + m[0, 2]*z,
+            m[1, 0]*x + m[1, 1]*y + m[1, 2]*z,
+            m[2, 0]*x + m[2, 1]*y + m[2, 2]*z)
+
+@njit(signatures(lambda p: (p.geometry, i8, i8, p.real, p.real, p.real, p.real, p.real, p.real, p.real, p.real)), cache=True, nogil=True)
+def hit_primitive(geo, kind, i, ox, oy, oz, dx, dy, dz, t0, t1):
+    """Intersect a single bounded primitive (sphere or triangle)"""
+    if kind == SPHERE:
+        c = geo.sphere_center[i]
+        return hit_sphere(c[0], c[1], c[2], geo.sphere_radius[i], ox, oy, oz, dx, dy, dz, t0, t1)
+    return hit_triangle(geo.triangle_v0[i], geo.triangle_e1[i], geo.triangle_e2[i], ox, oy, oz, dx, dy, dz, t0, t1)
+
+@njit(signatures(lambda p: (p.geometry, i8, p.real, p.real, p.real, p.real, p.real, p.real, p.real, p.real)), cache=True, nogil=True)
+def _hit_instanced(geo, index, ox, oy, oz, dx, dy, dz, t0, t1):
+    """Intersect primitive `index` of an instance, see `instance_primitive`"""
+    instance, kind, index = instance_primitive(geo, index)
+    m = geo.instance_inverse[instance]
+    ox, oy, oz = point_to_object(m, ox, oy, oz)
+    dx, dy, dz = vector_to_object(m, dx, dy, dz)
+    return hit_primitive(geo, kind, index, ox, oy, oz, dx, dy, dz, t0, t1)
+
+@njit(signatures(lambda p: (p.geometry, i8, i8, p.real, p.real, p.real, p.real, p.real, p.real, p.real, p.real)), cache=True, nogil=True, inline='always')
+def hit_surface(geo, kind, i, ox, oy, oz, dx, dy, dz, t0, t1):
+    """Intersect a single surface of any kind, planes and primitives of instances included"""
+    if kind == PLANE:
+        n, q = geo.plane_normal[i], geo.plane_point[i]
+        return hit_plane(n[0], n[1], n[2], q[0], q[1], q[2], ox, oy, oz, dx, dy, dz, t0, t1)
+    if kind == INSTANCE:
+        return _hit_instanced(geo, i, ox, oy, oz, dx, dy, dz, t0, t1)
+    return hit_primitive(geo, kind, i, ox, oy, oz, dx, dy, dz, t0, t1)
+
+@njit(signatures(lambda p: (p.geometry, i8, i8, p.real, p.real, p.real)), cache=True, nogil=True)
+def surface_normal(geo, kind, index, px, py, pz):
+    """Normal of surface (kind, index) at point p, matching the Surface classes.
+    Instances excepted, see `instance_normal`."""
+    if kind == SPHERE:
+        c = geo.sphere_center[index]
+        r = geo.sphere_radius[index]
+        return (px - c[0]) / r, (py - c[1]) / r, (pz - c[2]) / r
+    if kind == PLANE:
+        n = geo.plane_normal[index]
+        return n[0], n[1], n[2]
+    n = geo.triangle_normal[index]
+    return n[0], n[1], n[2]
+
+@njit(signatures(lambda p: (p.geometry, i8, p.real, p.real, p.real)), cache=True, nogil=True)
+def instance_normal(geo, index, px, py, pz):
+    """World space normal at point p of primitive `index` of an instance.
+
+    Kept apart from `surface_normal`, the kernels branch to it on INSTANCE
+    hits: a single extra branch in there slows every other hit down.
+    """
+    instance, kind, index = instance_primitive(geo, index)
+    m = geo.instance_inverse[instance]
+    qx, qy, qz = point_to_object(m, px, py, pz)
+    nx, ny, nz = surface_normal(geo, kind, index, qx, qy, qz)
+    # normals go through the transpose of the world to object transform
+    wx = m[0, 0]*nx + m[1, 0]*ny + m[2, 0]*nz
+    wy = m[0, 1]*nx + m[1, 1]*ny + m[2, 1]*nz
+    wz = m[0, 2]*nx + m[1, 2]*ny + m[2, 2]*nz
+    norm = np.sqrt(wx*wx + wy*wy + wz*wz)
+    return wx / norm, wy / norm, wz / norm
+
+@njit(signatures(lambda p: (p.geometry, i8)), cache=True, nogil=True)
+def instance_material(geo, index):
+    """Material id of primitive `index` of an instance, or the instance's override"""
+    instance, kind, index = instance_primitive(geo, index)
+    if geo.instance_material[instance] >= 0:
+        return geo.instance_material[instance]
+    if kind == SPHERE:
+        return geo.sphere_material[index]
+    return geo.triangle_material[index]
+
+@njit(signatures(lambda p: (p.geometry, i8, i8)), cache=True, nogil=True)
+def surface_material(geo, kind, index):
+    """Material id of surface (kind, index), instances excepted, see `instance_material`"""
+    if kind == SPHERE:
+        return geo.sphere_material[index]
+    if kind == PLANE:
+        return geo.plane_material[index]
+    return geo.triangle_material[index]
+
+@njit(signatures(lambda p: (p.geometry, i8_1d, i8_1d, p.real, p.real, p.real, p.real, p.real, p.real, p.real, p.real)), cache=True, nogil=True)
+def _closest_bvh(geo, stack, counts, ox, oy, oz, dx, dy, dz, t0, t1):
+    ix, iy, iz = _inverse(dx), _inverse(dy), _inverse(dz)
+    bmin, bmax = geo.bvh_min, geo.bvh_max
+    kind, index = MISS, -1
+    counting = counts.shape[0] > 0
+    if counting:
+        counts[BOX_TESTS] += 1
+
+    top = 0
+    if hit_box(bmin[0], bmax[0], ox, oy, oz, ix, iy, iz, t0, t1) != np.inf:
+        stack[0] = 0
+        top = 1
+
+    while top > 0:
+        top -= 1
+        node = stack[top]
+        if counting:
+            counts[BOX_TESTS] += 1
+        # t1 may have shrunk since this node was pushed
+        if hit_box(bmin[node], bmax[node], ox, oy, oz, ix, iy, iz, t0, t1) == np.inf:
+            continue
+
+        start, count = geo.bvh_start[node], geo.bvh_count[node]
+        if count > 0:
+            for k in range(start, start + count):
+                if counting:
+                    counts[geo.bvh_kind[k]] += 1
+                t = hit_primitive(geo, geo.bvh_kind[k], geo.bvh_index[k], ox, oy, oz, dx, dy, dz, t0, t1)
+                if t != np.inf:
+                    t1, kind, index = t, geo.bvh_kind[k], geo.bvh_index[k]
+            continue
+
+        # Visit the nearer child first
+        if counting:
+            counts[BOX_TESTS] += 2
+        left, right = start, start + 1
+        t_left = hit_box(bmin[left], bmax[left], ox, oy, oz, ix, iy, iz, t0, t1)
+        t_right = hit_box(bmin[right], bmax[right], ox, oy, oz, ix, iy, iz, t0, t1)
+        if t_left > t_right:
+            left, right = right, left
+            t_left, t_right = t_right, t_left
+        if t_right != np.inf:
+            stack[top] = right
+            top += 1
+        if t_left != np.inf:
+            stack[top] = left
+            top += 1
+
+    return t1, kind, index
+
+@njit(signatures(lambda p: (p.geometry, i8_1d, i8_1d, p.real, p.real, p.real, p.real, p.real, p.real, p.real, p.real)), cache=True, nogil=True)
+def _occluded_bvh(geo, stack, counts, ox, oy, oz, dx, dy, dz, t0, t1):
+    ix, iy, iz = _inverse(dx), _inverse(dy), _inverse(dz)
+    bmin, bmax = geo.bvh_min, geo.bvh_max
+    counting = counts.shape[0] > 0
+
+    stack[0] = 0
+    top = 1
+    while top > 0:
+        top -= 1
+        node = stack[top]
+        if counting:
+            counts[BOX_TESTS] += 1
+        if hit_box(bmin[node], bmax[node], ox, oy, oz, ix, iy, iz, t0, t1) == np.inf:
+            continue
+
+        start, count = geo.bvh_start[node], geo.bvh_count[node]
+        if count > 0:
+            for k in range(start, start + count):
+                if counting:
+                    counts[geo.bvh_kind[k]] += 1
+                if hit_primitive(geo, geo.bvh_kind[k], geo.bvh_index[k], ox, oy, oz, dx, dy, dz, t0, t1) != np.inf:
+                    return geo.bvh_kind[k], geo.bvh_index[k]
+            continue
+
+        stack[top] = start
+        stack[top + 1] = start + 1
+        top += 2
+    return MISS, -1
+
+@njit(signatures(lambda p: (p.geometry, i8_1d, i8_1d, p.real, p.real, p.real, p.real, p.real, p.real, p.real, p.real)), cache=True, nogil=True)
+def _closest_instances(geo, stack, counts, ox, oy, oz, dx, dy, dz, t0, t1):
+    """`_closest_bvh` for geometry with instances, entering their trees from the leaves.
+
+    Instance k's tree is walked by pushing (ENTER - k) when its leaf entry
+    comes up. Popping that moves the ray into the instance's space and
+    pushes LEAVE under the root of its tree, and popping LEAVE moves it back.
+    """
+    wox, woy, woz, wdx, wdy, wdz = ox, oy, oz, dx, dy, dz # the ray in world space
+    ix, iy, iz = _inverse(dx), _inverse(dy), _inverse(dz)
+    bmin, bmax = geo.bvh_min, geo.bvh_max
+    kind, index = MISS, -1
+    instance = -1
+    counting = counts.shape[0] > 0
+    if counting:
+        counts[BOX_TESTS] += 1
+
+    top = 0
+    if hit_box(bmin[0], bmax[0], ox, oy, oz, ix, iy, iz, t0, t1) != np.inf:
+        stack[0] = 0
+        top = 1
+
+    while top > 0:
+        top -= 1
+        node = stack[top]
+        if node < 0:
+            if node == LEAVE:
+                instance = -1
+                ox, oy, oz, dx, dy, dz = wox, woy, woz, wdx, wdy, wdz
+            else:
+                instance = ENTER - node
+                m = geo.instance_inverse[instance]
+                ox, oy, oz = point_to_object(m, wox, woy, woz)
+                dx, dy, dz = vector_to_object(m, wdx, wdy, wdz)
+                stack[top] = LEAVE
+                stack[top + 1] = geo.instance_root[instance]
+                top += 2
+            ix, iy, iz = _inverse(dx), _inverse(dy), _inverse(dz)
+            continue
+
+        if counting:
+            counts[BOX_TESTS] += 1
+        # t1 may have shrunk since this node was pushed
+        if hit_box(bmin[node], bmax[node], ox, oy, oz, ix, iy, iz, t0, t1) == np.inf:
+            continue
+
+        start, count = geo.bvh_start[node], geo.bvh_count[node]
+        if count > 0:
+            for k in range(start, start + count):
+                entry, i = geo.bvh_kind[k], geo.bvh_index[k]
+                if entry == INSTANCE:
+                    stack[top] = ENTER - i
+                    top += 1
+                    continue
+                if counting:
+                    counts[entry] += 1
+                t = hit_primitive(geo, entry, i, ox, oy, oz, dx, dy, dz, t0, t1)
+                if t != np.inf:
+                    t1, kind, index = t, entry, i
+                    if instance >= 0:
+                        kind, index = INSTANCE, instanced(geo, instance, entry, i)
+            continue
+
+        # Visit the nearer child first
+        if counting:
+            counts[BOX_TESTS] += 2
+        left, right = start, start + 1
+        t_left = hit_box(bmin[left], bmax[left], ox, oy, oz, ix, iy, iz, t0, t1)
+        t_right = hit_box(bmin[right], bmax[right], ox, oy, oz, ix, iy, iz, t0, t1)
+        if t_left > t_right:
+            left, right = right, left
+            t_left, t_right = t_right, t_left
+        if t_right != np.inf:
+            stack[top] = right
+            top += 1
+        if t_left != np.inf:
+            stack[top] = left
+            top += 1
+
+    return t1, kind, index
+
+@njit(signatures(lambda p: (p.geometry, i8_1d, i8_1d, p.real, p.real, p.real, p.real, p.real, p.real, p.real, p.real)), cache=True, nogil=True)
+def _occluded_instances(geo, stack, counts, ox, oy, oz, dx, dy, dz, t0, t1):
+    """`_occluded_bvh` for geometry with instances, entering them like `_closest_instances`"""
+    wox, woy, woz, wdx, wdy, wdz = ox, oy, oz, dx, dy, dz
+    ix, iy, iz = _inverse(dx), _inverse(dy), _inverse(dz)
+    bmin, bmax = geo.bvh_min, geo.bvh_max
+    instance = -1
+    counting = counts.shape[0] > 0
+
+    stack[0] = 0
+    top = 1
+    while top > 0:
+        top -= 1
+        node = stack[top]
+        if node < 0:
+            if node == LEAVE:
+                instance = -1
+                ox, oy, oz, dx, dy, dz = wox, woy, woz, wdx, wdy, wdz
+            else:
+                instance = ENTER - node
+                m = geo.instance_inverse[instance]
+                ox, oy, oz = point_to_object(m, wox, woy, woz)
+                dx, dy, dz = vector_to_object(m, wdx, wdy, wdz)
+                stack[top] = LEAVE
+                stack[top + 1] = geo.instance_root[instance]
+                top += 2
+            ix, iy, iz = _inverse(dx), _inverse(dy), _inverse(dz)
+            continue
+
+        if counting:
+            counts[BOX_TESTS] += 1
+        if hit_box(bmin[node], bmax[node], ox, oy, oz, ix, iy, iz, t0, t1) == np.inf:
+            continue
+
+        start, count = geo.bvh_start[node], geo.bvh_count[node]
+        if count > 0:
+            for k in range(start, start + count):
+                entry, i = geo.bvh_kind[k], geo.bvh_index[k]
+                if entry == INSTANCE:
+                    stack[top] = ENTER - i
+                    top += 1
+                    continue
+                if counting:
+                    counts[entry] += 1
+                if hit_primitive(geo, entry, i, ox, oy, oz, dx, dy, dz, t0, t1) != np.inf:
+                    if instance >= 0:
+                        return INSTANCE, instanced(geo, instance, entry, i)
+                    return entry, i
+            continue
+
+        stack[top] = start
+        stack[top + 1] = start + 1
+        top += 2
+    return MISS, -1
+
+@njit(signatures(lambda p: (p.geometry, i8_1d, i8_1d, p.real, p.real, p.real, p.real, p.real, p.real, p.real, p.real)), cache=True, nogil=True, inline='always')
+def closest_hit(geo, stack, counts, ox, oy, oz, dx, dy, dz, t0, t1):
+    """Closest surface hit along a ray within [t0, t1].
+
+    Spheres, triangles and instances go through the BVH when the geometry
+    has one (it always does when there are instances), planes are always
+    tested linearly.
+
+    Args:
+        stack (np.ndarray): int64 scratch space of size bvh.STACK_SIZE
+        counts (np.ndarray): int64 test counters, see the module docstring
+
+    Returns:
+        tuple: (t, kind, index), with kind == MISS if nothing was hit.
+    """
+    kind, index = MISS, -1
+
+    if geo.bvh_count.shape[0] > 0:
+        # the plain walk without instances, the markers cost it measurably
+        if geo.instance_root.shape[0] > 0:
+            t, k, i = _closest_instances(geo, stack, counts, ox, oy, oz, dx, dy, dz, t0, t1)
+        else:
+            t, k, i = _closest_bvh(geo, stack, counts, ox, oy, oz, dx, dy, dz, t0, t1)
+        if k != MISS:
+            t1, kind, index = t, k, i
+    else:
+        if counts.shape[0] > 0:
+            counts[SPHERE] += geo.sphere_radius.shape[0]
+            counts[TRIANGLE] += geo.triangle_v0.shape[0]
+        c, r = geo.sphere_center, geo.sphere_radius
+        for i in range(r.shape[0]):
+            t = hit_sphere(c[i, 0], c[i, 1], c[i, 2], r[i], ox, oy, oz, dx, dy, dz, t0, t1)
+            if t != np.inf:
+                t1, kind, index = t, SPHERE, i
+
+        v0, e1, e2 = geo.triangle_v0, geo.triangle_e1, geo.triangle_e2
+        for i in range(v0.shape[0]):
+            t = hit_triangle(v0[i], e1[i], e2[i], ox, oy, oz, dx, dy, dz, t0, t1)
+            if t != np.inf:
+                t1, kind, index = t, TRIANGLE, i
+
+    n, q = geo.plane_normal, geo.plane_point
+    if counts.shape[0] > 0:
+        counts[PLANE] += n.shape[0]
+    for i in range(n.shape[0]):
+        t = hit_plane(n[i, 0], n[i, 1], n[i, 2], q[i, 0], q[i, 1], q[i, 2], ox, oy, oz, dx, dy, dz, t0, t1)
+        if t != np.inf:
+            t1, kind, index = t, PLANE, i
+
+    if kind == MISS:
+        return real(np.inf, t1), kind, index
+    return t1, kind, index
+
+@njit(signatures(lambda p: (p.geometry, i8_1d, i8_1d, p.real, p.real, p.real, p.real, p.real, p.real, p.real, p.real)), cache=True, nogil=True, inline='always')
+def occluder(geo, stack, counts, ox, oy, oz, dx, dy, dz, t0, t1):
+    """Any-hit query: the first surface found blocking [t0, t1].
+
+    Returns:
+        tuple: (kind, index), with kind == MISS if nothing blocks the ray.
+    """
+    counting = counts.shape[0] > 0
+    n, q = geo.plane_normal, geo.plane_point
+    for i in range(n.shape[0]):
+        if hit_plane(n[i, 0], n[i, 1], n[i, 2], q[i, 0], q[i, 1], q[i, 2], ox, oy, oz, dx, dy, dz, t0, t1) != np.inf:
+            if counting:
+                counts[PLANE] += i + 1
+            return PLANE, i
+    if counting:
+        counts[PLANE] += n.shape[0]
+
+    if geo.bvh_count.shape[0] > 0:
+        if geo.instance_root.shape[0] > 0:
+            return _occluded_instances(geo, stack, counts, ox, oy, oz, dx, dy, dz, t0, t1)
+        return _occluded_bvh(geo, stack, counts, ox, oy, oz, dx, dy, dz, t0, t1)
+
+    c, r = geo.sphere_center, geo.sphere_radius
+    for i in range(r.shape[0]):
+        if hit_sphere(c[i, 0], c[i, 1], c[i, 2], r[i], ox, oy, oz, dx, dy, dz, t0, t1) != np.inf:
+            if counting:
+                counts[SPHERE] += i + 1
+            return SPHERE, i
+    if counting:
+        counts[SPHERE] += r.shape[0]
+
+    v0, e1, e2 = geo.triangle_v0, geo.triangle_e1, geo.triangle_e2
+    for i in range(v0.shape[0]):
+        if hit_triangle(v0[i], e1[i], e2[i], ox, oy, oz, dx, dy, dz, t0, t1) != np.inf:
+            if counting:
+                counts[TRIANGLE] += i + 1
+            return TRIANGLE, i
+    if counting:
+        counts[TRIANGLE] += v0.shape[0]
+    return MISS, -1
+
+@njit(signatures(lambda p: (p.geometry, i8_1d, i8_1d, p.real, p.real, p.real, p.real, p.real, p.real, p.real, p.real)), cache=True, nogil=True)
+def occluded(geo, stack, counts, ox, oy, oz, dx, dy, dz, t0, t1):
+    """Any-hit query: True as soon as one surface blocks [t0, t1]."""
+    return occluder(geo, stack, counts, ox, oy, oz, dx, dy, dz, t0, t1)[0] != MISS
+
+@njit([(GeometryType, f8_any, f8_any, f8, f8)], cache=True, nogil=True)
+def closest_hit_ray(geo, origin, direction, t0, t1):
+    """`closest_hit` for a single (origin, direction) ray, for the Python surfaces.
+
+    Returns:
+        tuple: (t, kind, index, normal)
+    """
+    stack = np.empty(STACK_SIZE, dtype=np.int64)
+    ox, oy, oz = origin[0], origin[1], origin[2]
+    dx, dy, dz = direction[0], direction[1], direction[2]
+    t, kind, index = closest_hit(geo, stack, stack[:0], ox, oy, oz, dx, dy, dz, t0, t1)
+    normal = np.zeros(3)
+    if kind == INSTANCE:
+        normal[0], normal[1], normal[2] = instance_normal(geo, index, ox + t*dx, oy + t*dy, oz + t*dz)
+    elif kind != MISS:
+        normal[0], normal[1], normal[2] = surface_normal(geo, kind, index, ox + t*dx, oy + t*dy, oz + t*dz)
+    return t, kind, index, normal
+
+@njit([(GeometryType, f8_any, f8_any, f8, f8)], cache=True, nogil=True)
+def occluded_ray(geo, origin, direction, t0, t1):
+    """`occluded` for a single (origin, direction) ray, for the Python surfaces"""
+    stack = np.empty(STACK_SIZE, dtype=np.int64) # per call, surfaces are hit from many threads
+    return occluded(geo, stack, stack[:0], origin[0], origin[1], origin[2], direction[0], direction[1], direction[2], t0, t1)
+
+# Every kind of draw at a point hashes its own salts, stream + SALTS * draw,
+# so e.g. a ray's roulette and its light picks aren't the same number
+SALTS = 3
+ROULETTE_SALT = 0
+CLUSTER_SALT = 1
+LIGHT_SALT = 2
+
+@njit(signatures(lambda p: (p.real, p.real, p.real, i8)), cache=True, nogil=True)
+def random_unit(x, y, z, salt):
+    """Pseudo-random number in [0, 1) hashed from a point and a salt, so it's
+    the same for the same point in every engine, tile layout and run.
+    Hashed in float64 at both precisions, float32 has too few digits for it."""
+    u = np.sin(x*12.9898 + y*78.233 + z*37.719 + salt*0.61803) * 43758.5453
+    return u - np.floor(u)
+
+@njit(signatures(lambda p: (p.real, p.real, p.real, p.real, p.real, p.real, p.real, b1, i8)), cache=True, nogil=True)
+def survival(wr, wg, wb, x, y, z, min_weight, roulette, bounce):
+    """Chance that a reflected ray with path weight (wr, wg, wb), leaving from
+    (x, y, z), is traced at all.
+
+    Rays whose largest weight component is at most `min_weight` are dropped.
+    With `roulette` the others survive with a chance equal to that weight
+    (capped at 1), and a surviving ray's weight is divided by it so the
+    image stays unbiased. The random number is `random_unit` of the ray's
+    origin and `bounce` (in the ROULETTE_SALT stream), so a given ray gets
+    the same fate in every engine.
+
+    Returns:
+        float: 0 to drop the ray, otherwise the chance it was kept with
+    """
+    w = max(wr, max(wg, wb))
+    if w <= min_weight:
+        return real(0.0, w)
+    if not roulette or w >= 1:
+        return real(1.0, w)
+    return w if random_unit(x, y, z, ROULETTE_SALT + SALTS * bounce) < w else real(0.0, w)
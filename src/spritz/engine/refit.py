@@ -0,0 +1,213 @@
+"""Refitting a packed BVH in place after some primitives moved.
+
+When a few spheres or triangles move between frames, building the tree
+again costs far more than what moved. `BVHRefit` instead recomputes the
+boxes of the leaves holding the moved primitives, then those of their
+ancestors, stopping as soon as a box doesn't change, so an update takes
+time proportional to the number of moved primitives times the depth of
+the tree.
+
+The topology stays the one built for the old positions, so as things keep
+moving the boxes grow and overlap and the tree gets slower to trace. Its
+surface area heuristic (SAH) cost is kept up to date by every refit, and
+the owner builds the tree again once it's REBUILD_COST times what it was
+right after the last build.
+
+Only the world's tree is refitted: the trees of instanced geometry are in
+object space, moving an instance only moves its box in the world's tree.
+"""
+import numpy as np
+from numba import njit
+
+from .buffers import i8, i8_1d, signatures
+from .bvh import build_bvh
+from .geometry import widen
+from .kernels import SPHERE, TRIANGLE, INSTANCE
+
+REBUILD_COST = 1.5
+
+@njit((i8_1d, i8_1d, i8), cache=True, nogil=True)
+def _parents(node_start, node_count, nodes):
+    """Parent of every node of a tree, -1 for the root"""
+    parent = np.full(nodes, -1, dtype=np.int64)
+    for node in range(nodes):
+        if node_count[node] == 0:
+            parent[node_start[node]] = node
+            parent[node_start[node] + 1] = node
+    return parent
+
+@njit((i8_1d, i8_1d, i8, i8), cache=True, nogil=True)
+def _leaves(node_start, node_count, nodes, entries):
+    """Leaf holding every entry of a tree"""
+    leaf = np.empty(entries, dtype=np.int64)
+    for node in range(nodes):
+        for k in range(node_start[node], node_start[node] + node_count[node]):
+            leaf[k] = node
+    return leaf
+
+@njit(signatures(lambda p: (p.vec, p.vec, i8)), cache=True, nogil=True)
+def _node_cost(lo, hi, count):
+    """SAH cost of a node: its area times one traversal step, or the tests of its primitives for a leaf"""
+    area = (hi[0] - lo[0]) * (hi[1] - lo[1]) + (hi[1] - lo[1]) * (hi[2] - lo[2]) + (hi[2] - lo[2]) * (hi[0] - lo[0])
+    return np.float64(area) * max(count, 1)
+
+@njit(signatures(lambda p: (p.mat, p.mat, i8_1d, i8)), cache=True, nogil=True)
+def _tree_cost(node_min, node_max, node_count, nodes):
+    total = 0.0
+    for node in range(nodes):
+        total += _node_cost(node_min[node], node_max[node], node_count[node])
+    return total
+
+@njit(signatures(lambda p: (p.mat, p.mat, i8_1d, i8_1d, i8_1d, p.mat, p.mat, i8_1d)), cache=True, nogil=True)
+def refit_nodes(node_min, node_max, node_start, node_count, parent, entry_min, entry_max, leaves):
+    """Fit `leaves` to the boxes of their entries again, then their ancestors to their children.
+
+    Returns:
+        float: change of the tree's summed SAH cost
+    """
+    delta = 0.0
+    for leaf in leaves:
+        node = leaf
+        while node >= 0:
+            start, count = node_start[node], node_count[node]
+            old = _node_cost(node_min[node], node_max[node], count)
+            changed = False
+            for a in range(3):
+                if count > 0:
+                    lo, hi = entry_min[start, a], entry_max[start, a]
+                    for k in range(start + 1, start + count):
+                        lo, hi = min(lo, entry_min[k, a]), max(hi, entry_max[k, a])
+                else:
+                    lo = min(node_min[start, a], node_min[start + 1, a])
+                    hi = max(node_max[start, a], node_max[start + 1, a])
+                changed = changed or lo != node_min[node, a] or hi != node_max[node, a]
+                node_min[node, a], node_max[node, a] = lo, hi
+            if not changed:
+                break # so are its ancestors
+            delta += _node_cost(node_min[node], node_max[node], count) - old
+            node = parent[node]
+    return delta
+
+class BVHRefit:
+    """Keeps the world's tree of a packed Geometry fitted to its moving primitives.
+
+    The geometry's arrays are updated in place: write the new state of the
+    primitives into them, then call `move` with their indices.
+
+    Attributes:
+        geometry (Geometry): the refitted geometry
+        cost (float): SAH cost of the tree relative to its cost when it was built
+    """
+
+    def __init__(self, geometry, instance_min=None, instance_max=None):
+        """Index the world's tree of a geometry.
+
+        Args:
+            geometry (Geometry): packed geometry with a BVH
+            instance_min (np.ndarray, optional): (K, 3) lower corner of every instance
+                in world space, needed when the geometry has instances
+            instance_max (np.ndarray, optional): (K, 3) upper corners
+        """
+        self.geometry = geometry
+        k = geometry.instance_root.shape[0]
+        self._instance_min = np.zeros((k, 3)) if instance_min is None else np.array(instance_min, dtype=float)
+        self._instance_max = np.zeros((k, 3)) if instance_max is None else np.array(instance_max, dtype=float)
+        self._index()
+
+    def __repr__(self):
+        return f"<BVHRefit: {self.nodes} nodes, cost {self.cost:.2f}>"
+
+    def _index(self):
+        g = self.geometry
+        # The trees of instanced geometry follow the world's
+        self.nodes = int(g.instance_root.min()) if g.instance_root.shape[0] else g.bvh_count.shape[0]
+        self.entries = int(g.bvh_count[:self.nodes].sum())
+        self._parent = _parents(g.bvh_start, g.bvh_count, self.nodes)
+        self._leaf = _leaves(g.bvh_start, g.bvh_count, self.nodes, self.entries)
+
+        kinds, indices = g.bvh_kind[:self.entries], g.bvh_index[:self.entries]
+        self._entry = {}
+        for kind, count in ((SPHERE, g.sphere_radius.shape[0]), (TRIANGLE, g.triangle_v0.shape[0]),
+                            (INSTANCE, g.instance_root.shape[0])):
+            entry = np.full(count, -1, dtype=np.int64)
+            where = np.flatnonzero(kinds == kind)
+            entry[indices[where]] = where
+            self._entry[kind] = entry
+
+        self._entry_min = np.empty((self.entries, 3), dtype=g.bvh_min.dtype)
+        self._entry_max = np.empty((self.entries, 3), dtype=g.bvh_min.dtype)
+        for kind in self._entry:
+            where = np.flatnonzero(kinds == kind)
+            self._entry_min[where], self._entry_max[where] = self._bounds(kind, indices[where])
+
+        self._total = _tree_cost(g.bvh_min, g.bvh_max, g.bvh_count, self.nodes)
+        self._built = self._relative(self._total)
+
+    def _relative(self, total):
+        """SAH cost of the tree, per unit of its root's area"""
+        root = _node_cost(self.geometry.bvh_min[0], self.geometry.bvh_max[0], 0)
+        return total / root if root > 0 else 1.0
+
+    @property
+    def cost(self):
+        return self._relative(self._total) / self._built if self._built > 0 else 1.0
+
+    def _bounds(self, kind, index):
+        """Boxes of primitives of one kind as the tree holds them, from the geometry's arrays"""
+        g = self.geometry
+        if kind == SPHERE:
+            c, r = g.sphere_center[index], np.abs(g.sphere_radius[index])[:, None]
+            bmin, bmax = c - r, c + r
+        elif kind == TRIANGLE:
+            v0 = g.triangle_v0[index]
+            v1, v2 = v0 + g.triangle_e1[index], v0 + g.triangle_e2[index]
+            bmin, bmax = np.minimum(np.minimum(v0, v1), v2), np.maximum(np.maximum(v0, v1), v2)
+        else:
+            bmin = self._instance_min[index].astype(g.bvh_min.dtype)
+            bmax = self._instance_max[index].astype(g.bvh_min.dtype)
+        return widen(bmin, bmax)
+
+    def move(self, kind, index, instance_min=None, instance_max=None):
+        """Refit the tree after primitives of one kind moved.
+
+        Args:
+            kind (int): SPHERE, TRIANGLE or INSTANCE
+            index (ArrayLike): indices of the moved primitives, whose new state
+                is already in the geometry's arrays
+            instance_min (ArrayLike, optional): (N, 3) new world space lower corners of moved instances
+            instance_max (ArrayLike, optional): (N, 3) new upper corners
+        """
+        index = np.asarray(index, dtype=np.int64).reshape(-1)
+        if kind == INSTANCE:
+            self._instance_min[index], self._instance_max[index] = instance_min, instance_max
+        entry = self._entry[kind][index]
+        index, entry = index[entry >= 0], entry[entry >= 0] # instances of empty geometry aren't in the tree
+        self._entry_min[entry], self._entry_max[entry] = self._bounds(kind, index)
+
+        g = self.geometry
+        leaves = np.unique(self._leaf[entry])
+        self._total += refit_nodes(g.bvh_min, g.bvh_max, g.bvh_start, g.bvh_count, self._parent,
+                                   self._entry_min, self._entry_max, leaves)
+
+    def rebuild(self):
+        """Build the world's tree again over the current boxes.
+
+        Returns:
+            Geometry: copy of the geometry with the new tree, which is the one refitted from now on
+        """
+        g = self.geometry
+        node_min, node_max, node_start, node_count, order = build_bvh(self._entry_min, self._entry_max)
+        # The trees of instanced geometry move along with the end of the world's
+        shift = node_start.shape[0] - self.nodes
+        nodes, entries = slice(self.nodes, None), slice(self.entries, None)
+        self.geometry = g._replace(
+            bvh_min=np.concatenate((node_min, g.bvh_min[nodes])),
+            bvh_max=np.concatenate((node_max, g.bvh_max[nodes])),
+            bvh_start=np.concatenate((node_start, g.bvh_start[nodes] + np.where(g.bvh_count[nodes] > 0, 0, shift))),
+            bvh_count=np.concatenate((node_count, g.bvh_count[nodes])),
+            bvh_kind=np.concatenate((g.bvh_kind[:self.entries][order], g.bvh_kind[entries])),
+            bvh_index=np.concatenate((g.bvh_index[:self.entries][order], g.bvh_index[entries])),
+            instance_root=g.instance_root + shift,
+        )
+        self._index()
+        return self.geometry
@@ -0,0 +1,79 @@
+"""Render statistics."""
+import threading
+
+COUNTERS = (
+    'primary_rays', 'shadow_rays', 'secondary_rays',
+    'sphere_tests', 'plane_tests', 'triangle_tests', 'box_tests',
+    'hits', 'shadow_hits', 'occluder_cache_hits', 'visibility_cache_hits', 'terminated_rays',
+)
+
+STAGES = ('generate', 'intersect', 'shade', 'reflect')
+
+class RenderStats:
+    """Counters and stage timings filled in by `Scene.render(..., stats=RenderStats())`.
+
+    Nothing is counted or timed unless a render is given a stats object.
+    Tiles rendered in parallel all report into the same object, so stage
+    times are summed over the worker threads.
+
+    Attributes:
+        primary_rays (int): camera rays, including anti-aliasing samples
+        shadow_rays (int): rays traced towards point lights
+        secondary_rays (int): mirror reflection rays
+        sphere_tests (int): ray-sphere intersection tests
+        plane_tests (int): ray-plane intersection tests
+        triangle_tests (int): ray-triangle intersection tests (mesh faces included)
+        box_tests (int): BVH node bounding box tests
+        hits (int): primary and secondary rays that hit a surface
+        shadow_hits (int): shadow rays blocked by a surface
+        occluder_cache_hits (int): shadow rays blocked by the surface that blocked
+            the previous shadow ray towards the same light, found with a single test
+        visibility_cache_hits (int): shadow rays not traced because a `VisibilityCache`
+            already knew the answer
+        terminated_rays (int): rays that hit a reflective surface but weren't
+            reflected, because they were on the last of `max_bounces` or were
+            dropped by `min_weight` or Russian roulette. Hits on surfaces with
+            no specular color aren't counted, nothing would be reflected anyway.
+        stage_seconds (dict[str, float]): time spent generating camera rays,
+            intersecting, shading (lights and shadow rays) and reflecting. Camera
+            rays of whole tiles are generated inside the intersection kernel and
+            count as intersecting, 'generate' only covers anti-aliasing samples.
+    """
+
+    def __init__(self):
+        for name in COUNTERS:
+            setattr(self, name, 0)
+        self.stage_seconds = dict.fromkeys(STAGES, 0.0)
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return (f"<RenderStats: {self.primary_rays} primary, {self.shadow_rays} shadow, "
+                f"{self.secondary_rays} secondary rays>")
+
+    @property
+    def rays(self):
+        """Total rays traced"""
+        return self.primary_rays + self.shadow_rays + self.secondary_rays
+
+    @property
+    def intersection_tests(self):
+        """Total ray-primitive tests, bounding boxes excluded"""
+        return self.sphere_tests + self.plane_tests + self.triangle_tests
+
+    def add(self, **counts):
+        """Add to counters by name, e.g. add(primary_rays=64)"""
+        with self._lock:
+            for name, count in counts.items():
+                if name not in COUNTERS:
+                    raise KeyError(f"Unknown render counter {name!r}")
+                setattr(self, name, getattr(self, name) + count)
+
+    def add_time(self, stage, seconds):
+        with self._lock:
+            self.stage_seconds[stage] += seconds
+
+    def as_dict(self):
+        """Plain dict of every counter and stage time, e.g. for JSON output"""
+        result = {name: getattr(self, name) for name in COUNTERS}
+        result['stage_seconds'] = dict(self.stage_seconds)
+        return result
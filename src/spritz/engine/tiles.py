@@ -0,0 +1,103 @@
+"""Tile-parallel rendering.
+
+The image is cut into tiles that are rendered by a pool of worker threads.
+Every worker owns a deque of neighbouring tiles and takes work from its
+front. A worker that runs dry steals from the back of the fullest deque,
+so expensive regions (mirrors, multi-bounce pixels) don't leave the other
+workers idle.
+
+The compiled kernels release the GIL, so the threads trace in parallel.
+Every pixel is computed the same way no matter which worker renders it,
+which keeps the output deterministic.
+"""
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+TILE_SIZE = 64
+SERIAL_TILE_SIZE = 128 # a single worker has nothing to balance, only the per-tile buffers to bound
+
+def split_tiles(width, height, tile_size=TILE_SIZE):
+    """Cut an image into tiles, in row-major order.
+
+    Returns:
+        list[tuple[int, int, int, int]]: (x0, y0, x1, y1) of every tile, end exclusive
+    """
+    return [
+        (x0, y0, min(x0 + tile_size, width), min(y0 + tile_size, height))
+        for y0 in range(0, height, tile_size)
+        for x0 in range(0, width, tile_size)
+    ]
+
+class TileScheduler:
+    """Work-stealing queue of tiles shared by a fixed number of workers."""
+
+    def __init__(self, tiles, workers):
+        """Deal the tiles out to the workers in contiguous runs.
+
+        Args:
+            tiles (list): work items, in the order they should be handed out
+            workers (int): number of workers pulling from the scheduler
+        """
+        self._deques = [
+            deque(tiles[k * len(tiles) // workers:(k + 1) * len(tiles) // workers])
+            for k in range(workers)
+        ]
+        self._locks = [threading.Lock() for _ in range(workers)]
+
+    def next(self, worker):
+        """Next tile for a worker, or None once every tile has been handed out.
+
+        Args:
+            worker (int): index of the asking worker
+        """
+        with self._locks[worker]:
+            if self._deques[worker]:
+                return self._deques[worker].popleft()
+
+        while True:
+            victim = max(range(len(self._deques)), key=lambda k: len(self._deques[k]))
+            if not self._deques[victim]:
+                return None
+            with self._locks[victim]:
+                if self._deques[victim]:
+                    return self._deques[victim].pop()
+
+def run_parallel(job, items, workers=1):
+    """Call job(*item) for every item, on a pool of work-stealing threads.
+
+    Args:
+        job (Callable): work to run for every item
+        items (list[tuple]): arguments of every call
+        workers (int, optional): worker threads, None for one per core. Defaults to 1.
+    """
+    workers = min(workers or os.cpu_count() or 1, len(items))
+    if workers <= 1:
+        for item in items:
+            job(*item)
+        return
+
+    scheduler = TileScheduler(items, workers)
+
+    def work(worker):
+        item = scheduler.next(worker)
+        while item is not None:
+            job(*item)
+            item = scheduler.next(worker)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='spritz-tile') as pool:
+        for future in [pool.submit(work, k) for k in range(workers)]:
+            future.result()
+
+def render_tiles(render_tile, width, height, tile_size=TILE_SIZE, workers=1):
+    """Render every tile of a width x height image.
+
+    Args:
+        render_tile (Callable): called as render_tile(x0, y0, x1, y1) for every tile
+        width (int): image width
+        height (int): image height
+        tile_size (int, optional): tile edge in pixels. Defaults to 64.
+        workers (int, optional): worker threads, None for one per core. Defaults to 1.
+    """
+    run_parallel(render_tile, split_tiles(width, height, tile_size), workers)
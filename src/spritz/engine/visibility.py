@@ -0,0 +1,205 @@
+"""Shadow ray results kept between renders of a static scene.
+
+Whether a point light is visible from a point on a surface doesn't depend
+on the camera, so when only the camera moves (a turntable animation, say)
+every frame casts the shadow rays the previous frame already cast. A
+`VisibilityCache` stores the outcome of every shadow ray in a hash grid
+keyed on the cell of the shading point and a coarse bucket of its normal,
+one row of per-light results per cell, and later hits in the same cell
+reuse them instead of tracing.
+
+The shared table is only read while a frame renders. Every `trace` call
+records its new results in a private table, which is also looked up, and
+those are merged into the shared one by `VisibilityCache.commit()` once
+the frame is done, so tiles rendering on parallel threads never race.
+"""
+import threading
+import weakref
+
+import numpy as np
+from numba import njit
+
+from .buffers import Visibility, i8, i8_1d, u1_2d, f8, signatures
+
+EMPTY = 0 # key of a free slot, real keys are always odd
+
+# Light states in a row
+UNKNOWN = 0
+VISIBLE = 1
+BLOCKED = 2
+
+# splitmix64 multiplier, as a signed int64
+_GOLDEN = np.int64(-7046029254386353131)
+
+@njit((i8, i8), cache=True, nogil=True, inline='always')
+def _mix(h, value):
+    h = (h ^ value) * _GOLDEN
+    return h ^ (h >> 29)
+
+@njit((f8,), cache=True, nogil=True, inline='always')
+def _bucket(n):
+    """Normal component in [-1, 1] to one of 5 buckets"""
+    return np.int64(np.floor((n + 1.0) * 2.0 + 0.5))
+
+@njit(signatures(lambda p: (p.real, p.real, p.real, p.real, p.real, p.real, f8)), cache=True, nogil=True, inline='always')
+def cell_key(x, y, z, nx, ny, nz, cell_size):
+    """Key of the grid cell holding (x, y, z), for surfaces facing (nx, ny, nz)"""
+    h = _mix(np.int64(0x5bd1e995), np.int64(np.floor(x / cell_size)))
+    h = _mix(h, np.int64(np.floor(y / cell_size)))
+    h = _mix(h, np.int64(np.floor(z / cell_size)))
+    # so the faces meeting at an edge don't share their results
+    h = _mix(h, _bucket(nx) * 25 + _bucket(ny) * 5 + _bucket(nz))
+    return h | 1
+
+@njit((i8_1d, i8), cache=True, nogil=True, inline='always')
+def _probe(keys, key):
+    """Slot of `key` in an open addressing table, or of the free slot it would go in.
+    Tables are kept at most half full, so there always is one."""
+    mask = keys.shape[0] - 1
+    k = key & mask
+    while keys[k] != key and keys[k] != EMPTY:
+        k = (k + 1) & mask
+    return k
+
+@njit((i8_1d, i8_1d, i8), cache=True, nogil=True, inline='always')
+def find_row(keys, rows, key):
+    """Row of a cell, -1 if it isn't in the table"""
+    k = _probe(keys, key)
+    return -1 if keys[k] == EMPTY else rows[k]
+
+@njit((i8_1d, i8_1d, i8_1d, i8), cache=True, nogil=True, inline='always')
+def add_row(keys, rows, count, key):
+    """Row of a cell, given a fresh one if it isn't in the table yet. -1 once the table is full.
+
+    `count[0]` is the number of rows in use, at most half the size of the table.
+    """
+    k = _probe(keys, key)
+    if keys[k] == EMPTY:
+        if 2 * (count[0] + 1) > keys.shape[0]:
+            return -1
+        keys[k] = key
+        rows[k] = count[0]
+        count[0] += 1
+    return rows[k]
+
+@njit((i8_1d, i8_1d, u1_2d, i8_1d, i8_1d, i8_1d, u1_2d), cache=True, nogil=True)
+def _merge(keys, rows, visible, count, new_keys, new_rows, new_visible):
+    """Add the rows of a table to one with room for them, filling in the lights
+    a cell already in it didn't know about"""
+    for i in range(new_keys.shape[0]):
+        if new_keys[i] == EMPTY:
+            continue
+        row = add_row(keys, rows, count, new_keys[i])
+        source = new_rows[i]
+        for j in range(visible.shape[1]):
+            if visible[row, j] == UNKNOWN:
+                visible[row, j] = new_visible[source, j]
+
+def _capacity(rows):
+    """Smallest power of two table that holds `rows` at most half full"""
+    return 1 << max(4, int(2 * rows - 1).bit_length())
+
+def _table(rows, lights):
+    """Empty (keys, rows, visible) arrays with room for `rows` cells"""
+    size = _capacity(rows)
+    return (np.zeros(size, dtype=np.int64), np.zeros(size, dtype=np.int64),
+            np.zeros((size // 2, lights), dtype=np.uint8))
+
+DISABLED = Visibility(*_table(0, 0), *_table(0, 0), np.zeros(1, dtype=np.int64), 0.0)
+
+class VisibilityCache:
+    """Point light visibility shared by the renders of a scene whose surfaces and lights don't change.
+
+    Used by the 'wavefront' engine with `Scene(visibility_cache=VisibilityCache())`.
+    The first render traces its shadow rays as usual and remembers, per grid
+    cell of `cell_size` units, whether each one reached its light. Later
+    renders, from any camera, only trace shadow rays towards lights that
+    haven't been tested from a cell yet. Diffuse and specular terms are
+    still evaluated exactly, only the visibility is shared, so shadow edges
+    become blocky at the scale of a cell. Cells a few times the size of a
+    pixel's footprint on the surfaces give the most reuse. It pays off when
+    shadow rays are expensive, e.g. in big scenes with a BVH: with a handful
+    of surfaces a lookup costs about as much as the ray.
+
+    The cache belongs to one packing of the scene: it empties itself when
+    the scene is compiled again, i.e. after `add_surface` or `add_light`,
+    and `Scene.update` clears it. Moving the camera keeps it.
+
+    Attributes:
+        cell_size (float): edge of a grid cell, in scene units
+        max_pending (int): largest number of new cells a single `trace` call records
+    """
+
+    def __init__(self, cell_size=0.1, max_pending=1 << 16):
+        if cell_size <= 0:
+            raise ValueError(f"cell_size must be positive, got {cell_size}")
+        self.cell_size = cell_size
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._owner = None
+        self._reset(0)
+
+    def __repr__(self):
+        return f"<VisibilityCache: {len(self)} cells of {self.cell_size}>"
+
+    def __len__(self):
+        """Number of cells with results"""
+        return int(self._count[0])
+
+    def clear(self):
+        """Forget every cached result"""
+        with self._lock:
+            self._reset(self._visible.shape[1])
+
+    def _reset(self, lights):
+        self._keys, self._rows, self._visible = _table(0, lights)
+        self._count = np.zeros(1, dtype=np.int64)
+        self._pending = []
+
+    def batch(self, compiled, rays, lights):
+        """Buffers for one `trace` call: the shared table, read-only, and a private one for new results.
+
+        Args:
+            compiled (CompiledScene): the scene being traced. The cache is cleared
+                first if it was filled for another one.
+            rays (int): rays in the wavefront
+            lights (int): point lights and light clusters of the scene
+
+        Returns:
+            Visibility: buffers for the kernels, to hand back to `add` after tracing
+        """
+        with self._lock:
+            owner = None if self._owner is None else self._owner()
+            if owner is not compiled:
+                self._owner = weakref.ref(compiled)
+                self._reset(lights)
+            shared = (self._keys, self._rows, self._visible)
+        # reflections can reach more cells, the private table just stops growing when it's full
+        return Visibility(*shared, *_table(min(rays, self.max_pending), lights), np.zeros(1, dtype=np.int64),
+                          float(self.cell_size))
+
+    def add(self, compiled, batch):
+        """Queue the new results of a `batch` for the next `commit()`"""
+        if batch.new_count[0] == 0:
+            return
+        with self._lock:
+            if self._owner is not None and self._owner() is compiled:
+                self._pending.append(batch)
+
+    def commit(self):
+        """Merge every queued result into the shared table.
+
+        The merged table is new, so renders still reading the old one aren't disturbed.
+        """
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, []
+            # tiles can share cells, so this overestimates the size a little
+            rows = int(self._count[0]) + sum(int(batch.new_count[0]) for batch in pending)
+            keys, indices, visible = _table(rows, self._visible.shape[1])
+            count = np.zeros(1, dtype=np.int64)
+            _merge(keys, indices, visible, count, self._keys, self._rows, self._visible)
+            for batch in pending:
+                _merge(keys, indices, visible, count, batch.new_keys, batch.new_rows, batch.new_visible)
+            self._keys, self._rows, self._visible, self._count = keys, indices, visible, count
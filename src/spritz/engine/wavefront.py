@@ -0,0 +1,608 @@
+"""Wavefront renderer.
+
+Instead of shading one pixel at a time in Python, whole arrays of rays are
+pushed through compiled stages:
+
+    intersect -> shade (lights + shadow rays) -> reflect -> intersect -> ...
+
+Rays that miss are dropped from the wavefront after shading, so every
+bounce only traces the rays that are still alive.
+
+Camera rays of a tile (`trace_tile`) are never materialized: the first
+intersect stage computes every direction from the packed camera frame as
+it goes, and all of them share the eye as their origin. A (1, 3) origin
+array stands for an origin shared by every ray of the wavefront.
+"""
+import time
+
+import numpy as np
+from numba import njit
+
+from .bvh import STACK_SIZE
+from .buffers import i8, b1, f8, i8_1d, i8_2d, ViewType, VisibilityType, EnvironmentType, signatures
+from .kernels import *
+from .visibility import DISABLED, UNKNOWN, VISIBLE, BLOCKED, cell_key, find_row, add_row
+from .environment import NO_ENVIRONMENT, sample_environment, footprint_level
+
+# Offsets along the normal that keep shadow and reflection rays from hitting
+# the surface they start on: (shadow, reflection) per precision. float32 only
+# has ~7 significant digits, so a 1e-6 offset is lost in the rounding of a
+# hit point a few units from the origin and the image fills with acne.
+OFFSETS = {
+    'float64': (1e-4, 1e-6),
+    'float32': (1e-3, 1e-4),
+}
+
+@njit(signatures(lambda p: (p.geometry, p.mat, p.mat, p.vec, i8_1d, p.mat, i8_1d, i8_1d)), cache=True, nogil=True)
+def _intersect(geo, ro, rd, hit_t, hit_material, hit_normal, hit_primitive, counts):
+    """Stage 1: closest hit for every ray in the wavefront.
+
+    `hit_primitive` gets the `primitive_id` of every hit unless it's empty.
+    """
+    stack = np.empty(STACK_SIZE, dtype=np.int64)
+    primitives = hit_primitive.shape[0] > 0
+    for i in range(ro.shape[0]):
+        ox, oy, oz = ro[i, 0], ro[i, 1], ro[i, 2]
+        dx, dy, dz = rd[i, 0], rd[i, 1], rd[i, 2]
+        t, kind, index = closest_hit(geo, stack, counts, ox, oy, oz, dx, dy, dz, real(0.0, dx), real(np.inf, dx))
+        hit_t[i] = t
+        if primitives:
+            hit_primitive[i] = primitive_id(kind, index)
+        if kind == MISS:
+            hit_material[i] = -1
+            continue
+
+        if kind == INSTANCE:
+            nx, ny, nz = instance_normal(geo, index, ox + t*dx, oy + t*dy, oz + t*dz)
+            hit_material[i] = instance_material(geo, index)
+        else:
+            nx, ny, nz = surface_normal(geo, kind, index, ox + t*dx, oy + t*dy, oz + t*dz)
+            hit_material[i] = surface_material(geo, kind, index)
+        hit_normal[i, 0] = nx
+        hit_normal[i, 1] = ny
+        hit_normal[i, 2] = nz
+
+@njit(signatures(lambda p: (p.geometry, ViewType, i8, i8, i8, i8, i8, i8, p.mat, p.mat, p.vec, i8_1d, p.mat, i8_1d,
+                            i8_1d)),
+      cache=True, nogil=True)
+def _intersect_primary(geo, view, width, height, x0, y0, x1, y1, ro, rd, hit_t, hit_material, hit_normal, hit_primitive,
+                       counts):
+    """Stage 1 for camera rays: generate the ray through every pixel center of
+    the tile (x0, y0, x1, y1), row by row, then find its closest hit.
+
+    Directions are written to `rd` for the later stages, the origin is the
+    single shared row of `ro`. Same arithmetic as `Camera._generate_rays`.
+    """
+    stack = np.empty(STACK_SIZE, dtype=np.int64)
+    primitives = hit_primitive.shape[0] > 0
+    u, v, w = view.u, view.v, view.w
+    ox, oy, oz = ro[0, 0], ro[0, 1], ro[0, 2]
+    i = 0
+    for y in range(y0, y1):
+        py = (1.0 - 2.0 * (y + 0.5) / height) * view.half_height
+        for x in range(x0, x1):
+            px = (2.0 * (x + 0.5) / width - 1.0) * view.half_width
+            ex = px*u[0] + py*v[0] - w[0]
+            ey = px*u[1] + py*v[1] - w[1]
+            ez = px*u[2] + py*v[2] - w[2]
+            norm = np.sqrt(ex**2 + ey**2 + ez**2)
+            rd[i, 0] = ex / norm
+            rd[i, 1] = ey / norm
+            rd[i, 2] = ez / norm
+
+            dx, dy, dz = rd[i, 0], rd[i, 1], rd[i, 2]
+            t, kind, index = closest_hit(geo, stack, counts, ox, oy, oz, dx, dy, dz, real(0.0, dx), real(np.inf, dx))
+            hit_t[i] = t
+            if primitives:
+                hit_primitive[i] = primitive_id(kind, index)
+            if kind == MISS:
+                hit_material[i] = -1
+            else:
+                if kind == INSTANCE:
+                    nx, ny, nz = instance_normal(geo, index, ox + t*dx, oy + t*dy, oz + t*dz)
+                    hit_material[i] = instance_material(geo, index)
+                else:
+                    nx, ny, nz = surface_normal(geo, kind, index, ox + t*dx, oy + t*dy, oz + t*dz)
+                    hit_material[i] = surface_material(geo, kind, index)
+                hit_normal[i, 0] = nx
+                hit_normal[i, 1] = ny
+                hit_normal[i, 2] = nz
+            i += 1
+
+@njit(signatures(lambda p: (p.vec,)), cache=True, nogil=True)
+def _brightest(intensity):
+    return max(intensity[0], max(intensity[1], intensity[2]))
+
+@njit(signatures(lambda p: (p.mat, p.mat, i8, p.real, p.real, p.real, p.real, p.real, p.real, p.real, p.real, p.real,
+                            p.vec, p.vec, p.real, p.real)), cache=True, nogil=True)
+def _light(centers, intensities, j, x, y, z, nx, ny, nz, dx, dy, dz, kd, ks, shininess, cutoff):
+    """Unshadowed Blinn-Phong color of point light j at (x, y, z), as in Material._reflect
+
+    Returns:
+        tuple: (lit, r, g, b, lx, ly, lz, dist), lit being False for lights below
+            the horizon or dimmer than `cutoff`
+    """
+    lx = centers[j, 0] - x
+    ly = centers[j, 1] - y
+    lz = centers[j, 2] - z
+    dist = np.sqrt(lx*lx + ly*ly + lz*lz)
+    lx, ly, lz = lx / dist, ly / dist, lz / dist
+
+    ndotl = nx*lx + ny*ly + nz*lz
+    intensity = intensities[j]
+    if ndotl <= 0 or _brightest(intensity) < cutoff * dist * dist:
+        zero = real(0.0, dist)
+        return False, zero, zero, zero, lx, ly, lz, dist
+
+    hx, hy, hz = lx - dx, ly - dy, lz - dz
+    hnorm = np.sqrt(hx*hx + hy*hy + hz*hz)
+    ndoth = max(real(0.0, hnorm), (nx*hx + ny*hy + nz*hz) / hnorm)
+    spec = ndoth ** shininess
+    falloff = real(1.0, dist) / (dist * dist)
+    r = (ndotl*kd[0] + spec*ks[0]) * intensity[0] * falloff
+    g = (ndotl*kd[1] + spec*ks[1]) * intensity[1] * falloff
+    b = (ndotl*kd[2] + spec*ks[2]) * intensity[2] * falloff
+    return True, r, g, b, lx, ly, lz, dist
+
+@njit(signatures(lambda p: (p.geometry, i8_1d, i8_1d, i8_2d, i8, p.real, p.real, p.real, p.real, p.real, p.real, p.real)),
+      cache=True, nogil=True, inline='always')
+def _blocked(geo, stack, counts, blockers, slot, ox, oy, oz, dx, dy, dz, t1):
+    """Shadow ray query that tries the light's last blocker before the whole scene.
+
+    Neighbouring shadow rays towards a light tend to be blocked by the same
+    surface, so `blockers[slot]` keeps the (kind, index) that blocked the
+    last shadow ray towards it, MISS if that one got through. An empty
+    `blockers` table turns the cache off.
+    """
+    counting = counts.shape[0] > 0
+    if blockers.shape[0] == 0:
+        kind, index = occluder(geo, stack, counts, ox, oy, oz, dx, dy, dz, real(0.0, t1), t1)
+    else:
+        kind = blockers[slot, 0]
+        if kind != MISS:
+            if counting:
+                tested = kind if kind != INSTANCE else instance_primitive(geo, blockers[slot, 1])[1]
+                counts[tested] += 1
+            if hit_surface(geo, kind, blockers[slot, 1], ox, oy, oz, dx, dy, dz, real(0.0, t1), t1) != np.inf:
+                if counting:
+                    counts[SHADOW_HITS] += 1
+                    counts[OCCLUDER_HITS] += 1
+                return True
+
+        kind, index = occluder(geo, stack, counts, ox, oy, oz, dx, dy, dz, real(0.0, t1), t1)
+        blockers[slot, 0] = kind
+        blockers[slot, 1] = index
+
+    if kind == MISS:
+        return False
+    if counting:
+        counts[SHADOW_HITS] += 1
+    return True
+
+@njit(signatures(lambda p: (p.geometry, i8_1d, i8_1d, i8_2d, VisibilityType, i8, i8, i8,
+                            p.real, p.real, p.real, p.real, p.real, p.real, p.real)),
+      cache=True, nogil=True, inline='always')
+def _shadowed(geo, stack, counts, blockers, cache, row, new_row, slot, ox, oy, oz, dx, dy, dz, t1):
+    """`_blocked`, answered from the visibility cache when light `slot` was already
+    tested from the cell of the hit, whose rows in the shared and private tables
+    are `row` and `new_row` (-1 for none).
+
+    Returns:
+        tuple[bool, int]: whether the light is blocked, and the shadow rays traced (0 or 1)
+    """
+    seen = UNKNOWN
+    if row >= 0:
+        seen = cache.visible[row, slot]
+    if seen == UNKNOWN and new_row >= 0:
+        seen = cache.new_visible[new_row, slot]
+    if seen != UNKNOWN:
+        if counts.shape[0] > 0:
+            counts[VISIBILITY_HITS] += 1
+        return seen == BLOCKED, 0
+
+    blocked = _blocked(geo, stack, counts, blockers, slot, ox, oy, oz, dx, dy, dz, t1)
+    if new_row >= 0:
+        cache.new_visible[new_row, slot] = BLOCKED if blocked else VISIBLE
+    return blocked, 1
+
+@njit(signatures(lambda p: (p.geometry, p.materials, p.lights, p.mat, p.mat, p.mat, i8_1d, p.vec, i8_1d, p.mat, p.vec,
+                            EnvironmentType, f8, p.mat, i8_1d, p.real, VisibilityType)),
+      cache=True, nogil=True)
+def _shade(geo, mats, lights, ro, rd, weight, pixel, hit_t, hit_material, hit_normal, background, environment, lod, out,
+           counts, eps, cache):
+    """Stage 2: local illumination (with shadow rays) weighted into the framebuffer
+
+    Rays that missed get the `background` color, or the color of the
+    `environment` map in their direction when it has any levels.
+
+    Shadow rays go through `_blocked`, with a table of last blockers per
+    light (and per merged cluster) that lives for this call, so it's never
+    shared between the threads rendering other tiles. With a visibility
+    `cache` (see `VisibilityCache`) a light already tested from the grid cell
+    of a hit isn't tested again.
+
+    Point lights are visited cluster by cluster, see `LightManager`. Far
+    clusters are shaded as one light and dim ones are skipped. With a shadow
+    budget, that many (cluster, light) pairs are drawn instead: clusters in
+    proportion to a bound on their irradiance, then a light of the cluster
+    in proportion to its color. Every draw casts one shadow ray and counts
+    1 / (budget * probability) times.
+
+    Returns:
+        int: number of shadow rays traced
+    """
+    shadow_rays = 0
+    stack = np.empty(STACK_SIZE, dtype=np.int64)
+    shared = ro.shape[0] == 1
+    clusters = lights.cluster_start.shape[0]
+    budget = lights.shadow_budget
+    sampling = 0 < budget < lights.point_center.shape[0]
+    # scratch for sampling: cluster bounds, and the summed colors of the lights of one cluster
+    bound = np.empty(clusters if sampling else 0, dtype=hit_t.dtype)
+    far = np.empty(clusters if sampling else 0, dtype=np.bool_)
+    lamps = lights.point_center.shape[0]
+    # Without a BVH a full shadow query is about as cheap as testing the last blocker
+    blockers = np.full((lamps + clusters if geo.bvh_count.shape[0] > 0 else 0, 2), MISS, dtype=np.int64)
+    members = np.empty(lights.cluster_count.max() if sampling else 0, dtype=hit_t.dtype)
+    draws = real(budget, hit_t)
+    caching = cache.visible.shape[1] > 0
+    mapped = environment.level_start.shape[0] > 0
+    for i in range(rd.shape[0]):
+        o = 0 if shared else i
+        p = pixel[i]
+        m = hit_material[i]
+        if m < 0:
+            if mapped:
+                # not r, g, b, which would make those float64 for the whole kernel
+                er, eg, eb = sample_environment(environment, rd[i, 0], rd[i, 1], rd[i, 2], lod)
+                out[p, 0] += weight[i, 0] * er
+                out[p, 1] += weight[i, 1] * eg
+                out[p, 2] += weight[i, 2] * eb
+            else:
+                for k in range(3):
+                    out[p, k] += weight[i, k] * background[k]
+            continue
+
+        dx, dy, dz = rd[i, 0], rd[i, 1], rd[i, 2]
+        t = hit_t[i]
+        x, y, z = ro[o, 0] + t*dx, ro[o, 1] + t*dy, ro[o, 2] + t*dz
+        nx, ny, nz = hit_normal[i, 0], hit_normal[i, 1], hit_normal[i, 2]
+        sx, sy, sz = x + eps*nx, y + eps*ny, z + eps*nz # shadow ray origin
+        row, new_row = -1, -1
+        if caching:
+            cell = cell_key(x, y, z, nx, ny, nz, cache.cell_size)
+            row = find_row(cache.keys, cache.rows, cell)
+            new_row = add_row(cache.new_keys, cache.new_rows, cache.new_count, cell)
+
+        kd, ks, shininess = mats.diffuse[m], mats.specular[m], mats.shininess[m]
+        r = lights.ambient[0] * mats.ambient[m, 0]
+        g = lights.ambient[1] * mats.ambient[m, 1]
+        b = lights.ambient[2] * mats.ambient[m, 2]
+
+        total = real(0.0, hit_t)
+        for c in range(clusters):
+            qx = lights.cluster_center[c, 0] - x
+            qy = lights.cluster_center[c, 1] - y
+            qz = lights.cluster_center[c, 2] - z
+            qdist = np.sqrt(qx*qx + qy*qy + qz*qz)
+            radius = lights.cluster_radius[c]
+            distant = qdist > lights.cluster_distance * radius
+            nearest = qdist - radius
+            brightest = _brightest(lights.cluster_intensity[c])
+            if not distant and nearest > 0 and brightest < lights.cutoff * nearest * nearest:
+                if sampling:
+                    bound[c] = 0
+                continue
+            if sampling:
+                bound[c] = brightest / max(nearest * nearest, radius * radius, real(1e-12, radius))
+                far[c] = distant
+                total += bound[c]
+                continue
+
+            # far enough to shade the whole cluster as one light
+            centers, intensities = lights.cluster_center, lights.cluster_intensity
+            first, last, slots = c, c + 1, lamps
+            if not distant:
+                centers, intensities = lights.point_center, lights.point_intensity
+                first = lights.cluster_start[c]
+                last, slots = first + lights.cluster_count[c], 0
+            for j in range(first, last):
+                lit, lr, lg, lb, lx, ly, lz, dist = _light(
+                    centers, intensities, j, x, y, z, nx, ny, nz, dx, dy, dz, kd, ks, shininess, lights.cutoff,
+                )
+                if not lit:
+                    continue
+                # the plain query when there's no cache, it's measurably faster than going through _shadowed
+                if caching:
+                    blocked, traced = _shadowed(geo, stack, counts, blockers, cache, row, new_row, slots + j,
+                                                sx, sy, sz, lx, ly, lz, dist - eps)
+                else:
+                    blocked, traced = _blocked(geo, stack, counts, blockers, slots + j, sx, sy, sz, lx, ly, lz, dist - eps), 1
+                shadow_rays += traced
+                if blocked:
+                    continue
+                r += lr
+                g += lg
+                b += lb
+
+        if total > 0:
+            c, below = 0, real(0.0, total)
+            for s in range(budget):
+                # stratified draw of a cluster
+                target = real(s + random_unit(x, y, z, CLUSTER_SALT + SALTS * s), total) / draws * total
+                while c < clusters - 1 and (below + bound[c] < target or bound[c] == 0):
+                    below += bound[c]
+                    c += 1
+                chance = bound[c] / total
+                if chance <= 0:
+                    continue
+
+                centers, intensities = lights.cluster_center, lights.cluster_intensity
+                first, last, slots = c, c + 1, lamps
+                if not far[c]:
+                    centers, intensities = lights.point_center, lights.point_intensity
+                    first = lights.cluster_start[c]
+                    last, slots = first + lights.cluster_count[c], 0
+
+                # then a light of the cluster, in proportion to its color
+                power = real(0.0, total)
+                for j in range(first, last):
+                    lit, lr, lg, lb, lx, ly, lz, dist = _light(
+                        centers, intensities, j, x, y, z, nx, ny, nz, dx, dy, dz, kd, ks, shininess, lights.cutoff,
+                    )
+                    members[j - first] = lr + lg + lb
+                    power += lr + lg + lb
+                if power <= 0:
+                    continue
+                pick = real(random_unit(x, y, z, LIGHT_SALT + SALTS * s), power) * power
+                j = first
+                while j < last - 1 and (pick >= members[j - first] or members[j - first] == 0):
+                    pick -= members[j - first]
+                    j += 1
+
+                lit, lr, lg, lb, lx, ly, lz, dist = _light(
+                    centers, intensities, j, x, y, z, nx, ny, nz, dx, dy, dz, kd, ks, shininess, lights.cutoff,
+                )
+                if not lit or lr + lg + lb <= 0:
+                    continue
+                if caching:
+                    blocked, traced = _shadowed(geo, stack, counts, blockers, cache, row, new_row, slots + j,
+                                                sx, sy, sz, lx, ly, lz, dist - eps)
+                else:
+                    blocked, traced = _blocked(geo, stack, counts, blockers, slots + j, sx, sy, sz, lx, ly, lz, dist - eps), 1
+                shadow_rays += traced
+                if blocked:
+                    continue
+                # drawn with chance * color / power, out of `budget` draws
+                scale = power / ((lr + lg + lb) * draws * chance)
+                r += lr * scale
+                g += lg * scale
+                b += lb * scale
+
+        out[p, 0] += weight[i, 0] * r
+        out[p, 1] += weight[i, 1] * g
+        out[p, 2] += weight[i, 2] * b
+    return shadow_rays
+
+@njit(signatures(lambda p: (p.materials, p.mat, i8_1d)), cache=True, nogil=True)
+def _reflective(mats, weight, hit_material):
+    """Number of rays that hit a surface they'd be reflected off with some weight left"""
+    count = 0
+    for i in range(hit_material.shape[0]):
+        m = hit_material[i]
+        if m >= 0 and (weight[i, 0] * mats.specular[m, 0] > 0 or weight[i, 1] * mats.specular[m, 1] > 0
+                       or weight[i, 2] * mats.specular[m, 2] > 0):
+            count += 1
+    return count
+
+@njit(signatures(lambda p: (p.materials, p.mat, p.mat, p.mat, i8_1d, p.vec, i8_1d, p.mat, p.real, p.real, b1, i8)),
+      cache=True, nogil=True)
+def _reflect(mats, ro, rd, weight, pixel, hit_t, hit_material, hit_normal, offset, min_weight, roulette, bounce):
+    """Stage 3: mirror the rays that hit something into the next wavefront.
+
+    Reflections whose path weight is too small to matter are dropped here,
+    see `survival`.
+    """
+    shared = ro.shape[0] == 1
+    # chance every reflection is kept with, 0 when it's dropped
+    keep = np.zeros(rd.shape[0], dtype=weight.dtype)
+    alive = 0
+    for i in range(rd.shape[0]):
+        m = hit_material[i]
+        if m < 0:
+            continue
+        o = 0 if shared else i
+        t = hit_t[i]
+        keep[i] = survival(
+            weight[i, 0] * mats.specular[m, 0], weight[i, 1] * mats.specular[m, 1], weight[i, 2] * mats.specular[m, 2],
+            ro[o, 0] + t*rd[i, 0], ro[o, 1] + t*rd[i, 1], ro[o, 2] + t*rd[i, 2], min_weight, roulette, bounce,
+        )
+        if keep[i] > 0:
+            alive += 1
+
+    next_ro = np.empty((alive, 3), dtype=ro.dtype)
+    next_rd = np.empty((alive, 3), dtype=rd.dtype)
+    next_weight = np.empty((alive, 3), dtype=weight.dtype)
+    next_pixel = np.empty(alive, dtype=pixel.dtype)
+
+    k = 0
+    for i in range(rd.shape[0]):
+        if keep[i] == 0:
+            continue
+        o = 0 if shared else i
+        m = hit_material[i]
+        t = hit_t[i]
+        nx, ny, nz = hit_normal[i, 0], hit_normal[i, 1], hit_normal[i, 2]
+        dx, dy, dz = rd[i, 0], rd[i, 1], rd[i, 2]
+        twice = real(2.0, dx) * (dx*nx + dy*ny + dz*nz)
+
+        next_ro[k, 0] = ro[o, 0] + t*dx + offset*nx
+        next_ro[k, 1] = ro[o, 1] + t*dy + offset*ny
+        next_ro[k, 2] = ro[o, 2] + t*dz + offset*nz
+        next_rd[k, 0] = dx - twice*nx
+        next_rd[k, 1] = dy - twice*ny
+        next_rd[k, 2] = dz - twice*nz
+        for c in range(3):
+            next_weight[k, c] = weight[i, c] * mats.specular[m, c] / keep[i]
+        next_pixel[k] = pixel[i]
+        k += 1
+
+    return next_ro, next_rd, next_weight, next_pixel
+
+def trace(compiled, origins, directions, max_bounces, background, primary_hit=None, stats=None,
+          min_weight=0.0, roulette_depth=None, visibility=None, environment=None, lod=0.0):
+    """Trace a batch of rays through the scene.
+
+    Args:
+        compiled (CompiledScene): packed scene from `Scene.compile()`
+        origins (np.ndarray): (N, 3) ray origins
+        directions (np.ndarray): (N, 3) ray directions
+        max_bounces (int): number of mirror reflections to follow
+        background (ArrayLike): color of rays that escape the scene
+        primary_hit (np.ndarray, optional): (N,) int array filled with the `primitive_id`
+            hit by every ray, -1 for rays that escape. See `CompiledScene.surface_ids`.
+        stats (RenderStats, optional): gets the rays, tests and stage times of this
+            batch added to it. Counting is skipped entirely without one.
+        min_weight (float, optional): reflections whose path weight (the product of
+            the specular colors so far) is at most this in every channel aren't
+            traced. The default of 0 only drops reflections off non-reflective
+            materials, which can't change the image.
+        roulette_depth (int, optional): reflections past this many bounces play
+            Russian roulette, see `survival`. Defaults to None (never).
+        visibility (VisibilityCache, optional): reuses the shadow ray results of
+            earlier batches and records new ones. They're only shared with later
+            batches after `visibility.commit()`. Defaults to None (no cache).
+        environment (EnvironmentMap, optional): image seen by the rays that escape,
+            instead of the background color. Defaults to None.
+        lod (float, optional): mip level the environment map is read at, see
+            `EnvironmentMap.level_of_detail`. Defaults to 0 (full resolution).
+
+    Rays, hits and colors are kept at the precision the scene was compiled with.
+
+    Returns:
+        np.ndarray: (N, 3) color of every ray
+    """
+    ro = np.ascontiguousarray(origins, dtype=compiled.dtype)
+    rd = np.ascontiguousarray(directions, dtype=compiled.dtype)
+    return _trace(compiled, ro, rd, None, max_bounces, background, primary_hit, stats, min_weight, roulette_depth,
+                  visibility, environment, lod)
+
+def trace_tile(compiled, width, height, tile, max_bounces, background, primary_hit=None, stats=None,
+               min_weight=0.0, roulette_depth=None, visibility=None, environment=None):
+    """Trace the camera rays through the pixel centers of a tile.
+
+    Gives the same colors as `trace` with the rays of `Camera.generate_rays`,
+    without ever storing the camera rays' origins, and with their directions
+    computed inside the first intersection kernel.
+
+    Args:
+        compiled (CompiledScene): packed scene from `Scene.compile()`, its view is the camera
+        width (int): image width
+        height (int): image height
+        tile (tuple[int, int, int, int]): (x0, y0, x1, y1) pixels to trace, end exclusive
+        max_bounces (int): number of mirror reflections to follow
+        background (ArrayLike): color of rays that escape the scene
+        primary_hit (np.ndarray, optional): see `trace`
+        stats (RenderStats, optional): see `trace`
+        min_weight (float, optional): see `trace`
+        roulette_depth (int, optional): see `trace`
+        visibility (VisibilityCache, optional): see `trace`
+        environment (EnvironmentMap, optional): see `trace`, read at the level
+            whose texels are about the size of a pixel of the image
+
+    Returns:
+        np.ndarray: (N, 3) color of every pixel of the tile, in row-major order
+    """
+    x0, y0, x1, y1 = tile
+    ro = np.array(compiled.view.eye, dtype=compiled.dtype).reshape(1, 3)
+    rd = np.empty(((y1 - y0) * (x1 - x0), 3), dtype=compiled.dtype)
+    lod = 0.0 if environment is None else footprint_level(environment.levels, compiled.view.half_height, height)
+    return _trace(compiled, ro, rd, (width, height, x0, y0, x1, y1), max_bounces, background, primary_hit, stats,
+                  min_weight, roulette_depth, visibility, environment, lod)
+
+def _trace(compiled, ro, rd, primary, max_bounces, background, primary_hit, stats, min_weight, roulette_depth,
+           visibility, environment=None, lod=0.0):
+    """Bounce loop of `trace` and `trace_tile`, `primary` being the (width, height, x0, y0, x1, y1)
+    of camera rays to generate into `rd`, or None if `rd` already holds the rays"""
+    geo, mats, lights = compiled.geometry, compiled.materials, compiled.lights
+    dtype = compiled.dtype
+    eps, offset = OFFSETS[dtype.name]
+    background = np.array(background, dtype=dtype)
+    levels = NO_ENVIRONMENT if environment is None else environment.levels
+
+    n = rd.shape[0]
+    out = np.zeros((n, 3), dtype=dtype)
+    weight = np.ones((n, 3), dtype=dtype)
+    pixel = np.arange(n, dtype=np.int64)
+    counting = stats is not None
+    counts = np.zeros(COUNTERS if counting else 0, dtype=np.int64)
+    shadow_rays, secondary_rays, hits, terminated = 0, 0, 0, 0
+    seconds = {'intersect': 0.0, 'shade': 0.0, 'reflect': 0.0}
+    clock = time.perf_counter
+    cache = DISABLED
+    no_primitives = np.empty(0, dtype=np.int64)
+    if visibility is not None:
+        cache = visibility.batch(compiled, n, lights.point_center.shape[0] + lights.cluster_start.shape[0])
+
+    for bounce in range(max_bounces + 1):
+        m = rd.shape[0]
+        hit_t = np.empty(m, dtype=dtype)
+        hit_material = np.empty(m, dtype=np.int64)
+        hit_normal = np.empty((m, 3), dtype=dtype)
+
+        hit_primitive = primary_hit if bounce == 0 and primary_hit is not None else no_primitives
+
+        start = clock() if counting else 0.0
+        if bounce == 0 and primary is not None:
+            _intersect_primary(geo, compiled.view, *primary, ro, rd, hit_t, hit_material, hit_normal, hit_primitive,
+                               counts)
+        else:
+            _intersect(geo, ro, rd, hit_t, hit_material, hit_normal, hit_primitive, counts)
+        if counting:
+            seconds['intersect'] += clock() - start
+            alive = int(np.count_nonzero(hit_material >= 0))
+            hits += alive
+            # rays with a reflection left, whatever isn't reflected below was cut
+            reflective = _reflective(mats, weight, hit_material)
+            if bounce == max_bounces:
+                terminated += reflective
+
+        start = clock() if counting else 0.0
+        shadow_rays += _shade(geo, mats, lights, ro, rd, weight, pixel, hit_t, hit_material, hit_normal, background,
+                              levels, lod, out, counts, eps, cache)
+        if counting:
+            seconds['shade'] += clock() - start
+        if bounce == max_bounces:
+            break
+
+        start = clock() if counting else 0.0
+        roulette = roulette_depth is not None and bounce >= roulette_depth
+        ro, rd, weight, pixel = _reflect(mats, ro, rd, weight, pixel, hit_t, hit_material, hit_normal, offset,
+                                         min_weight, roulette, bounce)
+        if counting:
+            seconds['reflect'] += clock() - start
+            terminated += reflective - pixel.shape[0]
+        if pixel.shape[0] == 0:
+            break
+        secondary_rays += pixel.shape[0]
+
+    if visibility is not None:
+        visibility.add(compiled, cache)
+    if counting:
+        stats.add(
+            primary_rays=n,
+            shadow_rays=shadow_rays,
+            secondary_rays=secondary_rays,
+            sphere_tests=int(counts[SPHERE]),
+            plane_tests=int(counts[PLANE]),
+            triangle_tests=int(counts[TRIANGLE]),
+            box_tests=int(counts[BOX_TESTS]),
+            hits=hits,
+            shadow_hits=int(counts[SHADOW_HITS]),
+            occluder_cache_hits=int(counts[OCCLUDER_HITS]),
+            visibility_cache_hits=int(counts[VISIBILITY_HITS]),
+            terminated_rays=terminated,
+        )
+        for stage, elapsed in seconds.items():
+            stats.add_time(stage, elapsed)
+    return out
@@ -0,0 +1,85 @@
+"""Kernel compilation and caching.
+
+The render kernels are compiled with explicit signatures as soon as
+spritz is imported, and every kernel is cached on disk so only the first
+process on a machine pays for compiling them.
+
+Numba keeps the cache in __pycache__ next to the sources by default. When
+the package is installed read-only (container images), point the
+SPRITZ_CACHE_DIR environment variable at a writable or pre-filled
+directory before importing spritz, and fill it at build time with
+`spritz warmup`.
+"""
+import os
+import tempfile
+import time
+
+import numba
+import numpy as np
+
+CACHE_DIR_VARIABLE = 'SPRITZ_CACHE_DIR'
+
+# Numba looks the cache directory up when a kernel is decorated, so this has
+# to run before any spritz module defining kernels is imported.
+if os.environ.get(CACHE_DIR_VARIABLE):
+    numba.config.CACHE_DIR = os.path.abspath(os.path.expanduser(os.environ[CACHE_DIR_VARIABLE]))
+
+def cache_dir():
+    """Directory kernels are cached in, None when they're cached next to the sources"""
+    return numba.config.CACHE_DIR or None
+
+def warmup():
+    """Compile every kernel, or load it from the cache.
+
+    Renders tiny scenes through both engines, with and without a BVH, and
+    loads tiny OBJ and PLY files, so the kernels that are only compiled on
+    first call (the Python engine's and the loaders') end up in the cache too.
+
+    Returns:
+        float: seconds taken
+    """
+    from .scene import Scene
+    from .scene.scene import ENGINES
+    from .camera import Camera
+    from .lighting import PointLight, AmbientLight
+    from .materials import Material
+    from .surfaces import Sphere, Plane, Triangle, TriangleMesh
+    from .loaders import load_obj, load_ply
+
+    start = time.perf_counter()
+    material = Material((0.1, 0.1, 0.1), (0.5, 0.5, 0.5), (0.5, 0.5, 0.5), 8)
+    for engine in ENGINES:
+        for accel in (None, 'bvh'):
+            scene = Scene(engine=engine, accel=accel, max_bounces=1)
+            scene.change_camera(Camera((0, -5, 0), (0, 0, 0)))
+            scene.add_light(PointLight((0, -5, 5), (1, 1, 1)))
+            scene.add_light(AmbientLight((0.1, 0.1, 0.1)))
+            scene.add_surface(Sphere((0.0, 0.0, 0.0), 1.0, material))
+            scene.add_surface(Plane((0, 0, 1), (0, 0, -1), material))
+            scene.add_surface(Triangle((-1, 1, 0), (1, 1, 0), (0, 1, 1), material))
+            scene.add_surface(TriangleMesh([(-2, 1, 0), (-1, 1, 0), (-2, 1, 1)], [(0, 1, 2)], material))
+            scene.render(8, 8, max_samples=2)
+            for _ in scene.render_progressive(8, 8, start=2):
+                pass
+
+    header = (b"ply\nformat %s 1.0\nelement vertex 4\nproperty float x\nproperty float y\nproperty float z\n"
+              b"element face %d\nproperty list uchar int vertex_indices\nend_header\n")
+    corners = np.array([(-1, 0, 0), (1, 0, 0), (1, 0, 1), (-1, 0, 1)], dtype='<f4')
+    files = {
+        'mesh.obj': b"v -1 0 0\nv 1 0 0\nv 1 0 1\nv -1 0 1\nf 1 2 3 4\n",
+        'ascii.ply': header % (b'ascii', 1) + b"-1 0 0\n1 0 0\n1 0 1\n-1 0 1\n4 0 1 2 3\n",
+        # triangles only (memory mapped) and polygons (parsed)
+        'triangles.ply': header % (b'binary_little_endian', 2) + corners.tobytes()
+                         + b"\x03" + np.array([0, 1, 2], dtype='<i4').tobytes()
+                         + b"\x03" + np.array([0, 2, 3], dtype='<i4').tobytes(),
+        'polygons.ply': header % (b'binary_little_endian', 1) + corners.tobytes()
+                        + b"\x04" + np.array([0, 1, 2, 3], dtype='<i4').tobytes(),
+    }
+    with tempfile.TemporaryDirectory() as folder:
+        for name, data in files.items():
+            path = os.path.join(folder, name)
+            with open(path, 'wb') as file:
+                file.write(data)
+            (load_obj if name.endswith('.obj') else load_ply)(path, material)
+
+    return time.perf_counter() - start
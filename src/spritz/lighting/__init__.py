@@ -1,9 +1,11 @@
 from .light import Light
 from .point import PointLight
 from .ambient import AmbientLight
+from .manager import LightManager
 
 __all__ = [
     'Light',
     'PointLight',
-    'AmbientLight'
+    'AmbientLight',
+    'LightManager',
 ]
\ No newline at end of file
@@ -0,0 +1,67 @@
+"""Light management for scenes with many point lights."""
+import numpy as np
+
+class LightManager:
+    """Culling, clustering and sampling of a scene's point lights.
+
+    Used by the 'wavefront' engine with `Scene(light_manager=LightManager())`.
+    Without one every point light is shaded, with its own shadow ray, at
+    every hit. With one:
+
+        - lights whose unshadowed irradiance `intensity / dist**2` at the
+          shading point is below `cutoff` are skipped, a whole cluster at a
+          time when even its nearest possible light is too dim
+        - lights are grouped into spatially compact clusters, and a cluster
+          seen from further than `cluster_distance` times its radius is
+          shaded as a single light (summed intensity, one shadow ray)
+        - with a `shadow_budget`, at most that many shadow rays are cast per
+          hit, towards lights picked in proportion to their unshadowed
+          contribution. The estimate is unbiased but noisy.
+
+    Attributes:
+        cutoff (float): irradiance below which a light is skipped
+        cluster_size (int): largest number of lights in a cluster
+        cluster_distance (float): distance, in cluster radii, beyond which a
+            cluster is shaded as one light
+        shadow_budget (int): shadow rays per hit, None for one per light
+    """
+
+    def __init__(self, cutoff=1e-3, cluster_size=16, cluster_distance=4.0, shadow_budget=None):
+        if cluster_size < 1:
+            raise ValueError(f"cluster_size must be at least 1, got {cluster_size}")
+        if shadow_budget is not None and shadow_budget < 1:
+            raise ValueError(f"shadow_budget must be at least 1, got {shadow_budget}")
+        self.cutoff = cutoff
+        self.cluster_size = cluster_size
+        self.cluster_distance = cluster_distance
+        self.shadow_budget = shadow_budget
+
+    def __repr__(self):
+        return (f"<LightManager: cutoff {self.cutoff}, clusters of {self.cluster_size} "
+                f"beyond {self.cluster_distance} radii, shadow budget {self.shadow_budget}>")
+
+    def cluster(self, centers):
+        """Group lights by recursively halving them along their longest extent.
+
+        Args:
+            centers (np.ndarray): (N, 3) light positions
+
+        Returns:
+            tuple[np.ndarray, np.ndarray, np.ndarray]: order of the lights, so every
+                cluster is a contiguous run, and the start and count of every cluster
+        """
+        order, starts, counts = [], [], []
+        todo = [np.arange(centers.shape[0])]
+        while todo:
+            members = todo.pop()
+            if members.shape[0] <= self.cluster_size:
+                starts.append(len(order))
+                counts.append(members.shape[0])
+                order.extend(members)
+                continue
+            points = centers[members]
+            axis = np.argmax(points.max(axis=0) - points.min(axis=0))
+            split = np.argsort(points[:, axis], kind='stable')
+            half = members.shape[0] // 2
+            todo += [members[split[half:]], members[split[:half]]]
+        return np.array(order, dtype=np.int64), np.array(starts, dtype=np.int64), np.array(counts, dtype=np.int64)
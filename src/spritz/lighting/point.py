@@ -85,8 +85,7 @@ class PointLight(Light):
         
         shadow_origin, dist, eps, l = illumination
         shadow_ray = (shadow_origin, l)
-        shadow_hit = scene.hit(shadow_ray, 0, dist - eps)
-        if shadow_hit is not None: #Surface is in shadow
+        if scene.occluded(shadow_ray, 0, dist - eps): #Surface is in shadow
             return BLACK
         
         E = self.intensity / dist**2
@@ -0,0 +1,27 @@
+import os
+
+from .obj import load_obj
+from .ply import load_ply
+
+def load_mesh(path, material):
+    """Load an .obj or .ply file into a TriangleMesh, picking the loader by extension.
+
+    Args:
+        path (str): path of the mesh file
+        material (Material): material of the mesh
+
+    Returns:
+        TriangleMesh
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.obj':
+        return load_obj(path, material)
+    if extension == '.ply':
+        return load_ply(path, material)
+    raise ValueError(f"Unsupported mesh format {extension!r}, expected .obj or .ply")
+
+__all__ = [
+    'load_mesh',
+    'load_obj',
+    'load_ply',
+]
@@ -0,0 +1,107 @@
+"""Wavefront OBJ loader.
+
+Only geometry is read: `v` lines become vertices and `f` lines become
+faces (polygons are fan triangulated). Texture coordinates, normals,
+groups and materials are skipped.
+"""
+import numpy as np
+from numba import njit
+
+from .parsing import is_blank, skip_blank, skip_line, skip_token, count_tokens, parse_int, parse_float
+from ..surfaces import TriangleMesh
+
+CHUNK_SIZE = 1 << 24 # bytes read from disk at a time
+
+@njit(cache=True, nogil=True)
+def _count_obj(buf):
+    """Number of vertices and triangles in a chunk of whole lines"""
+    vertices, triangles = 0, 0
+    i = 0
+    while i < buf.shape[0]:
+        i = skip_blank(buf, i)
+        if i + 1 < buf.shape[0] and is_blank(buf[i + 1]):
+            if buf[i] == 118: # v
+                vertices += 1
+            elif buf[i] == 102: # f
+                triangles += max(0, count_tokens(buf, i + 1) - 2)
+        i = skip_line(buf, i)
+    return vertices, triangles
+
+@njit(cache=True, nogil=True)
+def _face_index(buf, i, vertex_count):
+    """Parse a face token like `7`, `7/1` or `7/1/3` into a 0-based vertex index"""
+    index, i = parse_int(buf, i)
+    i = skip_token(buf, i) # drop texture and normal indices
+    if index < 0: # relative to the vertices read so far
+        return vertex_count + index, i
+    return index - 1, i
+
+@njit(cache=True, nogil=True)
+def _parse_obj(buf, vertices, faces, vertex_base):
+    """Fill preallocated vertex and face arrays from a chunk of whole lines"""
+    v, f = 0, 0
+    i = 0
+    while i < buf.shape[0]:
+        i = skip_blank(buf, i)
+        if i + 1 < buf.shape[0] and is_blank(buf[i + 1]):
+            if buf[i] == 118: # v
+                i += 1
+                for k in range(3):
+                    vertices[v, k], i = parse_float(buf, i)
+                v += 1
+            elif buf[i] == 102: # f
+                corners = count_tokens(buf, i + 1)
+                i += 1
+                if corners >= 3:
+                    first, i = _face_index(buf, i, vertex_base + v)
+                    previous, i = _face_index(buf, i, vertex_base + v)
+                    for _ in range(corners - 2):
+                        current, i = _face_index(buf, i, vertex_base + v)
+                        faces[f, 0], faces[f, 1], faces[f, 2] = first, previous, current
+                        previous = current
+                        f += 1
+        i = skip_line(buf, i)
+
+def load_obj(path, material, chunk_size=CHUNK_SIZE):
+    """Load an OBJ file into a TriangleMesh.
+
+    The file is read and parsed in chunks of whole lines, so memory use
+    stays close to the size of the final vertex and face arrays.
+
+    Args:
+        path (str): path of the .obj file
+        material (Material): material of the mesh
+        chunk_size (int, optional): bytes read per chunk. Defaults to 16 MiB.
+
+    Raises:
+        ValueError: if a face references a vertex that doesn't exist
+
+    Returns:
+        TriangleMesh
+    """
+    vertex_chunks, face_chunks = [], []
+    vertex_count = 0
+    with open(path, 'rb') as file:
+        tail = b''
+        while True:
+            block = file.read(chunk_size)
+            data = tail + block
+            if block: # Hold back the partial last line for the next chunk
+                cut = data.rfind(b'\n') + 1
+                data, tail = data[:cut], data[cut:]
+
+            buf = np.frombuffer(data, dtype=np.uint8)
+            vertices, triangles = _count_obj(buf)
+            vertex_chunks.append(np.empty((vertices, 3), dtype=float))
+            face_chunks.append(np.empty((triangles, 3), dtype=np.int64))
+            _parse_obj(buf, vertex_chunks[-1], face_chunks[-1], vertex_count)
+            vertex_count += vertices
+
+            if not block:
+                break
+
+    vertices = np.concatenate(vertex_chunks)
+    faces = np.concatenate(face_chunks)
+    if faces.size and (faces.min() < 0 or faces.max() >= vertices.shape[0]):
+        raise ValueError(f"{path} has faces referencing missing vertices")
+    return TriangleMesh(vertices, faces, material)
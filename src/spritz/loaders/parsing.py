@@ -0,0 +1,133 @@
+"""Compiled tokenizers for text mesh formats.
+
+They work directly on uint8 buffers (file chunks or memory maps), so
+numbers are parsed without building Python strings or lists.
+"""
+import numpy as np
+from numba import njit
+
+SPACE, TAB, CR, NEWLINE = 32, 9, 13, 10
+MINUS, PLUS, DOT, SLASH = 45, 43, 46, 47
+ZERO, NINE = 48, 57
+
+@njit(cache=True, nogil=True)
+def is_blank(c):
+    return c == SPACE or c == TAB or c == CR
+
+@njit(cache=True, nogil=True)
+def is_digit(c):
+    return ZERO <= c <= NINE
+
+@njit(cache=True, nogil=True)
+def skip_blank(buf, i):
+    while i < buf.shape[0] and is_blank(buf[i]):
+        i += 1
+    return i
+
+@njit(cache=True, nogil=True)
+def skip_line(buf, i):
+    """Index just past the end of the current line"""
+    while i < buf.shape[0] and buf[i] != NEWLINE:
+        i += 1
+    return i + 1
+
+@njit(cache=True, nogil=True)
+def skip_token(buf, i):
+    while i < buf.shape[0] and not is_blank(buf[i]) and buf[i] != NEWLINE:
+        i += 1
+    return i
+
+@njit(cache=True, nogil=True)
+def at_line_end(buf, i):
+    return i >= buf.shape[0] or buf[i] == NEWLINE
+
+@njit(cache=True, nogil=True)
+def count_tokens(buf, i):
+    """Number of whitespace separated tokens from i to the end of the line"""
+    count = 0
+    i = skip_blank(buf, i)
+    while not at_line_end(buf, i):
+        count += 1
+        i = skip_blank(buf, skip_token(buf, i))
+    return count
+
+@njit(cache=True, nogil=True)
+def parse_int(buf, i):
+    """Parse a signed integer starting at (or after blanks before) i.
+
+    Returns:
+        tuple[int, int]: value and the index just past it
+    """
+    i = skip_blank(buf, i)
+    sign = 1
+    if i < buf.shape[0] and (buf[i] == MINUS or buf[i] == PLUS):
+        if buf[i] == MINUS:
+            sign = -1
+        i += 1
+    value = 0
+    while i < buf.shape[0] and is_digit(buf[i]):
+        value = value * 10 + (buf[i] - ZERO)
+        i += 1
+    return sign * value, i
+
+@njit(cache=True, nogil=True)
+def parse_float(buf, i):
+    """Parse a decimal float (with optional exponent) starting at (or after blanks before) i.
+
+    Returns:
+        tuple[float, int]: value and the index just past it
+    """
+    i = skip_blank(buf, i)
+    n = buf.shape[0]
+    sign = 1.0
+    if i < n and (buf[i] == MINUS or buf[i] == PLUS):
+        if buf[i] == MINUS:
+            sign = -1.0
+        i += 1
+
+    # Keep up to 18 significant digits exact in an integer
+    mantissa, digits, exponent = 0, 0, 0
+    while i < n and is_digit(buf[i]):
+        if digits < 18:
+            mantissa = mantissa * 10 + (buf[i] - ZERO)
+            if mantissa > 0:
+                digits += 1
+        else:
+            exponent += 1
+        i += 1
+    if i < n and buf[i] == DOT:
+        i += 1
+        while i < n and is_digit(buf[i]):
+            if digits < 18:
+                mantissa = mantissa * 10 + (buf[i] - ZERO)
+                if mantissa > 0:
+                    digits += 1
+                exponent -= 1
+            i += 1
+    if i < n and (buf[i] == 101 or buf[i] == 69): # e, E
+        e, i = parse_int(buf, i + 1)
+        exponent += e
+
+    if exponent >= 0:
+        return sign * mantissa * 10.0**exponent, i
+    return sign * mantissa / 10.0**(-exponent), i
+
+@njit(cache=True, nogil=True)
+def read_uint(buf, pos, size, big_endian):
+    """Unsigned integer of `size` bytes stored at buf[pos]"""
+    value = 0
+    if big_endian:
+        for k in range(size):
+            value = value * 256 + buf[pos + k]
+    else:
+        for k in range(size - 1, -1, -1):
+            value = value * 256 + buf[pos + k]
+    return value
+
+@njit(cache=True, nogil=True)
+def read_int(buf, pos, size, signed, big_endian):
+    """Integer of `size` bytes stored at buf[pos]"""
+    value = read_uint(buf, pos, size, big_endian)
+    if signed and value >= 1 << (8 * size - 1):
+        value -= 1 << (8 * size)
+    return value
@@ -0,0 +1,207 @@
+"""Stanford PLY loader.
+
+Binary files are read through a memory map: when every face is a
+triangle (the usual case) the vertex and face elements are viewed as
+structured arrays without parsing. ASCII files are tokenized in
+compiled code straight from the memory map.
+"""
+import numpy as np
+from numba import njit
+
+from .parsing import skip_line, parse_float, parse_int, read_int
+from ..surfaces import TriangleMesh
+
+PLY_TYPES = {
+    'char': 'i1', 'int8': 'i1', 'uchar': 'u1', 'uint8': 'u1',
+    'short': 'i2', 'int16': 'i2', 'ushort': 'u2', 'uint16': 'u2',
+    'int': 'i4', 'int32': 'i4', 'uint': 'u4', 'uint32': 'u4',
+    'float': 'f4', 'float32': 'f4', 'double': 'f8', 'float64': 'f8',
+}
+
+FORMATS = {'ascii': None, 'binary_little_endian': '<', 'binary_big_endian': '>'}
+
+def _read_header(path):
+    """Parse the PLY header.
+
+    Returns:
+        tuple: (format, elements, header size in bytes), where elements is a list of
+        (name, count, properties) and each property is (name, type) or (name, count type, item type)
+    """
+    elements = []
+    fmt = None
+    with open(path, 'rb') as file:
+        if file.readline().strip() != b'ply':
+            raise ValueError(f"{path} is not a PLY file")
+        while True:
+            line = file.readline()
+            if not line:
+                raise ValueError(f"{path} has no end_header")
+            words = line.decode('ascii').split()
+            if not words or words[0] in ('comment', 'obj_info'):
+                continue
+            if words[0] == 'end_header':
+                return fmt, elements, file.tell()
+            if words[0] == 'format':
+                if words[1] not in FORMATS:
+                    raise ValueError(f"Unknown PLY format {words[1]!r}")
+                fmt = words[1]
+            elif words[0] == 'element':
+                elements.append((words[1], int(words[2]), []))
+            elif words[0] == 'property':
+                if words[1] == 'list':
+                    elements[-1][2].append((words[4], PLY_TYPES[words[2]], PLY_TYPES[words[3]]))
+                else:
+                    elements[-1][2].append((words[2], PLY_TYPES[words[1]]))
+
+def _face_list(properties):
+    """Index of the vertex index list property of the face element"""
+    for k, prop in enumerate(properties):
+        if len(prop) == 3 and prop[0] in ('vertex_indices', 'vertex_index'):
+            return k
+    raise ValueError("PLY face element has no vertex_indices list")
+
+@njit(cache=True, nogil=True)
+def _read_ascii_vertices(buf, i, count, properties, x, y, z):
+    vertices = np.empty((count, 3), dtype=np.float64)
+    values = np.empty(properties, dtype=np.float64)
+    for v in range(count):
+        for k in range(properties):
+            values[k], i = parse_float(buf, i)
+        vertices[v, 0], vertices[v, 1], vertices[v, 2] = values[x], values[y], values[z]
+        i = skip_line(buf, i)
+    return vertices, i
+
+@njit(cache=True, nogil=True)
+def _read_ascii_faces(buf, i, count, before):
+    """Fan triangulate `count` face lines, skipping `before` scalars ahead of the index list"""
+    start = i
+    triangles = 0
+    for _ in range(count):
+        for _ in range(before):
+            _, i = parse_float(buf, i)
+        corners, i = parse_int(buf, i)
+        triangles += max(0, corners - 2)
+        i = skip_line(buf, i)
+
+    faces = np.empty((triangles, 3), dtype=np.int64)
+    i, f = start, 0
+    for _ in range(count):
+        for _ in range(before):
+            _, i = parse_float(buf, i)
+        corners, i = parse_int(buf, i)
+        if corners >= 3:
+            first, i = parse_int(buf, i)
+            previous, i = parse_int(buf, i)
+            for _ in range(corners - 2):
+                current, i = parse_int(buf, i)
+                faces[f, 0], faces[f, 1], faces[f, 2] = first, previous, current
+                previous = current
+                f += 1
+        i = skip_line(buf, i)
+    return faces, i
+
+@njit(cache=True, nogil=True)
+def _read_binary_faces(buf, pos, count, count_size, index_size, signed, big_endian):
+    """Fan triangulate binary faces whose only property is the index list"""
+    start = pos
+    triangles = 0
+    for _ in range(count):
+        corners = read_int(buf, pos, count_size, False, big_endian)
+        triangles += max(0, corners - 2)
+        pos += count_size + corners * index_size
+
+    faces = np.empty((triangles, 3), dtype=np.int64)
+    pos, f = start, 0
+    for _ in range(count):
+        corners = read_int(buf, pos, count_size, False, big_endian)
+        pos += count_size
+        if corners >= 3:
+            first = read_int(buf, pos, index_size, signed, big_endian)
+            previous = read_int(buf, pos + index_size, index_size, signed, big_endian)
+            for k in range(2, corners):
+                current = read_int(buf, pos + k * index_size, index_size, signed, big_endian)
+                faces[f, 0], faces[f, 1], faces[f, 2] = first, previous, current
+                previous = current
+                f += 1
+        pos += corners * index_size
+    return faces, pos
+
+def _load_ascii(path, elements, offset):
+    buf = np.memmap(path, dtype=np.uint8, mode='r')
+    i = offset
+    vertices = faces = None
+    for name, count, properties in elements:
+        if name == 'vertex':
+            names = [prop[0] for prop in properties]
+            vertices, i = _read_ascii_vertices(buf, i, count, len(properties),
+                                               names.index('x'), names.index('y'), names.index('z'))
+        elif name == 'face':
+            faces, i = _read_ascii_faces(buf, i, count, _face_list(properties))
+        else:
+            for _ in range(count):
+                i = skip_line(buf, i)
+    return vertices, faces
+
+def _load_binary(path, elements, offset, endian):
+    size = np.memmap(path, dtype=np.uint8, mode='r').shape[0]
+    vertices = faces = None
+    for name, count, properties in elements:
+        fields = []
+        for prop in properties:
+            if len(prop) == 2:
+                fields.append((prop[0], endian + prop[1]))
+            else: # assume every list holds a triangle, checked below
+                fields.append((prop[0] + '_count', endian + prop[1]))
+                fields.append((prop[0], endian + prop[2], (3,)))
+        dtype = np.dtype(fields)
+
+        if name == 'face':
+            lst = properties[_face_list(properties)]
+            table = None
+            if offset + count * dtype.itemsize <= size:
+                table = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(count,))
+            if table is not None and np.all(table[lst[0] + '_count'] == 3):
+                faces = table[lst[0]].astype(np.int64)
+                offset += count * dtype.itemsize
+            else:
+                if len(properties) != 1:
+                    raise ValueError("Polygon PLY faces are only supported when the index list is the only face property")
+                count_type, index_type = np.dtype(lst[1]), np.dtype(lst[2])
+                buf = np.memmap(path, dtype=np.uint8, mode='r')
+                faces, offset = _read_binary_faces(buf, offset, count, count_type.itemsize, index_type.itemsize,
+                                                   index_type.kind == 'i', endian == '>')
+            continue
+
+        if any(len(prop) == 3 for prop in properties):
+            raise ValueError(f"Can't skip the list properties of PLY element {name!r}")
+        if name == 'vertex':
+            table = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(count,))
+            vertices = np.empty((count, 3), dtype=np.float64)
+            vertices[:, 0], vertices[:, 1], vertices[:, 2] = table['x'], table['y'], table['z']
+        offset += count * dtype.itemsize
+    return vertices, faces
+
+def load_ply(path, material):
+    """Load a PLY file (ASCII or binary) into a TriangleMesh.
+
+    Args:
+        path (str): path of the .ply file
+        material (Material): material of the mesh
+
+    Raises:
+        ValueError: if the file is malformed or has no vertex or face element
+
+    Returns:
+        TriangleMesh
+    """
+    fmt, elements, offset = _read_header(path)
+    if fmt == 'ascii':
+        vertices, faces = _load_ascii(path, elements, offset)
+    else:
+        vertices, faces = _load_binary(path, elements, offset, FORMATS[fmt])
+
+    if vertices is None or faces is None:
+        raise ValueError(f"{path} needs both a vertex and a face element")
+    if faces.size and (faces.min() < 0 or faces.max() >= vertices.shape[0]):
+        raise ValueError(f"{path} has faces referencing missing vertices")
+    return TriangleMesh(vertices, faces, material)
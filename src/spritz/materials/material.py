@@ -36,8 +36,8 @@ class Material():
         """
         
         color = Material._reflect(
-            np.array(self.diffuse, dtype=float),
-            np.array(self.specular, dtype=float),
+            self.diffuse,
+            self.specular,
             light_direction,
             viewing_direction,
             surface_normal,
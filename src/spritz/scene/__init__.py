@@ -1,5 +1,9 @@
 from .scene import Scene
+from .compiled import CompiledScene
+from .environment import EnvironmentMap
 
 __all__ = [
     'Scene',
-]
\ No newline at end of file
+    'CompiledScene',
+    'EnvironmentMap',
+]
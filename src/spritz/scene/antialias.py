@@ -0,0 +1,48 @@
+"""Adaptive anti-aliasing.
+
+A frame is first rendered with one ray through every pixel center.
+Pixels on a high-contrast edge, or on a boundary between two surfaces
+(or a surface and the background), then get extra jittered sub-pixel
+samples. Everywhere else the single sample is kept as is.
+"""
+import numpy as np
+
+def edge_mask(pixels, ids, threshold):
+    """Pixels that need more samples.
+
+    Args:
+        pixels (np.ndarray): (H, W, 3) single sample image
+        ids (np.ndarray): (H, W) id of the surface the primary ray hit, -1 for the background
+        threshold (float): largest channel difference (after clipping to the
+            displayable [0, 1] range) between 4-neighbours that isn't an edge
+
+    Returns:
+        np.ndarray: (H, W) boolean mask
+    """
+    clipped = np.clip(pixels, 0, 1)
+    mask = np.zeros(ids.shape, dtype=bool)
+
+    # Compare every pixel with its right and bottom neighbours, flag both sides
+    dx = (np.abs(clipped[:, 1:] - clipped[:, :-1]).max(axis=2) > threshold) | (ids[:, 1:] != ids[:, :-1])
+    dy = (np.abs(clipped[1:] - clipped[:-1]).max(axis=2) > threshold) | (ids[1:] != ids[:-1])
+    mask[:, 1:] |= dx
+    mask[:, :-1] |= dx
+    mask[1:] |= dy
+    mask[:-1] |= dy
+    return mask
+
+def subpixel_offsets(pixels, count, rng):
+    """Stratified, jittered sample positions inside pixels.
+
+    Args:
+        pixels (int): number of pixels to sample
+        count (int): samples per pixel
+        rng (np.random.Generator): source of the jitter
+
+    Returns:
+        np.ndarray: (pixels, count, 2) offsets in [0, 1) from each pixel's corner
+    """
+    grid = int(np.ceil(np.sqrt(count)))
+    cells = np.arange(count) % (grid * grid)
+    corners = np.stack((cells % grid, cells // grid), axis=1)
+    return (corners + rng.random((pixels, count, 2))) / grid
@@ -0,0 +1,336 @@
+"""Packed, array-only form of a Scene for the compiled engines.
+
+Surfaces, materials and lights are flattened into contiguous
+struct-of-arrays buffers so compiled kernels can loop over them
+without touching Python objects.
+"""
+import numpy as np
+
+from ..engine.buffers import Materials, Lights, View
+from ..engine.geometry import pack_geometry, placed_bounds, face_normals
+from ..engine.kernels import SPHERE, PLANE, TRIANGLE, INSTANCE, KINDS
+from ..engine.refit import BVHRefit, REBUILD_COST
+from ..lighting import PointLight, AmbientLight
+from ..materials import Material
+from ..surfaces import SurfaceGroup, Sphere, Plane, Triangle, TriangleMesh, Instance
+
+def _flatten(surfaces):
+    for surface in surfaces:
+        if isinstance(surface, SurfaceGroup):
+            yield from _flatten(surface.surfaces)
+        else:
+            yield surface
+
+class CompiledScene:
+    """Struct-of-arrays snapshot of a Scene.
+
+    Built by `Scene.compile()`, which keeps it until a surface or light is added.
+    Changing the camera only repacks the view, and surfaces that moved are
+    written over their old packing by `update`.
+
+    Attributes:
+        geometry (Geometry): per-type surface arrays, each surface holding a material id
+        materials (Materials): material table indexed by material id
+        lights (Lights): point light table, clustered when there's a light manager,
+            and the summed ambient intensity
+        light_manager (LightManager): the scene's light manager when it was packed, or None
+        view (View): camera frame used to generate primary rays
+        surfaces (list[Surface]): surfaces in packed order (spheres, planes, triangles, meshes,
+            instances). Mesh faces follow the lone triangles in the triangle arrays, and the
+            primitives of instanced geometry follow those of the scene.
+        material_list (list[Material]): materials in material id order
+        dtype (np.dtype): float type of every packed array but the view, from `Scene.precision`
+    """
+
+    def __init__(self, scene):
+        """Pack a scene.
+
+        Args:
+            scene (Scene): Scene to pack
+
+        Raises:
+            TypeError: if the scene holds a surface or light the compiled engines can't handle
+        """
+        self.material_list = []
+        self._material_ids = {}
+        self.dtype = np.dtype(scene.precision)
+        self._slots = None
+        self._owners = None
+        self._refit = None
+
+        self.geometry = self._pack_geometry(scene.objects.surfaces, scene.objects.accel)
+        self.materials = self._pack_materials()
+        self.light_manager = scene.light_manager
+        self.lights = self._pack_lights(scene.lights, scene.light_manager)
+        self.view = self._pack_view(scene.camera)
+
+    @classmethod
+    def from_buffers(cls, geometry, materials, lights, camera, light_manager=None):
+        """Wrap buffers packed earlier, e.g. loaded by `Scene.load`.
+
+        There are no Surface objects behind them: `surfaces` is empty and
+        `material_list` holds Materials rebuilt from the material table.
+
+        Args:
+            geometry (Geometry): packed surfaces
+            materials (Materials): material table
+            lights (Lights): packed lights, clustered by `light_manager` if there's one
+            camera (Camera): camera to pack the view of
+            light_manager (LightManager, optional): the manager the lights were packed with
+
+        Returns:
+            CompiledScene
+        """
+        compiled = cls.__new__(cls)
+        compiled.dtype = geometry.triangle_v0.dtype
+        compiled.geometry, compiled.materials, compiled.lights = geometry, materials, lights
+        compiled.light_manager = light_manager
+        compiled.surfaces = []
+        compiled.material_list = [
+            Material(*coefficients) for coefficients in zip(
+                materials.ambient, materials.diffuse, materials.specular, materials.shininess.tolist())
+        ]
+        compiled._material_ids = {}
+        compiled._slots = None
+        compiled._owners = None
+        compiled._refit = None
+        compiled.view = compiled._pack_view(camera)
+        return compiled
+
+    def update_camera(self, camera):
+        """Swap in a new camera without repacking anything else"""
+        self.view = self._pack_view(camera)
+
+    def update(self, surfaces):
+        """Write the current state of some packed surfaces over their old one.
+
+        The BVH is refitted around the surfaces that moved rather than built
+        again, until refitting made it REBUILD_COST times slower to trace than
+        a fresh one, when it's rebuilt. Meshes keep their faces, only their
+        vertices can move.
+
+        Args:
+            surfaces (Iterable[Surface]): surfaces whose position, shape or material
+                changed, each one refreshed already (see `Surface.refresh`)
+
+        Returns:
+            bool: False if some of them can't be updated in place (a surface that
+                wasn't packed as such, e.g. one inside an instance's geometry, or
+                a mesh whose faces changed), then the scene has to be packed again
+        """
+        if self._slots is None:
+            self._slots = self._index_surfaces()
+        slots = []
+        for surface in surfaces:
+            slot = self._slots.get(id(surface))
+            if slot is None or isinstance(surface, TriangleMesh) and surface.faces.shape[0] != slot[2]:
+                return False
+            slots.append((surface, slot))
+
+        materials = len(self.material_list)
+        moved = {SPHERE: [], TRIANGLE: [], INSTANCE: []}
+        g = self.geometry
+        for surface, (kind, start, count) in slots:
+            if kind == SPHERE:
+                g.sphere_center[start] = surface.center
+                g.sphere_radius[start] = surface.radius
+                g.sphere_material[start] = self._material_id(surface.material)
+            elif kind == PLANE:
+                g.plane_normal[start] = surface.normal
+                g.plane_point[start] = surface.point
+                g.plane_material[start] = self._material_id(surface.material)
+            elif kind == TRIANGLE:
+                faces = slice(start, start + count)
+                if isinstance(surface, TriangleMesh):
+                    g.triangle_v0[faces] = surface.vertices[surface.faces[:, 0]]
+                    g.triangle_e1[faces] = surface.edges[:, 0]
+                    g.triangle_e2[faces] = surface.edges[:, 1]
+                    g.triangle_normal[faces] = surface.normals
+                else:
+                    e1, e2 = surface.v2 - surface.v1, surface.v3 - surface.v1
+                    g.triangle_v0[start], g.triangle_e1[start], g.triangle_e2[start] = surface.v1, e1, e2
+                    g.triangle_normal[start] = face_normals(e1, e2)
+                g.triangle_material[faces] = self._material_id(surface.material)
+            else:
+                g.instance_inverse[start] = surface.inverse[:3]
+                g.instance_material[start] = -1 if surface.material is None else self._material_id(surface)
+            if kind != PLANE:
+                moved[kind].extend(range(start, start + count))
+
+        if len(self.material_list) > materials:
+            self.materials = self._pack_materials()
+        if g.bvh_count.shape[0]:
+            self._refit_bvh(moved)
+        return True
+
+    def _index_surfaces(self):
+        """(kind, first, count) of the packed primitives of every surface, by surface id"""
+        slots, counts = {}, {SPHERE: 0, PLANE: 0, TRIANGLE: 0, INSTANCE: 0}
+        for surface in self.surfaces:
+            if isinstance(surface, Sphere):
+                kind, count = SPHERE, 1
+            elif isinstance(surface, Plane):
+                kind, count = PLANE, 1
+            elif isinstance(surface, TriangleMesh):
+                kind, count = TRIANGLE, surface.faces.shape[0]
+            elif isinstance(surface, Triangle):
+                kind, count = TRIANGLE, 1
+            else:
+                kind, count = INSTANCE, 1
+            slots[id(surface)] = (kind, counts[kind], count)
+            counts[kind] += count
+        return slots
+
+    def surface_ids(self, primitives):
+        """Surface every primitive belongs to, e.g. to tell objects apart in an image.
+
+        Args:
+            primitives (np.ndarray): int array of `primitive_id`s, see `wavefront.trace`
+
+        Returns:
+            np.ndarray: position in `surfaces` of the surface of every primitive, -1 for
+                misses. Scenes from `from_buffers` have no surfaces, every primitive
+                (mesh faces included) is then told apart by its primitive id.
+        """
+        if not self.surfaces:
+            return primitives
+        if self._owners is None:
+            slots = self._index_surfaces()
+            owners = [[] for _ in range(KINDS)]
+            for position, surface in enumerate(self.surfaces):
+                kind, _, count = slots[id(surface)]
+                owners[kind].extend([position] * count)
+            self._owners = [np.array(owner, dtype=np.int64) for owner in owners]
+
+        ids = np.full(primitives.shape, -1, dtype=np.int64)
+        for kind, owner in enumerate(self._owners):
+            where = (primitives >= 0) & (primitives % KINDS == kind)
+            ids[where] = owner[primitives[where] // KINDS]
+        return ids
+
+    def _instance_bounds(self, index):
+        """World space boxes of instances, as the BVH is built over them"""
+        g = self.geometry
+        lower, upper = np.zeros((len(index), 3)), np.zeros((len(index), 3))
+        for k, i in enumerate(index):
+            root = g.instance_root[i]
+            if root < g.bvh_count.shape[0]: # instances of empty geometry aren't in the tree
+                instance = self.surfaces[len(self.surfaces) - g.instance_root.shape[0] + i]
+                lower[k], upper[k] = placed_bounds(g.bvh_min[root].astype(float), g.bvh_max[root].astype(float),
+                                                   instance.transform)
+        return lower, upper
+
+    def _refit_bvh(self, moved):
+        if self._refit is None:
+            # the other instances are where they were packed
+            self._refit = BVHRefit(self.geometry, *self._instance_bounds(range(self.geometry.instance_root.shape[0])))
+        self._refit.move(SPHERE, moved[SPHERE])
+        self._refit.move(TRIANGLE, moved[TRIANGLE])
+        if moved[INSTANCE]:
+            self._refit.move(INSTANCE, moved[INSTANCE], *self._instance_bounds(moved[INSTANCE]))
+        if self._refit.cost > REBUILD_COST:
+            self.geometry = self._refit.rebuild()
+
+    def __repr__(self):
+        g = self.geometry
+        counts = (g.sphere_radius.shape[0], g.plane_normal.shape[0], g.triangle_v0.shape[0])
+        return (f"<CompiledScene: {counts[0]} spheres, {counts[1]} planes, {counts[2]} triangles, "
+                f"{len(self.material_list)} materials, {self.lights.point_center.shape[0]} point lights>")
+
+    def _material_id(self, material):
+        key = id(material)
+        if key not in self._material_ids:
+            self._material_ids[key] = len(self.material_list)
+            self.material_list.append(material)
+        return self._material_ids[key]
+
+    def _pack_geometry(self, surfaces, accel):
+        spheres, planes, triangles, meshes, instances = [], [], [], [], []
+        for surface in _flatten(surfaces):
+            if isinstance(surface, Sphere):
+                spheres.append(surface)
+            elif isinstance(surface, Plane):
+                planes.append(surface)
+            elif isinstance(surface, Triangle):
+                triangles.append(surface)
+            elif isinstance(surface, TriangleMesh):
+                meshes.append(surface)
+            elif isinstance(surface, Instance):
+                instances.append(surface)
+            else:
+                raise TypeError(f"Can't compile {type(surface).__name__} surfaces")
+        self.surfaces = spheres + planes + triangles + meshes + instances
+
+        return pack_geometry(spheres, planes, triangles, lambda s: self._material_id(s.material), accel, meshes,
+                             self.dtype, instances)
+
+    def _pack_materials(self):
+        def coefficients(name):
+            return np.array([
+                (0, 0, 0) if m is None else getattr(m, name) for m in self.material_list
+            ], dtype=self.dtype).reshape(-1, 3)
+
+        return Materials(
+            ambient=coefficients('ambient'),
+            diffuse=coefficients('diffuse'),
+            specular=coefficients('specular'),
+            shininess=np.array([0 if m is None else m.shininess for m in self.material_list], dtype=self.dtype),
+        )
+
+    def _pack_lights(self, lights, manager=None):
+        points, ambient = [], np.zeros(3, dtype=float)
+        for light in lights:
+            if isinstance(light, PointLight):
+                points.append(light)
+            elif isinstance(light, AmbientLight):
+                ambient += light.intensity
+            else:
+                raise TypeError(f"Can't compile {type(light).__name__} lights")
+
+        centers = np.array([p.center for p in points], dtype=float).reshape(-1, 3)
+        intensities = np.array([p.intensity for p in points], dtype=float).reshape(-1, 3)
+        if manager is None:
+            # One cluster that's never far enough to merge: every light is shaded
+            order = np.arange(len(points))
+            start, count = np.zeros(1, dtype=np.int64), np.array([len(points)], dtype=np.int64)
+        else:
+            order, start, count = manager.cluster(centers)
+        centers, intensities = centers[order], intensities[order]
+
+        # Clusters merge into a light at their intensity weighted centroid
+        cluster_center = np.empty((start.shape[0], 3))
+        cluster_radius = np.empty(start.shape[0])
+        cluster_intensity = np.empty((start.shape[0], 3))
+        for c, (first, n) in enumerate(zip(start, count)):
+            members, power = centers[first:first + n], intensities[first:first + n]
+            weight = power.sum(axis=1) + 1e-12
+            cluster_center[c] = (members * weight[:, None]).sum(axis=0) / weight.sum() if n else 0
+            cluster_radius[c] = np.linalg.norm(members - cluster_center[c], axis=1).max(initial=0.0)
+            cluster_intensity[c] = power.sum(axis=0)
+        if manager is None:
+            cluster_radius[:] = np.inf
+
+        return Lights(
+            point_center=np.ascontiguousarray(centers, dtype=self.dtype),
+            point_intensity=np.ascontiguousarray(intensities, dtype=self.dtype),
+            ambient=ambient.astype(self.dtype),
+            cluster_start=start,
+            cluster_count=count,
+            cluster_center=cluster_center.astype(self.dtype),
+            cluster_radius=cluster_radius.astype(self.dtype),
+            cluster_intensity=cluster_intensity.astype(self.dtype),
+            cutoff=self.dtype.type(0.0 if manager is None else manager.cutoff),
+            cluster_distance=self.dtype.type(np.inf if manager is None else manager.cluster_distance),
+            shadow_budget=0 if manager is None or manager.shadow_budget is None else manager.shadow_budget,
+        )
+
+    def _pack_view(self, camera):
+        half_height = np.tan(np.deg2rad(camera.fov) / 2.0)
+        return View(
+            eye=np.array(camera.eye, dtype=float),
+            u=np.array(camera.u, dtype=float),
+            v=np.array(camera.v, dtype=float),
+            w=np.array(camera.w, dtype=float),
+            half_width=camera.aspect * half_height,
+            half_height=half_height,
+        )
@@ -0,0 +1,159 @@
+"""Image backgrounds wrapped around the scene.
+
+Decoding an image and building its mip pyramid takes far longer than
+rendering a small frame, so the levels of every image file are cached
+for the life of the process: every EnvironmentMap of the same file, in
+any scene, shares one float32 texture. Pillow is only needed to read
+image files, and only imported when one is read.
+"""
+import os
+import threading
+
+import numpy as np
+
+from ..engine.environment import LATLONG, mip_levels, footprint_level, sample_environment
+
+LAYOUTS = ('latlong', 'cross')
+
+# Cells of the faces of a horizontal cross, (row, column) in a 3x4 grid, in
+# face order: front, right, back, left, top, bottom
+_CROSS = ((1, 1), (1, 2), (1, 3), (1, 0), (0, 1), (2, 1))
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+def _layout(image, layout):
+    """Layout of an image, guessed from its shape if `layout` is None"""
+    if layout is None:
+        height, width = image.shape[:2]
+        layout = 'cross' if 3 * width == 4 * height else 'latlong'
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout {layout!r}, expected one of {LAYOUTS}")
+    return layout
+
+def _levels(image, layout):
+    """Mip levels of an RGB image in [0, 1]"""
+    if _layout(image, layout) == 'latlong':
+        return mip_levels([image])
+    size = image.shape[1] // 4
+    if image.shape[0] != 3 * size or image.shape[1] != 4 * size:
+        raise ValueError(f"A cross needs an image 4 faces wide and 3 high, got {image.shape[1]}x{image.shape[0]}")
+    return mip_levels([image[row * size:(row + 1) * size, column * size:(column + 1) * size]
+                       for row, column in _CROSS])
+
+def _read_levels(path, layout):
+    """Mip levels of an image file, decoded once per file version"""
+    path = os.path.realpath(path)
+    info = os.stat(path)
+    key = (path, info.st_mtime_ns, info.st_size, layout)
+    with _cache_lock:
+        levels = _cache.get(key)
+    if levels is not None:
+        return levels
+
+    try:
+        from PIL import Image
+    except ImportError as error:
+        raise ImportError("Reading environment maps needs Pillow (pip install pillow)") from error
+    with Image.open(path) as image:
+        pixels = np.asarray(image.convert('RGB'), dtype=np.float32) / 255
+    levels = _levels(pixels, layout)
+    with _cache_lock:
+        # a file that changed is only read again
+        for stale in [k for k in _cache if k[0] == path]:
+            del _cache[stale]
+        _cache[key] = levels
+    return levels
+
+def clear_cache():
+    """Forget the textures of every image file read so far"""
+    with _cache_lock:
+        _cache.clear()
+
+class EnvironmentMap:
+    """Image seen by every ray that escapes the scene.
+
+    Used as `Scene(environment=EnvironmentMap('backgrounds/space.jpg'))`,
+    it replaces the background color for camera and reflection rays alike.
+    The image is either a latitude-longitude panorama, whose columns go
+    once around the z axis ('up' for the cameras) and whose rows go from
+    straight up to straight down, or a cube map unfolded as a horizontal
+    cross: left, front, right and back faces in the middle row, top and
+    bottom above and below the front. The front and the panorama's center
+    are towards +x, see `spritz.engine.environment`.
+
+    Rays read the mip level whose texels are about the size of a pixel,
+    blending the two nearest levels. Reflection rays read the same level as
+    camera rays.
+
+    Attributes:
+        levels (Environment): float32 mip pyramid, shared with every map of the same file
+        path (str): image file the map was read from, or None
+    """
+
+    def __init__(self, image, layout=None):
+        """Wrap an image around the scene.
+
+        Args:
+            image (str | ArrayLike): image file, read with Pillow, or a (height, width, 3)
+                RGB array with colors in [0, 1]
+            layout (str, optional): 'latlong' or 'cross'. Defaults to None, 'cross' for
+                4:3 images and 'latlong' for any other.
+
+        Raises:
+            ValueError: if the array isn't an RGB image, or doesn't fit the layout
+        """
+        if isinstance(image, (str, os.PathLike)):
+            self.path = os.fspath(image)
+            self.levels = _read_levels(self.path, layout)
+        else:
+            image = np.asarray(image)
+            if image.ndim != 3 or image.shape[2] != 3 or image.shape[0] == 0 or image.shape[1] == 0:
+                raise ValueError(f"image must be a (height, width, 3) RGB array, got shape {image.shape}")
+            self.path = None
+            self.levels = _levels(image, layout)
+
+    @classmethod
+    def from_levels(cls, levels, path=None):
+        """Wrap a mip pyramid built earlier, e.g. loaded by `Scene.load`"""
+        environment = cls.__new__(cls)
+        environment.levels, environment.path = levels, path
+        return environment
+
+    def __repr__(self):
+        source = self.path or 'an array'
+        layout = 'latlong' if self.levels.faces == LATLONG else 'cube'
+        return (f"<EnvironmentMap of {source}, {layout} {self.width}x{self.height}, "
+                f"{self.levels.level_width.shape[0]} levels>")
+
+    @property
+    def width(self):
+        """Width of the largest level, of a face for cube maps"""
+        return int(self.levels.level_width[0])
+
+    @property
+    def height(self):
+        """Height of the largest level, of a face for cube maps"""
+        return int(self.levels.level_height[0])
+
+    def level_of_detail(self, camera, height):
+        """Mip level whose texels are about the size of a pixel
+
+        Args:
+            camera (Camera): camera of the image
+            height (int): image height, in pixels
+        """
+        return footprint_level(self.levels, np.tan(np.deg2rad(camera.fov) / 2.0), height)
+
+    def sample(self, direction, lod=0.0):
+        """Color of the map along a direction
+
+        Args:
+            direction (ArrayLike): direction, normalized or not
+            lod (float, optional): mip level, fractional ones blend two levels. Defaults to 0.
+
+        Returns:
+            np.ndarray: RGB color
+        """
+        dx, dy, dz = np.asarray(direction, dtype=float)
+        return np.array(sample_environment(self.levels, dx, dy, dz, float(lod)))
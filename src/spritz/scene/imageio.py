@@ -0,0 +1,116 @@
+"""Writing rendered frames to disk.
+
+Pillow is only needed here, and only imported when a frame is saved.
+"""
+import io
+import mmap
+import os
+import threading
+
+import numpy as np
+
+BUDGET = 64 << 20 # bytes of written tiles a MappedImage keeps mapped in memory
+
+def to_rgb8(pixels):
+    """Clip a float RGB image to [0, 1] and quantize it to 8 bits per channel"""
+    return (np.clip(pixels, 0, 1) * 255).astype(np.uint8)
+
+def _image(pixels):
+    try:
+        from PIL import Image
+    except ImportError as error:
+        raise ImportError("Saving PNG frames needs Pillow (pip install pillow)") from error
+    return Image.fromarray(to_rgb8(pixels), 'RGB')
+
+def save_png(pixels, path):
+    """Save a float RGB image as a PNG, creating the parent directory if needed.
+
+    Args:
+        pixels (np.ndarray): (height, width, 3) RGB image
+        path (str): destination file
+    """
+    image = _image(pixels)
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    image.save(path)
+
+def encode_png(pixels, compress_level=6):
+    """PNG file of a float RGB image, in memory.
+
+    Args:
+        pixels (np.ndarray): (height, width, 3) RGB image
+        compress_level (int, optional): zlib level, 1 is fastest. Defaults to 6.
+
+    Returns:
+        bytes
+    """
+    buffer = io.BytesIO()
+    _image(pixels).save(buffer, format='PNG', compress_level=compress_level)
+    return buffer.getvalue()
+
+class MappedImage:
+    """Float RGB image file, memory-mapped and written one tile at a time.
+
+    Every `budget` bytes written, the mapping is flushed and its pages are
+    dropped from the process (where the OS allows it), so resident memory
+    stays bounded however big the file is.
+    """
+
+    def __init__(self, path, width, height, dtype=np.float64, budget=BUDGET):
+        """Create (or overwrite) the file and map it.
+
+        Args:
+            path (str): a '.npy' file gets a NumPy header, anything else is raw
+                row-major (height, width, 3) data
+            width (int): image width
+            height (int): image height
+            dtype (np.dtype, optional): pixel type. Defaults to float64.
+            budget (int, optional): bytes written between flushes. Defaults to 64 MiB.
+        """
+        self.path = path
+        self.shape = (height, width, 3)
+        self.dtype = np.dtype(dtype)
+        self.budget = budget
+
+        if path.endswith('.npy'):
+            header = np.lib.format.open_memmap(path, mode='w+', dtype=self.dtype, shape=self.shape)
+            offset = header.offset
+            del header
+        else:
+            offset = 0
+            with open(path, 'wb') as file:
+                file.truncate(self.dtype.itemsize * height * width * 3)
+
+        self._file = open(path, 'r+b')
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._pixels = np.ndarray(self.shape, dtype=self.dtype, buffer=self._map, offset=offset)
+        self._written = 0
+        self._lock = threading.Lock()
+
+    def write(self, x0, y0, block):
+        """Store a (h, w, 3) block with its top left corner at pixel (x0, y0)"""
+        self._pixels[y0:y0 + block.shape[0], x0:x0 + block.shape[1]] = block
+        with self._lock:
+            self._written += block.shape[0] * block.shape[1] * 3 * self.dtype.itemsize
+            if self._written >= self.budget:
+                self._release()
+                self._written = 0
+
+    def _release(self):
+        self._map.flush()
+        if hasattr(mmap, 'MADV_DONTNEED'): # the data is in the file, the pages get read back if touched again
+            self._map.madvise(mmap.MADV_DONTNEED)
+
+    def close(self):
+        """Flush and unmap the file"""
+        self._map.flush()
+        self._pixels = None
+        self._map.close()
+        self._file.close()
+
+    def open(self, mode='r+'):
+        """Map the finished file again as a (height, width, 3) array"""
+        if self.path.endswith('.npy'):
+            return np.load(self.path, mmap_mode=mode)
+        return np.memmap(self.path, dtype=self.dtype, mode=mode, shape=self.shape)
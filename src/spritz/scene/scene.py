@@ -1,4 +1,9 @@
 """Scenes are the 3D environment to be rendered."""
+import time
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 
 from ..camera import *
@@ -7,61 +12,546 @@ from ..lighting import *
 from ..materials import *
 from ..raytracing import *
 from ..surfaces import *
+from ..engine import tiles, wavefront
+from ..engine.buffers import PRECISIONS
+from ..engine.kernels import survival
+from .compiled import CompiledScene
+from . import antialias, imageio, sceneio
+
+ENGINES = ('python', 'wavefront')
 
 class Scene:
     """Scenes host all of the objects needed for rendering"""
 
-    def __init__(self, objects=None, lights=None, camera=None, background_color=GRAY, max_bounces=1):
-        self.objects = SurfaceGroup(objects)
+    def __init__(self, objects=None, lights=None, camera=None, background_color=GRAY, max_bounces=1, engine='python', accel=None,
+                 precision='float64', min_weight=0.0, roulette_depth=None, light_manager=None,
+                 visibility_cache=None, environment=None):
+        """Create a new Scene.
+
+        Args:
+            engine (str, optional): 'python' shades each pixel through the Surface
+                and Light objects, 'wavefront' traces whole arrays of rays in compiled
+                kernels. Both produce the same image. Defaults to 'python'.
+            accel (str, optional): acceleration structure for the scene's surfaces, see
+                `SurfaceGroup`. 'bvh' is used by both engines. Defaults to None (linear scan).
+            precision (str, optional): 'float32' packs the scene and traces rays, shades
+                and fills the framebuffer in single precision with the 'wavefront' engine,
+                which halves the memory traffic of the kernels. Most pixels then stay
+                within 1e-3 of a float64 render, but rays grazing a silhouette or
+                bouncing off mirrors can hit another surface, so a few pixels on edges
+                and highlights can be off by 0.3 or more. The 'python' engine always
+                uses float64. Defaults to 'float64'.
+            min_weight (float, optional): reflections are only traced while the path
+                weight (the product of the specular colors bounced off so far) is
+                above this in some channel. The default of 0 skips reflections off
+                non-reflective materials, which doesn't change the image.
+            roulette_depth (int, optional): reflections past this many bounces play
+                Russian roulette: one with path weight w is traced with probability w
+                and then counts 1/w times, so deep mirror paths cost little on average
+                while the image stays unbiased (but noisier). Defaults to None (off).
+            light_manager (LightManager, optional): culls, clusters and samples point
+                lights with the 'wavefront' engine, for scenes with many of them. The
+                'python' engine always shades every light. Defaults to None (every
+                light is shaded, with its own shadow ray).
+            visibility_cache (VisibilityCache, optional): keeps the shadow ray results
+                of every 'wavefront' render for the next ones, so once the surfaces
+                and lights are packed, renders that only move the camera (see
+                `render_sequence`) trace few shadow rays. Shadows are then resolved
+                per grid cell rather than per pixel. Defaults to None (off).
+            environment (EnvironmentMap, optional): image seen by the rays that escape the
+                scene, instead of `background_color`. Defaults to None.
+        """
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision {precision!r}, expected one of {tuple(PRECISIONS)}")
+        self.objects = SurfaceGroup(objects, accel=accel)
         self.lights = lights or []
         self.camera = camera
         self.background_color = background_color
         self.max_bounces = max_bounces
+        self.engine = engine
+        self.precision = precision
+        self.min_weight = min_weight
+        self.roulette_depth = roulette_depth
+        self.light_manager = light_manager
+        self.visibility_cache = visibility_cache
+        self.environment = environment
         if camera is None:
             self.camera = Camera((1, 1, 1), (-1, -1, -1))
+        self._compiled = None
+        self._loaded = False
+        self._stale = False
+        self._counts = None # rays traced by the 'python' engine, while a render is counting them
 
     def add_surface(self, surface):
+        self._check_editable()
         self.objects.add_surface(surface)
+        self._compiled = None
 
     def add_light(self, light):
+        self._check_editable()
         self.lights.append(light)
+        self._compiled = None
+
+    def update(self, *surfaces):
+        """Tell the scene that surfaces in it were changed in place, e.g. moved between frames.
+
+        Change their attributes (a sphere's center, a mesh's vertices, an
+        instance's transform, any surface's material), then pass them here.
+        A compiled scene writes their new state over the old one and refits
+        its BVH around them rather than packing everything again, so the
+        update costs about as much as what moved. The hierarchies of the
+        'python' engine are built again before its next hit. The visibility
+        cache is cleared, since shadows may have moved too.
+
+        Args:
+            *surfaces (Surface): the surfaces that changed
+
+        Raises:
+            ValueError: if the scene was loaded by `load`
+        """
+        self._check_editable()
+        for surface in surfaces:
+            surface.refresh()
+        self._stale = True # walking every group is O(scene), only done if they're used
+        if self._compiled is not None and not self._compiled.update(surfaces):
+            self._compiled = None
+        if self.visibility_cache is not None:
+            self.visibility_cache.clear()
+
+    def _check_editable(self):
+        if self._loaded:
+            raise ValueError("Scenes from Scene.load only hold packed arrays, surfaces and lights can't be added or updated")
+
+    def save(self, path):
+        """Save the packed scene, see `load`.
+
+        The directory gets one .npy file per packed array, the BVH included,
+        and a manifest.json with the format version, camera and render
+        settings. The engine and the visibility cache aren't saved.
+
+        Args:
+            path (str): directory to write, created if needed. An earlier save
+                there is replaced, once the new one is complete.
+
+        Raises:
+            ValueError: if `path` exists and is neither an empty directory nor a saved scene
+        """
+        sceneio.save_scene(self, path)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load a scene saved by `save`, ready to render without packing anything.
+
+        With `mmap` the arrays are mapped copy-on-write rather than read, so
+        loading takes about as long whatever the size of the scene, and
+        processes loading the same scene share one copy of it in the OS page
+        cache. The loaded scene has no Surface or Light objects: it renders
+        with the 'wavefront' engine, its camera and render settings can be
+        changed, but surfaces and lights can't be added.
+
+        Args:
+            path (str): directory written by `save`
+            mmap (bool, optional): map the arrays instead of reading them. Defaults to True.
+
+        Raises:
+            ValueError: if the directory isn't a saved scene or uses a newer version of the format
+
+        Returns:
+            Scene
+        """
+        return cls._from_packed(*sceneio.load_scene(path, mmap))
+
+    @classmethod
+    def _from_packed(cls, buffers, camera, settings, manager):
+        """Scene around buffers packed earlier, see `sceneio.load_scene`"""
+        scene = cls(camera=camera, engine='wavefront', light_manager=manager, **settings)
+        scene._compiled = CompiledScene.from_buffers(**buffers, camera=camera, light_manager=manager)
+        scene._loaded = True
+        return scene
 
     def change_camera(self, camera):
         self.camera = camera
+        if self._compiled is not None:
+            self._compiled.update_camera(camera)
+
+    def compile(self):
+        """Pack the scene into contiguous arrays for the compiled engines.
+
+        The result is cached, and dropped whenever `add_surface` or `add_light`
+        is called or the precision or light manager change. `change_camera` only
+        repacks the camera, `update` only the surfaces that changed.
+
+        Returns:
+            CompiledScene: packed surfaces, materials, lights and camera
+        """
+        compiled = self._compiled
+        if compiled is None or compiled.dtype != self.precision or compiled.light_manager is not self.light_manager:
+            if self._loaded:
+                raise ValueError("Scenes from Scene.load can't be packed again, e.g. at another precision")
+            self._compiled = CompiledScene(self)
+        return self._compiled
+
+    def render(self, width=50, height=50, workers=1, tile_size=None, max_samples=1, aa_threshold=0.1, seed=0,
+               stats=None):
+        """Rendering routine for the scene's camera.
 
-    def render(self, width=50, height=50):
-        """Rendering routine for the scene's camera."""
+        Args:
+            width (int, optional): image width. Defaults to 50.
+            height (int, optional): image height. Defaults to 50.
+            workers (int, optional): threads rendering tiles in parallel, None for one
+                per core. Needs the 'wavefront' engine. Defaults to 1.
+            tile_size (int, optional): tile edge in pixels. Defaults to 64 when rendering
+                with several workers, otherwise 128.
+            max_samples (int, optional): adaptive anti-aliasing. Pixels on high contrast
+                edges or surface boundaries get this many jittered samples in total,
+                every other pixel keeps its single center sample. Defaults to 1 (off).
+            aa_threshold (float, optional): color difference between neighbouring pixels
+                that counts as an edge. Defaults to 0.1.
+            seed (int, optional): seed of the sub-pixel jitter. Defaults to 0.
+            stats (RenderStats, optional): gets the ray and intersection counts and
+                the stage timings of this render added to it. Without one nothing is
+                counted. The 'python' engine only counts rays, hits and terminated
+                rays, intersection tests, cache hits and timings stay at 0.
+
+        Returns:
+            np.ndarray: (height, width, 3) RGB image
+        """
+        return self._render(width, height, workers, tile_size, max_samples, aa_threshold, seed, stats)
+
+    def _render(self, width, height, workers=1, tile_size=None, max_samples=1, aa_threshold=0.1, seed=0,
+                stats=None, out=None):
+        """`render`, optionally into a preallocated pixel buffer"""
+        if self.engine not in ENGINES:
+            raise ValueError(f"Unknown engine {self.engine!r}, expected one of {ENGINES}")
+        ids = np.empty((height, width), dtype=np.int64) if max_samples > 1 else None
+        if self.engine == 'wavefront':
+            pixels = self._render_wavefront(width, height, workers, tile_size, ids, stats, out)
+        else:
+            if workers != 1:
+                raise ValueError("Rendering with several workers needs engine='wavefront'")
+            pixels = self._render_python(width, height, ids, stats)
+            if out is not None:
+                out[...] = pixels
+                pixels = out
+
+        if max_samples > 1:
+            pixels = self._antialias(pixels, ids, max_samples, aa_threshold, seed, workers, stats)
+        return pixels
+
+    def _render_python(self, width, height, ids=None, stats=None):
         origins, directions = self.camera.generate_rays(width, height)
+        lod = self._environment_lod(height)
 
         pixels = np.zeros((height, width, 3), dtype=np.float64)
 
-        for y in range(height):
-            for x in range(width):
-                ray = (origins[y, x], directions[y, x])
-                pixels[y, x] = self._shade(ray)
+        with self._counting(stats):
+            self._count('primary_rays', width * height)
+            for y in range(height):
+                for x in range(width):
+                    ray = (origins[y, x], directions[y, x])
+                    intersection = self.hit(ray)
+                    pixels[y, x] = self._shade_hit(ray, intersection, lod=lod)
+                    if ids is not None:
+                        ids[y, x] = -1 if intersection is None else id(intersection.surface)
+
+        return pixels
+
+    @contextmanager
+    def _counting(self, stats):
+        """Count the rays the 'python' engine traces meanwhile into `stats`, if given"""
+        if stats is None:
+            yield
+            return
+        self._counts = dict.fromkeys(('primary_rays', 'shadow_rays', 'secondary_rays', 'hits', 'shadow_hits',
+                                      'terminated_rays'), 0)
+        try:
+            yield
+        finally:
+            counts, self._counts = self._counts, None
+            stats.add(**counts)
 
+    def _count(self, name, count=1):
+        if self._counts is not None:
+            self._counts[name] += count
+
+    def _antialias(self, pixels, ids, max_samples, threshold, seed, workers=1, stats=None):
+        """Average extra jittered samples into the pixels on edges"""
+        height, width = ids.shape
+        ys, xs = np.nonzero(antialias.edge_mask(pixels, ids, threshold))
+        extra = max_samples - 1
+        offsets = antialias.subpixel_offsets(ys.shape[0], extra, np.random.default_rng(seed))
+
+        samples = self._trace_samples(
+            (xs[:, None] + offsets[..., 0]).ravel(),
+            (ys[:, None] + offsets[..., 1]).ravel(),
+            width, height, workers, stats,
+        )
+        pixels[ys, xs] = (pixels[ys, xs] + samples.reshape(-1, extra, 3).sum(axis=1)) / max_samples
         return pixels
 
+    def _render_wavefront(self, width, height, workers=1, tile_size=None, ids=None, stats=None, out=None):
+        compiled = self.compile()
+        pixels = np.zeros((height, width, 3), dtype=compiled.dtype) if out is None else out
+
+        # Camera rays are generated tile by tile inside the intersection kernel
+        def render_tile(x0, y0, x1, y1):
+            tile_ids = np.empty((y1 - y0) * (x1 - x0), dtype=np.int64)
+            colors = self._trace_tile(compiled, width, height, (x0, y0, x1, y1), None if ids is None else tile_ids,
+                                      stats)
+            pixels[y0:y1, x0:x1] = colors.reshape(y1 - y0, x1 - x0, 3)
+            if ids is not None:
+                ids[y0:y1, x0:x1] = compiled.surface_ids(tile_ids).reshape(y1 - y0, x1 - x0)
+
+        if tile_size is None:
+            tile_size = tiles.TILE_SIZE if workers != 1 else tiles.SERIAL_TILE_SIZE
+        tiles.render_tiles(render_tile, width, height, tile_size, workers)
+        self._commit_visibility()
+        return pixels
+
+    def _trace_tile(self, compiled, width, height, tile, ids=None, stats=None):
+        """Colors of the pixels of a tile with the 'wavefront' engine, see `wavefront.trace_tile`"""
+        return wavefront.trace_tile(
+            compiled,
+            width,
+            height,
+            tile,
+            self.max_bounces,
+            self.background_color,
+            ids,
+            stats,
+            self.min_weight,
+            self.roulette_depth,
+            self.visibility_cache,
+            self.environment,
+        )
+
+    def _commit_visibility(self):
+        """Share the shadow ray results of a finished render with the next ones"""
+        if self.visibility_cache is not None:
+            self.visibility_cache.commit()
+
+    def render_to_file(self, path, width=50, height=50, workers=1, tile_size=tiles.TILE_SIZE, dtype=np.float64,
+                       stats=None):
+        """Render straight into a memory-mapped file, for images too big for memory.
+
+        Camera rays are generated per tile and every finished tile is written
+        into the mapped file (see `imageio.MappedImage`), so memory use depends
+        on the tile size rather than the image size. The pixels are the same
+        as `render` gives.
+
+        Args:
+            path (str): output file. A '.npy' file gets a NumPy header (open it
+                with np.load(path, mmap_mode='r')), anything else is raw
+                row-major (height, width, 3) data.
+            width (int, optional): image width. Defaults to 50.
+            height (int, optional): image height. Defaults to 50.
+            workers (int, optional): render threads, see `render`. Defaults to 1.
+            tile_size (int, optional): tile edge in pixels. Defaults to 64.
+            dtype (np.dtype, optional): pixel type of the file. Defaults to float64.
+            stats (RenderStats, optional): see `render`
+
+        Raises:
+            ValueError: if the scene doesn't use the 'wavefront' engine
+
+        Returns:
+            np.memmap: (height, width, 3) view of the file
+        """
+        if self.engine != 'wavefront':
+            raise ValueError("Rendering to a file needs engine='wavefront'")
+
+        compiled = self.compile()
+        image = imageio.MappedImage(path, width, height, dtype)
+        def render_tile(x0, y0, x1, y1):
+            colors = self._trace_tile(compiled, width, height, (x0, y0, x1, y1), stats=stats)
+            image.write(x0, y0, colors.reshape(y1 - y0, x1 - x0, 3))
+
+        try:
+            tiles.render_tiles(render_tile, width, height, tile_size, workers)
+        finally:
+            image.close()
+        self._commit_visibility()
+        return image.open()
+
+    def render_sequence(self, camera_path, output, width=50, height=50, workers=1, encoders=2, start=0, **options):
+        """Render an animation, one frame per camera, and save every frame as a PNG.
+
+        The scene is compiled once: between frames only the camera is
+        repacked, and the pixel buffers are reused. Finished frames
+        are handed to a pool of encoder threads that write them to disk
+        while the next frame renders. The scene's camera is restored afterwards.
+
+        Args:
+            camera_path (Iterable[Camera]): camera of every frame
+            output (str): path of every frame, formatted with the frame number,
+                e.g. 'ani/frame{}.png' or 'ani/{:04d}.png'
+            width (int, optional): frame width. Defaults to 50.
+            height (int, optional): frame height. Defaults to 50.
+            workers (int, optional): render threads, see `render`. Defaults to 1.
+            encoders (int, optional): PNG encoder threads. Defaults to 2.
+            start (int, optional): number of the first frame. Defaults to 0.
+            **options: passed on to `render` (tile_size, max_samples, stats, ...)
+
+        Returns:
+            list[str]: paths of the saved frames
+        """
+        camera = self.camera
+        dtype = self.precision if self.engine == 'wavefront' else np.float64
+        # A frame buffer is free again once its encoder is done, one more lets rendering run ahead
+        free = deque(np.empty((height, width, 3), dtype=dtype) for _ in range(encoders + 1))
+        pending = deque()
+        paths = []
+
+        try:
+            with ThreadPoolExecutor(max_workers=encoders, thread_name_prefix='spritz-encoder') as pool:
+                for number, frame_camera in enumerate(camera_path, start):
+                    if not free:
+                        buffer, future = pending.popleft()
+                        future.result()
+                        free.append(buffer)
+                    buffer = free.popleft()
+
+                    self.change_camera(frame_camera)
+                    self._render(width, height, workers, out=buffer, **options)
+
+                    path = output.format(number)
+                    pending.append((buffer, pool.submit(imageio.save_png, buffer, path)))
+                    paths.append(path)
+
+                for _, future in pending:
+                    future.result()
+        finally:
+            self.change_camera(camera)
+        return paths
+
+    def render_progressive(self, width=50, height=50, start=8, workers=1):
+        """Render in passes of increasing resolution, for fast previews.
+
+        The first pass traces every `start`-th pixel in each direction and
+        each pass halves the stride, tracing only the pixels no earlier pass
+        has. Every traced pixel is shown over the block it stands for until
+        a later pass fills that block in, and the last image yielded is the
+        same as `render(width, height)`.
+
+        Args:
+            width (int, optional): image width. Defaults to 50.
+            height (int, optional): image height. Defaults to 50.
+            start (int, optional): stride of the first pass, a power of two. Defaults to 8.
+            workers (int, optional): threads tracing each pass, see `render`. Defaults to 1.
+
+        Yields:
+            np.ndarray: (height, width, 3) RGB preview after every pass
+        """
+        if start < 1 or start & (start - 1):
+            raise ValueError(f"start must be a power of two, got {start}")
+
+        pixels = np.zeros((height, width, 3), dtype=self.precision if self.engine == 'wavefront' else np.float64)
+        done = np.zeros((height, width), dtype=bool)
+        stride = start
+        while stride >= 1:
+            ys, xs = np.mgrid[0:height:stride, 0:width:stride]
+            todo = ~done[ys, xs]
+            ys, xs = ys[todo], xs[todo]
+            pixels[ys, xs] = self._trace_samples(xs + 0.5, ys + 0.5, width, height, workers)
+            done[ys, xs] = True
+
+            coarse = pixels[::stride, ::stride]
+            yield np.repeat(np.repeat(coarse, stride, axis=0), stride, axis=1)[:height, :width]
+            stride //= 2
+
+    def _trace_samples(self, xs, ys, width, height, workers=1, stats=None):
+        """Colors of the rays through image plane points (xs, ys), in pixel units.
+
+        Returns:
+            np.ndarray: (N, 3) color of every sample
+        """
+        if self.engine not in ENGINES:
+            raise ValueError(f"Unknown engine {self.engine!r}, expected one of {ENGINES}")
+        start = time.perf_counter()
+        origins, directions = self.camera.generate_rays_at(xs, ys, width, height)
+        if stats is not None:
+            stats.add_time('generate', time.perf_counter() - start)
+        lod = self._environment_lod(height)
+        if self.engine == 'python':
+            colors = np.zeros((origins.shape[0], 3), dtype=np.float64)
+            if workers != 1:
+                raise ValueError("Rendering with several workers needs engine='wavefront'")
+            with self._counting(stats):
+                self._count('primary_rays', origins.shape[0])
+                for k in range(origins.shape[0]):
+                    colors[k] = self._shade((origins[k], directions[k]), lod=lod)
+            return colors
+
+        compiled = self.compile()
+        colors = np.zeros((origins.shape[0], 3), dtype=compiled.dtype)
+        def trace_batch(start, end):
+            colors[start:end] = wavefront.trace(
+                compiled, origins[start:end], directions[start:end], self.max_bounces, self.background_color,
+                stats=stats, min_weight=self.min_weight, roulette_depth=self.roulette_depth,
+                visibility=self.visibility_cache, environment=self.environment, lod=lod,
+            )
+
+        batch = tiles.TILE_SIZE * tiles.TILE_SIZE
+        tiles.run_parallel(trace_batch, [(k, min(k + batch, origins.shape[0])) for k in range(0, origins.shape[0], batch)], workers)
+        self._commit_visibility()
+        return colors
+
+    def _environment_lod(self, height):
+        """Mip level of the environment map for images `height` pixels tall"""
+        return 0.0 if self.environment is None else self.environment.level_of_detail(self.camera, height)
+
+    def _refresh_objects(self):
+        self.objects.refresh()
+        self._stale = False
+
     def hit(self, ray, t0=0, t1=np.inf):
+        if self._stale:
+            self._refresh_objects()
         return self.objects.hit(ray, t0, t1)
 
-    def _shade(self, ray, bounces=0):
-        """Compute pixel for a given viewing ray"""
-        intersection = self.hit(ray)
+    def occluded(self, ray, t0=0, t1=np.inf):
+        """Whether anything blocks the ray in [t0, t1]. Cheaper than `hit` for shadow rays."""
+        if self._stale:
+            self._refresh_objects()
+        blocked = self.objects.occluded(ray, t0, t1)
+        self._count('shadow_rays')
+        self._count('shadow_hits', int(blocked))
+        return blocked
+
+    def _shade(self, ray, bounces=0, weight=(1.0, 1.0, 1.0), lod=0.0):
+        """Compute pixel for a given viewing ray, whose color counts `weight` times in the pixel.
+        Missed rays read the environment map at mip level `lod`."""
+        return self._shade_hit(ray, self.hit(ray), bounces, weight, lod)
+
+    def _shade_hit(self, ray, intersection, bounces=0, weight=(1.0, 1.0, 1.0), lod=0.0):
+        """`_shade` of a ray whose closest hit, `intersection`, is already known"""
         if intersection is None:
+            if self.environment is not None:
+                return self.environment.sample(ray[1], lod)
             return self.background_color
         
+        self._count('hits')
         shade = np.array((0, 0, 0), dtype=float)
         for light in self.lights:
             light_contribution = light.illuminate(self, ray, intersection)
             shade += light_contribution
 
         # reflect
+        specular = intersection.surface.material.specular
+        path = np.multiply(weight, specular)
+        reflected = False
         if bounces < self.max_bounces:
             ray_origin, ray_direction = ray
-            reflect_origin = ray_origin + intersection.t * ray_direction + 1e-6 * intersection.normal
-            reflect_direction = ray_direction - 2*(np.dot(ray_direction, intersection.normal))*intersection.normal
-            reflect_ray = (reflect_origin, reflect_direction)
-            shade += np.multiply(intersection.surface.material.specular, self._shade(reflect_ray, bounces + 1))
+            point = ray_origin + intersection.t * ray_direction
+            roulette = self.roulette_depth is not None and bounces >= self.roulette_depth
+            keep = survival(*path, *point, self.min_weight, roulette, bounces)
+            if keep > 0:
+                reflected = True
+                self._count('secondary_rays')
+                reflect_origin = point + 1e-6 * intersection.normal
+                reflect_direction = ray_direction - 2*(np.dot(ray_direction, intersection.normal))*intersection.normal
+                reflect_ray = (reflect_origin, reflect_direction)
+                shade += np.multiply(specular, self._shade(reflect_ray, bounces + 1, path / keep, lod)) / keep
+        if not reflected and np.any(path > 0):
+            self._count('terminated_rays')
             
         return shade
@@ -0,0 +1,201 @@
+"""Saving packed scenes to disk and mapping them back.
+
+A scene file is a directory holding one .npy file per packed array
+(geometry and its BVH, materials, lights, the environment map's mip
+levels if there's one) and a manifest.json with the format version, the
+camera, the render settings and the light manager.
+Loading maps the arrays copy-on-write instead of reading them, so every
+process loading the same scene shares its pages in the OS page cache,
+and nothing is read from disk before a kernel touches it.
+"""
+import json
+import os
+import shutil
+import uuid
+
+import numpy as np
+
+from ..camera import Camera
+from ..engine.buffers import Geometry, Materials, Lights, Environment
+from ..lighting import LightManager
+from .environment import EnvironmentMap
+
+FORMAT = 'spritz-scene'
+# 2 added the environment map, which readers of version 1 would drop
+VERSION = 2
+MANIFEST = 'manifest.json'
+
+# Packed buffers, saved as <name>.<field>.npy
+BUFFERS = {'geometry': Geometry, 'materials': Materials, 'lights': Lights}
+
+def _array_file(path, name, field):
+    return os.path.join(path, f"{name}.{field}.npy")
+
+def _settings(scene):
+    return {
+        'background_color': np.asarray(scene.background_color, dtype=float).tolist(),
+        'max_bounces': scene.max_bounces,
+        'min_weight': scene.min_weight,
+        'roulette_depth': scene.roulette_depth,
+    }
+
+def packed_state(scene):
+    """Everything `load_scene` would read back after saving a scene, without going through files.
+
+    Returns:
+        tuple: (buffers, camera, settings, light_manager), see `load_scene`
+    """
+    compiled = scene.compile()
+    settings = dict(_settings(scene), precision=str(compiled.dtype), environment=scene.environment)
+    settings['background_color'] = tuple(settings['background_color'])
+    buffers = {name: getattr(compiled, name) for name in BUFFERS}
+    return buffers, scene.camera, settings, scene.light_manager
+
+def _is_scene(path):
+    try:
+        with open(os.path.join(path, MANIFEST)) as file:
+            return json.load(file).get('format') == FORMAT
+    except (OSError, ValueError, AttributeError):
+        return False
+
+def save_scene(scene, path):
+    """Pack a scene and save it as a scene directory.
+
+    The files are written to a new directory next to `path`, which then
+    takes its place. An earlier save there stays whole until the new one is
+    complete, and scenes loaded (and memory mapped) from it keep working,
+    saving over the directory a scene was loaded from included.
+
+    Args:
+        scene (Scene): scene to save, it's compiled first if needed
+        path (str): directory to write, its parent is created if needed.
+            An earlier save there is replaced.
+
+    Raises:
+        ValueError: if `path` exists and is neither an empty directory nor a saved scene
+    """
+    path = os.path.abspath(path)
+    if os.path.exists(path) and not (os.path.isdir(path) and (not os.listdir(path) or _is_scene(path))):
+        raise ValueError(f"{path!r} exists and isn't a saved scene, not replacing it")
+    compiled = scene.compile()
+    parent, name = os.path.split(path)
+    os.makedirs(parent, exist_ok=True)
+    staging = os.path.join(parent, f".{name}.{uuid.uuid4().hex}")
+    os.mkdir(staging)
+    retired = None
+    try:
+        _write_scene(scene, compiled, staging)
+        if os.path.exists(path):
+            retired = staging + '.old'
+            os.rename(path, retired)
+        try:
+            os.rename(staging, path)
+        except OSError:
+            if retired is not None:
+                os.rename(retired, path)
+            raise
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    if retired is not None:
+        shutil.rmtree(retired)
+
+def _write_scene(scene, compiled, path):
+    """Files of `save_scene`, into an existing empty directory"""
+    scalars = {}
+    for name in BUFFERS:
+        for field, value in getattr(compiled, name)._asdict().items():
+            if isinstance(value, np.ndarray):
+                np.save(_array_file(path, name, field), value, allow_pickle=False)
+            else:
+                scalars[f"{name}.{field}"] = value.item() if isinstance(value, np.generic) else value
+    environment = scene.environment
+    if environment is not None:
+        for field, value in environment.levels._asdict().items():
+            if isinstance(value, np.ndarray):
+                np.save(_array_file(path, 'environment', field), value, allow_pickle=False)
+
+    camera = scene.camera
+    manager = scene.light_manager
+    manifest = {
+        'format': FORMAT,
+        'version': VERSION,
+        'precision': str(compiled.dtype),
+        'scalars': scalars,
+        'camera': {
+            'eye': camera.eye.tolist(),
+            'direction': (camera.eye - camera.w).tolist(),
+            'up': camera.v.tolist(),
+            'aspect': camera.aspect,
+            'fov': camera.fov,
+        },
+        # the frame rebuilt from those is off in the last bits
+        'camera_frame': [camera.u.tolist(), camera.v.tolist(), camera.w.tolist()],
+        'settings': _settings(scene),
+        'environment': None if environment is None else {'path': environment.path,
+                                                         'faces': int(environment.levels.faces)},
+        'light_manager': None if manager is None else {
+            'cutoff': manager.cutoff,
+            'cluster_size': manager.cluster_size,
+            'cluster_distance': manager.cluster_distance,
+            'shadow_budget': manager.shadow_budget,
+        },
+    }
+    with open(os.path.join(path, MANIFEST), 'w') as file:
+        json.dump(manifest, file, indent=2)
+
+def load_scene(path, mmap=True):
+    """Read a scene directory written by `save_scene`.
+
+    Args:
+        path (str): scene directory
+        mmap (bool, optional): map the arrays copy-on-write rather than
+            reading them into memory. Defaults to True.
+
+    Raises:
+        ValueError: if the directory isn't a scene, or was saved by a newer version of the format
+
+    Returns:
+        tuple: (buffers, camera, settings, light_manager), `buffers` mapping
+            'geometry', 'materials' and 'lights' to the packed namedtuples and
+            `settings` holding the Scene arguments
+    """
+    try:
+        with open(os.path.join(path, MANIFEST)) as file:
+            manifest = json.load(file)
+    except FileNotFoundError as error:
+        raise ValueError(f"{path!r} isn't a saved scene, it has no {MANIFEST}") from error
+    if manifest.get('format') != FORMAT:
+        raise ValueError(f"{path!r} isn't a saved scene")
+    if manifest['version'] > VERSION:
+        raise ValueError(f"{path!r} uses version {manifest['version']} of the scene format, "
+                         f"this version of spritz reads up to {VERSION}")
+
+    dtype = np.dtype(manifest['precision'])
+    scalars = manifest['scalars']
+    buffers = {}
+    for name, layout in BUFFERS.items():
+        fields = {}
+        for field in layout._fields:
+            key = f"{name}.{field}"
+            if key in scalars:
+                value = scalars[key]
+                fields[field] = dtype.type(value) if isinstance(value, float) else value
+            else:
+                fields[field] = np.load(_array_file(path, name, field), mmap_mode='c' if mmap else None,
+                                        allow_pickle=False)
+        buffers[name] = layout(**fields)
+
+    camera = Camera(**manifest['camera'])
+    camera.u, camera.v, camera.w = (np.array(axis) for axis in manifest['camera_frame'])
+    settings = dict(manifest['settings'], precision=str(dtype))
+    settings['background_color'] = tuple(settings['background_color'])
+    # version 1 scenes have no key
+    environment = manifest.get('environment')
+    if environment is not None:
+        levels = Environment(*(np.load(_array_file(path, 'environment', field), mmap_mode='c' if mmap else None,
+                                       allow_pickle=False) for field in Environment._fields[:-1]),
+                             faces=environment['faces'])
+        settings['environment'] = EnvironmentMap.from_levels(levels, environment['path'])
+    manager = manifest['light_manager']
+    return buffers, camera, settings, None if manager is None else LightManager(**manager)
@@ -0,0 +1,277 @@
+"""Long-running render server, for renders too small to pay for a process each.
+
+Starting a process to render a thumbnail costs more than the render: numba
+and the kernels have to be loaded, and the scene packed. `spritz serve`
+does all of that once. It loads scenes saved by `Scene.save` (mapped, see
+`Scene.load`), renders each one once so its kernels and pages are warm,
+then answers render requests over HTTP, on a TCP port or a Unix socket.
+
+    $ spritz serve --scene city=scenes/city --listen 127.0.0.1:8800
+    $ curl -d '{"scene": "city", "width": 256, "height": 256}' 127.0.0.1:8800/render > city.png
+
+Endpoints:
+    GET /health     200 once the scenes are loaded
+    GET /scenes     JSON list of the scenes and their default settings
+    POST /render    JSON request, see `RenderServer.render`. Answers a PNG, or
+                    with "format": "raw", the (height, width, 3) pixels as
+                    row-major floats, their dtype and shape in the
+                    X-Spritz-Dtype and X-Spritz-Shape headers.
+
+At most `concurrency` renders run at once; up to `queue` more requests
+wait for a turn, and any more are turned away with 503 (and a
+Retry-After). Every answer has a Server-Timing header with the time
+spent queued, rendering and encoding.
+"""
+import copy
+import json
+import os
+import socket
+import socketserver
+import stat
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from .camera import Camera
+from .distributed import parse_address
+from .scene import Scene, sceneio, imageio
+
+CONCURRENCY = 1
+QUEUE = 16
+MAX_PIXELS = 4096 * 4096 # largest image a request may ask for
+PNG_LEVEL = 1 # zlib level of served PNGs, speed over size
+
+class RequestError(ValueError):
+    """Bad render request, answered with its HTTP status"""
+
+    def __init__(self, message, status=HTTPStatus.BAD_REQUEST):
+        super().__init__(message)
+        self.status = status
+
+def _integer(request, key, default):
+    """Integer field of a request, JSON true and false aren't numbers"""
+    value = request.get(key, default)
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise RequestError(f"{key} must be an integer, got {value!r}")
+    return value
+
+class RenderServer:
+    """Scenes kept packed in memory, rendered on request with a bounded number of renders at once.
+
+    Attributes:
+        concurrency (int): renders running at once
+        queue (int): requests allowed to wait for a render slot
+        workers (int): tile threads of every render
+    """
+
+    def __init__(self, scenes, concurrency=CONCURRENCY, queue=QUEUE, workers=1, warm=True):
+        """Load the scenes.
+
+        Args:
+            scenes (dict[str, str | Scene]): scene id to a directory written by `Scene.save`
+                (mapped copy-on-write) or a Scene, which is packed now
+            concurrency (int, optional): renders running at once. Defaults to 1.
+            queue (int, optional): requests waiting for a render slot before more are
+                refused. Defaults to 16.
+            workers (int, optional): tile threads per render, None for one per core. Defaults to 1.
+            warm (bool, optional): render every scene once, tiny, so the first request
+                doesn't pay for loading kernels and pages. Defaults to True.
+        """
+        if concurrency < 1:
+            raise ValueError(f"concurrency must be at least 1, got {concurrency}")
+        self.concurrency = concurrency
+        self.queue = queue
+        self.workers = workers
+        self._slots = threading.Semaphore(concurrency)
+        self._waiting = 0
+        self._lock = threading.Lock()
+
+        self._scenes = {}
+        for name, scene in scenes.items():
+            state = sceneio.load_scene(scene) if isinstance(scene, (str, os.PathLike)) else sceneio.packed_state(scene)
+            self._scenes[name] = state
+            if warm:
+                self._scene(name, state[1], None).render(8, 8)
+
+    def __repr__(self):
+        return f"<RenderServer of {len(self._scenes)} scenes, {self.concurrency} renders at once>"
+
+    def scenes(self):
+        """Ids and default settings of the served scenes
+
+        Returns:
+            list[dict]
+        """
+        return [{
+            'scene': name,
+            'precision': settings['precision'],
+            'bounces': settings['max_bounces'],
+            'camera': {'eye': camera.eye.tolist(), 'direction': (camera.eye - camera.w).tolist(),
+                       'up': camera.v.tolist(), 'fov': camera.fov},
+        } for name, (_, camera, settings, _) in self._scenes.items()]
+
+    def _scene(self, name, camera, bounces):
+        """A Scene of its own for one request, sharing the packed arrays"""
+        buffers, _, settings, manager = self._scenes[name]
+        if bounces is not None:
+            settings = dict(settings, max_bounces=bounces)
+        return Scene._from_packed(buffers, camera, settings, manager)
+
+    def render(self, request):
+        """Render one request.
+
+        Args:
+            request (dict): "scene" (id), and optionally "width" and "height" (default 256),
+                "bounces" (the scene's own by default), "camera" ({"eye", "direction",
+                "up", "fov"}, the scene's own by default, "direction" being a point
+                looked at) and "format" ("png", the default, or "raw")
+
+        Raises:
+            RequestError: if the request is malformed (400), the scene unknown (404),
+                or the queue is full (503)
+
+        Returns:
+            tuple[bytes, dict, dict]: body, headers and the seconds spent per stage
+        """
+        if not isinstance(request, dict):
+            raise RequestError("The request must be a JSON object")
+        name = request.get('scene')
+        if not isinstance(name, str):
+            raise RequestError(f"scene must be a string, got {name!r}")
+        if name not in self._scenes:
+            raise RequestError(f"Unknown scene {name!r}", HTTPStatus.NOT_FOUND)
+        width, height = _integer(request, 'width', 256), _integer(request, 'height', 256)
+        if width < 1 or height < 1 or width * height > MAX_PIXELS:
+            raise RequestError(f"Image size {width}x{height} out of range")
+        output = request.get('format', 'png')
+        if output not in ('png', 'raw'):
+            raise RequestError(f"Unknown format {output!r}, expected 'png' or 'raw'")
+        bounces = request.get('bounces')
+        if bounces is not None and (isinstance(bounces, bool) or not isinstance(bounces, int) or bounces < 0):
+            raise RequestError(f"bounces must be a non-negative integer, got {bounces!r}")
+        camera = copy.copy(self._scenes[name][1])
+        camera.aspect = width / height
+        if request.get('camera') is not None:
+            view = request['camera']
+            try:
+                camera = Camera(view['eye'], view['direction'], view.get('up', (0, 0, 1)), width / height,
+                                view.get('fov', 114))
+            except (KeyError, TypeError, ValueError, AttributeError) as error:
+                raise RequestError(f"Bad camera {view!r}: {error}") from error
+        scene = self._scene(name, camera, bounces)
+
+        seconds = {}
+        start = time.perf_counter()
+        with self._lock:
+            if self._waiting >= self.queue + self.concurrency:
+                raise RequestError("Too many requests queued", HTTPStatus.SERVICE_UNAVAILABLE)
+            self._waiting += 1
+        try:
+            with self._slots:
+                seconds['queue'] = time.perf_counter() - start
+                start = time.perf_counter()
+                pixels = scene.render(width, height, workers=self.workers)
+                seconds['render'] = time.perf_counter() - start
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+        start = time.perf_counter()
+        if output == 'png':
+            body, headers = imageio.encode_png(pixels, PNG_LEVEL), {'Content-Type': 'image/png'}
+        else:
+            body = np.ascontiguousarray(pixels).tobytes()
+            headers = {'Content-Type': 'application/octet-stream', 'X-Spritz-Dtype': str(pixels.dtype),
+                       'X-Spritz-Shape': f"{height},{width},3"}
+        seconds['encode'] = time.perf_counter() - start
+        return body, headers, seconds
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = 'spritz'
+    protocol_version = 'HTTP/1.1' # keep-alive, clients reuse their connection
+
+    def setup(self):
+        super().setup()
+        if self.connection.family != socket.AF_UNIX:
+            # headers and body are written separately, don't let the body wait for an ack
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, True)
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _reply(self, status, body, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, status, value, headers=None):
+        self._reply(status, json.dumps(value).encode(), dict(headers or {}, **{'Content-Type': 'application/json'}))
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._json(HTTPStatus.OK, {'status': 'ok'})
+        elif self.path == '/scenes':
+            self._json(HTTPStatus.OK, self.server.renderer.scenes())
+        else:
+            self._json(HTTPStatus.NOT_FOUND, {'error': f"No endpoint {self.path}"})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        if self.path != '/render':
+            self._json(HTTPStatus.NOT_FOUND, {'error': f"No endpoint {self.path}"})
+            return
+        try:
+            request = json.loads(body or b'{}')
+            image, headers, seconds = self.server.renderer.render(request)
+        except json.JSONDecodeError as error:
+            self._json(HTTPStatus.BAD_REQUEST, {'error': f"Bad JSON: {error}"})
+        except RequestError as error:
+            retry = {'Retry-After': '1'} if error.status == HTTPStatus.SERVICE_UNAVAILABLE else {}
+            self._json(error.status, {'error': str(error)}, retry)
+        except Exception as error:
+            self._json(HTTPStatus.INTERNAL_SERVER_ERROR, {'error': f"{type(error).__name__}: {error}"})
+        else:
+            headers['Server-Timing'] = ', '.join(f"{stage};dur={1000 * t:.2f}" for stage, t in seconds.items())
+            self._reply(HTTPStatus.OK, image, headers)
+
+class _TCPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+if hasattr(socketserver, 'ThreadingUnixStreamServer'):
+    class _UnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+def http_server(renderer, address, verbose=False):
+    """HTTP server answering the requests of a RenderServer. Call `serve_forever()` on it.
+
+    Args:
+        renderer (RenderServer): the scenes to serve
+        address (str): 'host:port' or 'unix:/path'. A socket file left at the
+            path by an earlier server is replaced.
+        verbose (bool, optional): log every request to stderr. Defaults to False.
+
+    Returns:
+        socketserver.BaseServer
+    """
+    family, target = parse_address(address)
+    if family == socket.AF_UNIX:
+        if os.path.exists(target) and stat.S_ISSOCK(os.stat(target).st_mode):
+            os.unlink(target)
+        server = _UnixServer(target, _Handler)
+    else:
+        server = _TCPServer(target, _Handler)
+    server.renderer = renderer
+    server.verbose = verbose
+    return server
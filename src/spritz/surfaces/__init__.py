@@ -14,9 +14,19 @@ from .plane import (
     Plane,
 )
 
+from .mesh import (
+    TriangleMesh,
+)
+
+from .instance import (
+    Instance,
+)
+
 __all__ = [
     "Surface", "SurfaceGroup",
     "Sphere",
     "Triangle",
     "Plane",
+    "TriangleMesh",
+    "Instance",
 ]
\ No newline at end of file
@@ -0,0 +1,101 @@
+import numpy as np
+
+from .surface import Surface, SurfaceGroup
+from .sphere import Sphere
+from .triangle import Triangle
+from .mesh import TriangleMesh
+from ..raytracing import Intersection
+
+class Instance(Surface):
+    """Spritz Instance
+
+    A placement of shared geometry. Many instances can reference the same
+    surface, which is only stored, packed and given a BVH once, however many
+    times it's placed.
+    """
+
+    def __init__(self, geometry, transform=None, material=None):
+        """Place a surface in the scene.
+
+        Args:
+            geometry (Surface): surface to place, a Sphere, Triangle, TriangleMesh
+                or a SurfaceGroup of those. Its coordinates are the instance's object space.
+            transform (ArrayLike, optional): (4, 4) affine object to world transform.
+                Defaults to None (identity).
+            material (Material, optional): material of every surface of the instance.
+                Defaults to None (the geometry's own materials).
+
+        Raises:
+            ValueError: if the transform isn't an invertible affine 4x4 matrix
+        """
+        self.geometry = geometry
+        self.transform = np.eye(4) if transform is None else np.array(transform, dtype=float)
+        self.material = material
+        self.refresh()
+
+    def __repr__(self):
+        return f"<Instance of {self.geometry!r} at ({self.transform[0, 3]}, {self.transform[1, 3]}, {self.transform[2, 3]})>"
+
+    def refresh(self):
+        """Invert the transform again, after it was changed or replaced.
+
+        Raises:
+            ValueError: if the transform isn't an invertible affine 4x4 matrix
+        """
+        transform = self.transform = np.asarray(self.transform, dtype=float)
+        if transform.shape != (4, 4) or not np.allclose(transform[3], (0, 0, 0, 1)):
+            raise ValueError("transform must be a 4x4 affine matrix, with (0, 0, 0, 1) as last row")
+        if np.linalg.det(transform[:3, :3]) == 0:
+            raise ValueError("transform must be invertible")
+        self.inverse = np.linalg.inv(transform)
+
+    def primitives(self):
+        """Surfaces of the placed geometry, for packing.
+
+        Raises:
+            TypeError: if it holds a surface instances can't place (planes, other instances)
+
+        Returns:
+            tuple[list[Sphere], list[Triangle], list[TriangleMesh]]
+        """
+        spheres, triangles, meshes = [], [], []
+        todo = [self.geometry]
+        while todo:
+            surface = todo.pop()
+            if isinstance(surface, SurfaceGroup):
+                todo.extend(reversed(surface.surfaces))
+            elif isinstance(surface, Sphere):
+                spheres.append(surface)
+            elif isinstance(surface, Triangle):
+                triangles.append(surface)
+            elif isinstance(surface, TriangleMesh):
+                meshes.append(surface)
+            else:
+                raise TypeError(f"Can't instance {type(surface).__name__} surfaces")
+        return spheres, triangles, meshes
+
+    def _to_object(self, ray):
+        """The ray in object space. The direction isn't normalized, so t is the same in both spaces."""
+        ray_origin, ray_direction = ray
+        return (self.inverse[:3, :3] @ ray_origin + self.inverse[:3, 3], self.inverse[:3, :3] @ ray_direction)
+
+    def hit(self, ray, t0=0, t1=np.inf):
+        """Closest hit of the placed geometry, with the normal brought back to world space.
+
+        Args:
+            ray (Ray): Ray to check
+            t0 (float): Start of time interval
+            t1 (float): End of time interval
+
+        Returns: None if no hit, otherwise Intersection object
+        """
+        intersection = self.geometry.hit(self._to_object(ray), t0, t1)
+        if intersection is None:
+            return None
+        # normals go through the transpose of the world to object transform
+        normal = self.inverse[:3, :3].T @ intersection.normal
+        surface = intersection.surface if self.material is None else self
+        return Intersection(surface, intersection.t, normal / np.linalg.norm(normal))
+
+    def occluded(self, ray, t0=0, t1=np.inf):
+        return self.geometry.occluded(self._to_object(ray), t0, t1)
@@ -0,0 +1,72 @@
+import numpy as np
+
+from .surface import Surface
+from ..raytracing import Intersection
+
+def face_normals(e1, e2):
+    """Unit normals of triangles from their edges, zero for degenerate ones (which are never hit)"""
+    normals = np.cross(e1, e2)
+    norms = np.linalg.norm(normals, axis=-1, keepdims=True)
+    return np.divide(normals, norms, out=np.zeros_like(normals), where=norms > 0)
+
+class TriangleMesh(Surface):
+    """Spritz Triangle Mesh
+
+    All faces share one vertex buffer and one index buffer, with edges and
+    face normals computed once up front.
+    """
+
+    def __init__(self, vertices, faces, material):
+        """Triangle mesh with vertices indexed by faces.
+
+        Args:
+            vertices (ArrayLike): (V, 3) vertex positions
+            faces (ArrayLike): (F, 3) vertex indices of every face, wound like `Triangle`
+            material (Material): material of every face
+        """
+        self.vertices = np.ascontiguousarray(vertices, dtype=float).reshape(-1, 3)
+        self.faces = np.ascontiguousarray(faces, dtype=np.int64).reshape(-1, 3)
+        self.material = material
+        self.refresh()
+
+    def __repr__(self):
+        return f"<TriangleMesh with {self.vertices.shape[0]} vertices and {self.faces.shape[0]} faces>"
+
+    def refresh(self):
+        """Recompute the edges and normals of the faces, e.g. after moving vertices in place"""
+        v0 = self.vertices[self.faces[:, 0]]
+        self.edges = np.empty((self.faces.shape[0], 2, 3), dtype=float)
+        self.edges[:, 0] = self.vertices[self.faces[:, 1]] - v0
+        self.edges[:, 1] = self.vertices[self.faces[:, 2]] - v0
+
+        self.normals = face_normals(self.edges[:, 0], self.edges[:, 1])
+
+        self._bvh = None
+
+    def _build_bvh(self):
+        from ..engine.hierarchy import Hierarchy # loads the kernels, only once a mesh is hit
+
+        self._bvh = Hierarchy(mesh=self)
+
+    def hit(self, ray, t0=0, t1=np.inf):
+        """Closest face hit by the ray, found through the mesh's own BVH.
+
+        Args:
+            ray (Ray): Ray to check
+            t0 (float): Start of time interval
+            t1 (float): End of time interval
+
+        Returns: None if no hit, otherwise Intersection object
+        """
+        if self._bvh is None:
+            self._build_bvh()
+
+        ray_origin, ray_direction = ray
+        hit = self._bvh.closest(ray_origin, ray_direction, t0, t1)
+        return None if hit is None else Intersection(*hit)
+
+    def occluded(self, ray, t0=0, t1=np.inf):
+        if self._bvh is None:
+            self._build_bvh()
+        ray_origin, ray_direction = ray
+        return self._bvh.occluded(ray_origin, ray_direction, t0, t1)
@@ -31,6 +31,10 @@ class Plane(Surface):
             return None
         return Intersection(self, t, self.normal)
 
+    def occluded(self, ray, t0=0, t1=np.inf):
+        ray_origin, ray_direction = ray
+        return Plane._hit(ray_origin, ray_direction, self.normal, self.point, t0, t1) is not None
+
     @njit(cache=True)
     def _hit(
         ray_origin: np.array,
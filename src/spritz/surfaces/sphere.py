@@ -30,6 +30,24 @@ class Sphere(Surface):
         t, normal = t
         return Intersection(self, t, normal)
 
+    def occluded(self, ray, t0=0, t1=np.inf):
+        ray_origin, ray_direction = ray
+        return Sphere._occludes(self.center, self.radius, ray_origin, ray_direction, t0, t1)
+
+    @njit(cache=True)
+    def _occludes(sphere_center, sphere_radius, ray_origin, ray_direction, t0, t1) -> bool:
+        """Same test as `_hit` without computing the normal"""
+        dist = ray_origin - sphere_center
+        A = np.dot(ray_direction, ray_direction)
+        B = np.dot(ray_direction, dist)
+        C = np.dot(dist, dist) - sphere_radius**2
+
+        discriminant = B**2 - A*C
+        if discriminant < 0:
+            return False
+        dsqrt = np.sqrt(discriminant)
+        return t0 <= (-B - dsqrt) / A <= t1 or t0 <= (-B + dsqrt) / A <= t1
+
     @njit(cache=True)
     def _hit(
         sphere_center: np.array,
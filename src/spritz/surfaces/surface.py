@@ -4,6 +4,8 @@ import numpy as np
 
 from ..raytracing import Intersection
 
+ACCELERATORS = (None, 'linear', 'bvh')
+
 class Surface(ABC):
     """Surface object is the parent class of all surfaces in the engine."""
     
@@ -20,22 +22,67 @@ class Surface(ABC):
         """
         ...
 
+    def occluded(self, ray, t0=0, t1=np.inf) -> bool:
+        """Whether the surface blocks the ray anywhere in [t0, t1].
+
+        Only answers yes or no, so surfaces override this to skip
+        building an Intersection.
+
+        Args:
+            ray (Ray): Ray to check intersection
+            t0 (float): time start
+            t1 (float): time end
+        """
+        return self.hit(ray, t0, t1) is not None
+
+    def refresh(self):
+        """Recompute whatever the surface derived from its attributes, after they were changed in place.
+
+        Called by `Scene.update`. Surfaces that derive nothing have nothing to do.
+        """
+
 class SurfaceGroup(Surface):
     """A group of surfaces. Allows for easy ray-object intersections."""
 
-    def __init__(self, surfaces=None):
+    def __init__(self, surfaces=None, accel=None):
         """Create a new surface group with the given surfaces.
 
         Args:
             surfaces (list[Surface], optional): Initial list of surfaces. Defaults to None.
+            accel (str, optional): 'bvh' puts the spheres and triangles of the group in a
+                bounding volume hierarchy, traversed in compiled code. Planes and any other
+                surfaces stay in a side list that is tested linearly. Defaults to None (linear scan).
         """
+        if accel not in ACCELERATORS:
+            raise ValueError(f"Unknown accelerator {accel!r}, expected one of {ACCELERATORS}")
         if surfaces is None:
             self.surfaces = list()
         else:
             self.surfaces = surfaces
+        self.accel = accel
+        self._bvh = None
 
     def add_surface(self, surface):
         self.surfaces.append(surface)
+        self._bvh = None
+
+    def refresh(self):
+        """Drop the hierarchies of the group and of the groups in it, instanced
+        ones included, they're built again on the next hit"""
+        from .instance import Instance
+
+        self._bvh = None
+        for surface in self.surfaces:
+            if isinstance(surface, Instance):
+                surface = surface.geometry
+            if isinstance(surface, SurfaceGroup):
+                surface.refresh()
+
+    def _build_bvh(self):
+        """Pack the bounded surfaces and build the hierarchy over them."""
+        from ..engine.hierarchy import Hierarchy # loads the kernels, only once a group needs them
+
+        self._bvh = Hierarchy(self.surfaces)
 
     # def __repr__(self):
     #     return f"<Surface Group>\n{'  -'.join([surface.__repr__() for surface in self.surfaces])}"
@@ -48,6 +95,9 @@ class SurfaceGroup(Surface):
             t0 (float, optional): time start. Defaults to 0.
             t1 (float, optional): time end. Defaults to np.inf.
         """
+        if self.accel == 'bvh':
+            return self._hit_bvh(ray, t0, t1)
+
         closest_hit = None
         for surface in self.surfaces:
             curr_hit = surface.hit(ray, t0, t1)
@@ -55,4 +105,45 @@ class SurfaceGroup(Surface):
                 continue
             closest_hit = curr_hit
             t1 = closest_hit.t
+        return closest_hit
+
+    def occluded(self, ray, t0=0, t1=np.inf) -> bool:
+        """Any-hit query, stops at the first surface blocking the ray.
+
+        Args:
+            ray (Ray): Ray to check intersection
+            t0 (float, optional): time start. Defaults to 0.
+            t1 (float, optional): time end. Defaults to np.inf.
+        """
+        others = self.surfaces
+        if self.accel == 'bvh':
+            if self._bvh is None:
+                self._build_bvh()
+            others = self._bvh.others
+            ray_origin, ray_direction = ray
+            if self._bvh.occluded(ray_origin, ray_direction, t0, t1):
+                return True
+
+        for surface in others:
+            if surface.occluded(ray, t0, t1):
+                return True
+        return False
+
+    def _hit_bvh(self, ray, t0, t1):
+        if self._bvh is None:
+            self._build_bvh()
+
+        closest_hit = None
+        ray_origin, ray_direction = ray
+        hit = self._bvh.closest(ray_origin, ray_direction, t0, t1)
+        if hit is not None:
+            closest_hit = Intersection(*hit)
+            t1 = closest_hit.t
+
+        for surface in self._bvh.others:
+            curr_hit = surface.hit(ray, t0, t1)
+            if curr_hit is None:
+                continue
+            closest_hit = curr_hit
+            t1 = closest_hit.t
         return closest_hit
\ No newline at end of file
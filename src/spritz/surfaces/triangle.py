@@ -51,6 +51,38 @@ class Triangle(Surface):
         t, normal = t
         return Intersection(self, t, normal)
 
+    def occluded(self, ray, t0=0, t1=np.inf):
+        ray_origin, ray_direction = ray
+        return Triangle._occludes(ray_origin, ray_direction, self.v1, self.v2, self.v3, t0, t1)
+
+    @njit(cache=True)
+    def _occludes(ray_origin, ray_direction, v1, v2, v3, t0, t1) -> bool:
+        """Same linear system as `_hit`, solved with scalars and without the normal"""
+        a, b, c = v1[0] - v2[0], v1[1] - v2[1], v1[2] - v2[2]
+        d, e, f = v1[0] - v3[0], v1[1] - v3[1], v1[2] - v3[2]
+        g, h, i = ray_direction[0], ray_direction[1], ray_direction[2]
+        j, k, l = v1[0] - ray_origin[0], v1[1] - ray_origin[1], v1[2] - ray_origin[2]
+
+        ei_hf = e*i - h*f
+        gf_di = g*f - d*i
+        dh_eg = d*h - e*g
+        det = a*ei_hf + b*gf_di + c*dh_eg
+        if det == 0:
+            return False
+
+        ak_jb = a*k - j*b
+        jc_al = j*c - a*l
+        bl_kc = b*l - k*c
+
+        t = -(f*ak_jb + e*jc_al + d*bl_kc) / det
+        if not t0 <= t <= t1:
+            return False
+        gamma = (i*ak_jb + h*jc_al + g*bl_kc) / det
+        if not 0 <= gamma <= 1:
+            return False
+        beta = (j*ei_hf + k*gf_di + l*dh_eg) / det
+        return 0 <= beta <= 1 - gamma
+
     @njit(cache=True)
     def _hit(
         ray_origin: np.array,
@@ -13,6 +13,7 @@
 - 10.87,    6.27S - Added NJIT caching to disk (speed-up first run)
 - 10.33,    3.82  - Vectorized ray generation entirely, with NJIT
 - 4.08,     4.49  - With ~6.5 second pre-render (to compile math routines)
+- Pre-render dropped: kernels compile at import and are cached (`spritz warmup`)
 Current Average: 5.98 seconds
 
 Now with reflections (1 bounce) {500px x 500px}
@@ -102,7 +103,7 @@ white_glossy = Material(
 )
 
 # ========== Build Scene =========
-scene = Scene(background_color=BLACK)
+scene = Scene(background_color=BLACK, engine='wavefront')
 
 # Camera
 camera = Camera(
@@ -154,18 +155,6 @@ scene.add_surface(sphere_b)
 scene.add_surface(plane)
 scene.add_surface(tri)
 
-#==========  PRE-RENDER =============
-pre = Scene()
-pre.add_light(PointLight((0, 0, 0), BLACK))
-pre.add_light(AmbientLight(BLACK))
-pre.add_surface(Sphere((0, 0, 0), 1, blank))
-pre.add_surface(Triangle((0, 0, 1), (0, 1, 0), (1, 0, 0), blank))
-pre.add_surface(Plane((0, 0, 1), (0, 0, 0), blank))
-pre_start = time.time()
-pre.render()
-pre_end = time.time()
-print(f"pre-rendered scene in {pre_end - pre_start:.2f} seconds")
-
 if PROFILE:
     with cProfile.Profile() as pr:
         image = scene.render(width=500, height=500)
@@ -183,12 +172,13 @@ if TEST:
     HEIGHT = 1500
     BOUNCES = 2
     SAMPLES = 1
+    WORKERS = None # one per core
 
     #========= RENDER IMAGES ===========
     scene.max_bounces = BOUNCES
     for i in range(SAMPLES):
         render_start = time.time()
-        image = scene.render(WIDTH, HEIGHT)
+        image = scene.render(WIDTH, HEIGHT, workers=WORKERS)
         render_end = time.time()
         t1 = (render_end - render_start)
         print(f"render {i + 1} took {t1:.2f} seconds.")
@@ -257,33 +247,29 @@ if ANIMATE:
     ani.add_light(light_gy)
     ani.add_light(light_bz)
 
-    frame_times = list()
     FRAMES = 240
-    for i in range(34, FRAMES):
-        frame_start = time.time()
-        deg = 360 / FRAMES
-        sqrt_radius = 15
-        x = cos(radians(i*deg))
-        y = sin(radians(i*deg))
-        eye = (sqrt_radius*x, sqrt_radius*y, 4)
-        direction = (-x, -y, -0.5)
-
-        cam = Camera(
-            eye=eye,
-            direction=direction,
-            fov=64,
-            aspect=1.0
-        )
-        ani.change_camera(cam)
-        frame = ani.render(500, 500)
-        Image.fromarray((np.clip(frame, 0, 1) * 255).astype(np.uint8), 'RGB').save(f'ani/frame{i+1}.png')
-
-        frame_end = time.time()
-        frame_times.append(frame_end - frame_start)
-        print(f"Frame {i + 1}: {frame_end - frame_start:.2f} seconds")
+    FIRST = 34
+    def camera_path():
+        for i in range(FIRST, FRAMES):
+            deg = 360 / FRAMES
+            sqrt_radius = 15
+            x = cos(radians(i*deg))
+            y = sin(radians(i*deg))
+            eye = (sqrt_radius*x, sqrt_radius*y, 4)
+            direction = (-x, -y, -0.5)
+
+            yield Camera(
+                eye=eye,
+                direction=direction,
+                fov=64,
+                aspect=1.0
+            )
+
+    # PNGs are written in the background while the next frame renders
+    paths = ani.render_sequence(camera_path(), 'ani/frame{}.png', 500, 500, start=FIRST + 1)
     ani_end = time.time()
-    print(f"{FRAMES} frames finished in: {ani_end - ani_start:.2f} seconds")
-    print(f"Average frame time: {sum(frame_times) / FRAMES:.2f} seconds")
+    print(f"{len(paths)} frames finished in: {ani_end - ani_start:.2f} seconds")
+    print(f"Average frame time: {(ani_end - ani_start) / len(paths):.2f} seconds")
 
 #ffmpeg -framerate 24 -i ani/frame%d.png ani/animation.mp4
 
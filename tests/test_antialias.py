@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from spritz import Scene, Camera, Sphere, Plane, TriangleMesh, PointLight, AmbientLight, Material, BLACK
+from spritz.bench import basic_scene
+
+MATTE = Material((0.1, 0.1, 0.1), (0.6, 0.5, 0.4), (0.0, 0.0, 0.0), 0)
+
+def _scene(engine, *surfaces):
+    scene = Scene(background_color=BLACK, engine=engine, max_bounces=0)
+    scene.change_camera(Camera(eye=(0, -6, 0), direction=(0, 0, 0), fov=60))
+    scene.add_light(PointLight((3, -6, 4), (30, 30, 30)))
+    scene.add_light(AmbientLight((0.2, 0.2, 0.2)))
+    for surface in surfaces:
+        scene.add_surface(surface)
+    return scene
+
+@pytest.mark.parametrize('engine', ['python', 'wavefront'])
+def test_silhouettes_between_surfaces_of_one_material_are_refined(engine):
+    # a wall of the sphere's material fills the rest of the image, and only ids can find the edge
+    scene = _scene(engine, Sphere((0, 0, 0), 1, MATTE), Plane((0, -1, 0), (0, 2, 0), MATTE))
+    single = scene.render(24, 24)
+    refined = scene.render(24, 24, max_samples=4, aa_threshold=1.0)
+    assert np.count_nonzero(np.abs(refined - single).max(axis=2) > 1e-9) > 0
+
+def test_faces_of_one_mesh_are_one_surface():
+    vertices = [(-9, 2, -9), (9, 2, -9), (9, 2, 9), (-9, 2, 9)]
+    scene = _scene('wavefront', TriangleMesh(vertices, [(0, 2, 1), (0, 3, 2)], MATTE))
+    assert np.array_equal(scene.render(24, 24), scene.render(24, 24, max_samples=4, aa_threshold=1.0))
+
+def test_engines_agree_with_antialiasing():
+    wavefront = basic_scene()
+    python = basic_scene()
+    python.engine = 'python'
+    expected = python.render(20, 20, max_samples=4)
+    assert np.abs(wavefront.render(20, 20, max_samples=4) - expected).max() < 1e-9
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from spritz import Scene, Camera, Sphere, Plane, Triangle, SurfaceGroup, PointLight, AmbientLight, Surface
+from spritz.bench import RED, GOLD, FLOOR
+
+def _scene():
+    scene = Scene()
+    scene.change_camera(Camera(eye=(0, -6, 0), direction=(0, 0, 0)))
+    scene.add_light(PointLight((3, -6, 4), (30, 30, 30)))
+    scene.add_light(AmbientLight((0.2, 0.2, 0.2)))
+    scene.add_light(AmbientLight((0.1, 0.0, 0.3)))
+    scene.add_surface(Sphere((1, 2, 3), 0.5, RED))
+    scene.add_surface(SurfaceGroup([Sphere((-1, 0, 0), 2, GOLD), Plane((0, 0, 1), (0, 0, -2), FLOOR)]))
+    scene.add_surface(Triangle((0, 0, 0), (1, 0, 0), (0, 0, 1), RED))
+    return scene
+
+def test_surfaces_materials_and_lights_are_packed():
+    compiled = _scene().compile()
+    g = compiled.geometry
+    assert np.array_equal(g.sphere_center, [(1, 2, 3), (-1, 0, 0)])
+    assert np.array_equal(g.sphere_radius, [0.5, 2])
+    assert np.array_equal(g.plane_point, [(0, 0, -2)])
+    assert np.array_equal(g.triangle_v0, [(0, 0, 0)])
+    assert np.array_equal(g.triangle_e1, [(1, 0, 0)])
+    assert np.array_equal(g.triangle_e2, [(0, 0, 1)])
+    assert np.array_equal(np.abs(g.triangle_normal), [(0, 1, 0)])
+
+    # materials are packed once each, surfaces refer to them by id
+    assert compiled.material_list == [RED, GOLD, FLOOR]
+    assert g.sphere_material.tolist() == [0, 1]
+    assert g.plane_material.tolist() == [2]
+    assert g.triangle_material.tolist() == [0]
+    assert np.array_equal(compiled.materials.diffuse[1], GOLD.diffuse)
+
+    assert np.allclose(compiled.lights.ambient, (0.3, 0.2, 0.5))
+    assert np.array_equal(compiled.lights.point_center, [(3, -6, 4)])
+    for buffer in (g, compiled.materials, compiled.lights):
+        for array in buffer:
+            if isinstance(array, np.ndarray):
+                assert array.flags.c_contiguous
+
+def test_packing_is_kept_until_the_scene_changes():
+    scene = _scene()
+    compiled = scene.compile()
+    scene.change_camera(Camera(eye=(0, -8, 0), direction=(0, 0, 0)))
+    assert scene.compile() is compiled
+    assert np.array_equal(compiled.view.eye, (0, -8, 0))
+    scene.add_surface(Sphere((0, 0, 4), 1, RED))
+    assert scene.compile() is not compiled
+    assert scene.compile().geometry.sphere_center.shape == (3, 3)
+
+class _Custom(Surface):
+    def hit(self, ray, t0=0, t1=np.inf):
+        return None
+
+def test_unknown_surfaces_are_refused():
+    scene = _scene()
+    scene.add_surface(_Custom())
+    with pytest.raises(TypeError):
+        scene.compile()
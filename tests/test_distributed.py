@@ -0,0 +1,63 @@
+import socketserver
+import threading
+
+import numpy as np
+import pytest
+
+from spritz.bench import basic_scene
+from spritz.distributed import Coordinator, worker_server, server_address, receive_message, send_message
+
+class _WrongSize(socketserver.BaseRequestHandler):
+    """A worker answering every tile with the wrong number of pixels"""
+
+    def handle(self):
+        while True:
+            try:
+                message = receive_message(self.request)
+            except ConnectionError:
+                return
+            if message[0] == 'close':
+                return
+            send_message(self.request, ('ready',) if message[0] == 'scene' else ('tile', message[1], np.zeros(5)))
+
+def _start(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+@pytest.fixture
+def workers():
+    servers = []
+    def start(server):
+        servers.append(_start(server))
+        return server_address(server)
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+def _render(coordinator, scene):
+    """Coordinator.render in a thread, so a hang fails the test instead of blocking it"""
+    result = {}
+    def run():
+        try:
+            result['frame'] = coordinator.render(scene, 32, 32, tile_size=16)
+        except Exception as error:
+            result['error'] = error
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(120)
+    assert not thread.is_alive(), "render hung"
+    return result
+
+def test_broken_worker_fails_the_render(workers):
+    address = workers(socketserver.ThreadingTCPServer(('127.0.0.1', 0), _WrongSize))
+    result = _render(Coordinator([address], timeout=10), basic_scene())
+    assert isinstance(result.get('error'), RuntimeError)
+
+def test_tiles_of_a_broken_worker_go_to_the_others(workers):
+    broken = workers(socketserver.ThreadingTCPServer(('127.0.0.1', 0), _WrongSize))
+    good = workers(worker_server('127.0.0.1:0'))
+    scene = basic_scene()
+    result = _render(Coordinator([broken, good], timeout=10), scene)
+    assert 'error' not in result
+    assert np.array_equal(result['frame'], scene.render(32, 32))
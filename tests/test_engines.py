@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+from spritz import Scene, Camera, Sphere, Plane, Triangle, TriangleMesh, PointLight, AmbientLight, GRAY
+from spritz.bench import RED, GOLD, MIRROR, FLOOR
+
+def _scene(engine, lights, bounces, accel=None):
+    scene = Scene(background_color=GRAY, max_bounces=bounces, engine=engine, accel=accel)
+    scene.change_camera(Camera(eye=(4, 8, 1.5), direction=(-1, -3, -0.5)))
+    if lights:
+        scene.add_light(PointLight((10, 3, 0), (25, 25, 25)))
+        scene.add_light(PointLight((-2, 0, 5), (25, 25, 25)))
+        scene.add_light(AmbientLight((0.5, 0.5, 0.5)))
+    scene.add_surface(Sphere((0, 0, 0), 2, RED))
+    scene.add_surface(Sphere((5, 0, 0), 2, GOLD))
+    scene.add_surface(Plane((0, 0, 1), (0, 0, -2), FLOOR))
+    scene.add_surface(Triangle(a=(-3, 2, 3), c=(-1.5, 5, 5), b=(-2, 7, 2), material=MIRROR))
+    scene.add_surface(TriangleMesh([(2, -3, 2), (4, -3, 2), (3, -3, 4)], [(0, 1, 2)], GOLD))
+    return scene
+
+@pytest.mark.parametrize('lights', [True, False])
+@pytest.mark.parametrize('bounces', [0, 2])
+@pytest.mark.parametrize('accel', [None, 'bvh'])
+def test_engines_agree(lights, bounces, accel):
+    python = _scene('python', lights, bounces, accel).render(24, 24)
+    wavefront = _scene('wavefront', lights, bounces, accel).render(24, 24)
+    assert np.abs(wavefront - python).max() < 1e-9
+    assert np.ptp(python) > 0
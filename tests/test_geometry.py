@@ -0,0 +1,25 @@
+import numpy as np
+
+from spritz import Scene, Camera, Triangle, TriangleMesh, Sphere, PointLight, Material, BLACK
+from spritz.engine.geometry import pack_geometry
+
+MATTE = Material((0.1, 0.1, 0.1), (0.6, 0.5, 0.4), (0.0, 0.0, 0.0), 0)
+
+def test_degenerate_triangles_get_zero_normals():
+    collinear = Triangle(a=(0, 0, 0), b=(1, 1, 1), c=(2, 2, 2), material=MATTE)
+    repeated = Triangle(a=(0, 0, 0), b=(0, 0, 0), c=(0, 1, 0), material=MATTE)
+    flat = Triangle(a=(0, 0, 0), b=(1, 0, 0), c=(0, 1, 0), material=MATTE)
+    mesh = TriangleMesh([(0, 0, 0), (1, 0, 0), (2, 0, 0)], [(0, 1, 2)], MATTE)
+    geometry = pack_geometry([], [], [collinear, repeated, flat], lambda s: 0, meshes=[mesh])
+
+    assert np.isfinite(geometry.triangle_normal).all()
+    assert not geometry.triangle_normal[[0, 1, 3]].any()
+    assert np.allclose(np.abs(geometry.triangle_normal[2]), (0, 0, 1))
+
+def test_degenerate_triangle_renders_without_nans():
+    scene = Scene(background_color=BLACK, engine='wavefront')
+    scene.change_camera(Camera(eye=(0, -5, 0), direction=(0, 0, 0)))
+    scene.add_light(PointLight((0, -5, 5), (20, 20, 20)))
+    scene.add_surface(Sphere((0, 2, 0), 1, MATTE))
+    scene.add_surface(Triangle(a=(-1, 0, -1), b=(0, 0, 0), c=(1, 0, 1), material=MATTE))
+    assert np.isfinite(scene.render(16, 16)).all()
@@ -0,0 +1,31 @@
+import os
+import subprocess
+import sys
+
+# Compile time of importing spritz and rendering with every engine and precision
+SCRIPT = """
+from numba.core import event
+
+compiled = []
+with event.install_timer('numba:compile', compiled.append):
+    import spritz
+    from spritz.bench import basic_scene
+
+    scene = basic_scene()
+    for engine, precision in (('wavefront', 'float64'), ('wavefront', 'float32'), ('python', 'float64')):
+        scene.engine, scene.precision = engine, precision
+        scene.render(8, 8)
+print(sum(compiled))
+"""
+
+def _compile_seconds(env):
+    result = subprocess.run([sys.executable, '-c', SCRIPT], env=env, check=True, timeout=1800,
+                            capture_output=True, text=True)
+    return float(result.stdout.split()[-1])
+
+def test_warm_cache_compiles_nothing(pytestconfig):
+    # kept between test runs, only the first one pays for compiling
+    cache = pytestconfig.cache.mkdir('spritz-kernels')
+    env = dict(os.environ, SPRITZ_CACHE_DIR=str(cache), PYTHONPATH=os.pathsep.join(sys.path))
+    _compile_seconds(env) # fills the cache, if it's cold
+    assert _compile_seconds(env) < 0.1
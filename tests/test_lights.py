@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from spritz import LightManager, RenderStats
+from spritz.bench import lights_scene
+
+LIGHTS = 16
+
+def _render(manager):
+    scene = lights_scene(count=LIGHTS)
+    scene.light_manager = manager
+    stats = RenderStats()
+    return scene.render(32, 32, stats=stats), stats
+
+@pytest.mark.parametrize('manager', [
+    LightManager(cutoff=0, cluster_distance=np.inf),
+    LightManager(cutoff=0, cluster_size=1),
+    LightManager(cutoff=0, cluster_distance=np.inf, shadow_budget=LIGHTS),
+], ids=['unclustered', 'single-light-clusters', 'budget-of-every-light'])
+def test_manager_that_drops_nothing_changes_nothing(manager):
+    plain, plain_stats = _render(None)
+    managed, managed_stats = _render(manager)
+    # lights are shaded in cluster order, so sums round differently
+    assert np.allclose(managed, plain, rtol=0, atol=1e-9)
+    assert managed_stats.shadow_rays == plain_stats.shadow_rays
+
+def test_culling_and_sampling_trace_fewer_shadow_rays():
+    plain, plain_stats = _render(None)
+    managed, managed_stats = _render(LightManager(cutoff=1e-2, shadow_budget=4))
+    assert managed_stats.shadow_rays < plain_stats.shadow_rays / 2
+    assert abs(managed.mean() - plain.mean()) < 0.1 * plain.mean()
+
+def test_settings_are_checked():
+    with pytest.raises(ValueError):
+        LightManager(cluster_size=0)
+    with pytest.raises(ValueError):
+        LightManager(shadow_budget=0)
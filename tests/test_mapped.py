@@ -0,0 +1,40 @@
+import os
+
+import numpy as np
+import pytest
+
+from spritz.bench import basic_scene
+from spritz.scene.imageio import MappedImage
+
+@pytest.mark.parametrize('name', ['image.npy', 'image.raw'])
+@pytest.mark.parametrize('workers', [1, 3])
+def test_file_holds_the_render(tmp_path, name, workers):
+    scene = basic_scene()
+    path = os.path.join(tmp_path, name)
+    image = scene.render_to_file(path, 45, 31, workers=workers, tile_size=16)
+    assert image.shape == (31, 45, 3)
+    assert np.array_equal(image, scene.render(45, 31))
+    if name.endswith('.npy'):
+        assert np.array_equal(np.load(path), image)
+
+def test_file_dtype(tmp_path):
+    scene = basic_scene()
+    image = scene.render_to_file(os.path.join(tmp_path, 'image.npy'), 20, 12, tile_size=8, dtype=np.float32)
+    assert image.dtype == np.float32
+    assert np.array_equal(image, scene.render(20, 12).astype(np.float32))
+
+def test_python_engine_is_refused(tmp_path):
+    scene = basic_scene()
+    scene.engine = 'python'
+    with pytest.raises(ValueError):
+        scene.render_to_file(os.path.join(tmp_path, 'image.npy'), 8, 8)
+
+def test_tiles_survive_releasing_the_mapping(tmp_path):
+    # a budget of one tile drops the mapped pages after every write
+    pixels = np.random.default_rng(0).random((10, 12, 3))
+    image = MappedImage(os.path.join(tmp_path, 'image.raw'), 12, 10, budget=1)
+    for y in range(0, 10, 4):
+        for x in range(0, 12, 5):
+            image.write(x, y, pixels[y:y + 4, x:x + 5])
+    image.close()
+    assert np.array_equal(image.open(mode='r'), pixels)
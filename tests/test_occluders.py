@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from spritz import PointLight, RenderStats
+from spritz.bench import mesh_scene, spheres_scene
+
+def _grazing_mesh_scene():
+    # a low light, so the hills cast long shadows
+    scene = mesh_scene(resolution=40)
+    scene.lights[0] = PointLight((12, 0, 2), (150, 150, 150))
+    return scene
+
+SCENES = {
+    'spheres': lambda: spheres_scene(count=300),
+    'mesh': _grazing_mesh_scene,
+}
+
+def _render(name, accel):
+    scene = SCENES[name]()
+    scene.objects.accel = accel
+    stats = RenderStats()
+    return scene.render(48, 48, stats=stats), stats
+
+@pytest.mark.parametrize('name', SCENES)
+def test_occluder_cache_leaves_the_image_unchanged(name):
+    # only shadow queries through a BVH test the last blocker first
+    cached, cached_stats = _render(name, 'bvh')
+    plain, plain_stats = _render(name, None)
+    assert cached_stats.occluder_cache_hits > 0
+    assert plain_stats.occluder_cache_hits == 0
+    assert np.array_equal(cached, plain)
+    assert cached_stats.shadow_hits == plain_stats.shadow_hits
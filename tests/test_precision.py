@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from spritz import RenderStats
+from spritz.bench import basic_scene, mesh_scene, spheres_scene
+
+SCENES = {
+    'basic': basic_scene,
+    'mesh': lambda: mesh_scene(resolution=60),
+    'spheres': lambda: spheres_scene(count=200),
+}
+
+def _render(make_scene, precision):
+    scene = make_scene()
+    scene.precision = precision
+    stats = RenderStats()
+    return scene.render(64, 64, stats=stats), stats
+
+@pytest.mark.parametrize('name', SCENES)
+def test_float32_renders_like_float64(name):
+    exact, exact_stats = _render(SCENES[name], 'float64')
+    single, single_stats = _render(SCENES[name], 'float32')
+    assert single.dtype == np.float32
+    # most pixels are close, a few on silhouettes and highlights hit another surface
+    difference = np.abs(single - exact).max(axis=2)
+    assert difference.mean() < 5e-3
+    assert np.percentile(difference, 95) < 1e-3
+    # shadow rays that start too close to their surface hit it, the acne shows as extra blocked rays
+    assert abs(single_stats.shadow_hits - exact_stats.shadow_hits) <= 0.05 * exact_stats.shadow_hits + 2
@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+
+from spritz.bench import basic_scene
+
+@pytest.mark.parametrize('engine', ['python', 'wavefront'])
+def test_last_pass_is_the_full_render(engine):
+    scene = basic_scene()
+    scene.engine = engine
+    passes = list(scene.render_progressive(37, 23, start=8))
+    assert len(passes) == 4
+    assert all(frame.shape == (23, 37, 3) for frame in passes)
+    assert np.array_equal(passes[-1], scene.render(37, 23))
+
+def test_first_pass_repeats_every_eighth_pixel():
+    scene = basic_scene()
+    first = next(scene.render_progressive(32, 32, start=8))
+    full = scene.render(32, 32)
+    assert np.array_equal(first[::8, ::8], full[::8, ::8])
+    assert np.array_equal(first[:8, :8], np.broadcast_to(full[0, 0], (8, 8, 3)))
+
+def test_start_must_be_a_power_of_two():
+    with pytest.raises(ValueError):
+        next(basic_scene().render_progressive(8, 8, start=3))
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from spritz import RenderStats
+from spritz.bench import bounces_scene
+
+def _render(engine, **settings):
+    scene = bounces_scene(bounces=3)
+    scene.engine = engine
+    for name, value in settings.items():
+        setattr(scene, name, value)
+    stats = RenderStats()
+    return scene.render(32, 32, stats=stats), stats
+
+@pytest.mark.parametrize('engine', ['python', 'wavefront'])
+@pytest.mark.parametrize('depth', [3, 4, 10])
+def test_roulette_past_the_last_bounce_changes_nothing(engine, depth):
+    # no reflection is traced from bounce max_bounces on, so there's nothing to play roulette with
+    plain, plain_stats = _render(engine)
+    played, played_stats = _render(engine, roulette_depth=depth)
+    assert np.array_equal(played, plain)
+    assert played_stats.secondary_rays == plain_stats.secondary_rays
+
+@pytest.mark.parametrize('engine', ['python', 'wavefront'])
+def test_roulette_drops_reflections(engine):
+    plain, plain_stats = _render(engine)
+    played, played_stats = _render(engine, roulette_depth=0)
+    assert played_stats.secondary_rays < plain_stats.secondary_rays
+    # unbiased, the image only gets noisier
+    assert abs(played.mean() - plain.mean()) < 0.05 * plain.mean()
@@ -0,0 +1,54 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from spritz import Scene
+from spritz.scene import sceneio
+from spritz.bench import basic_scene
+
+@pytest.mark.parametrize('mmap', [True, False])
+def test_round_trip_renders_the_same(tmp_path, mmap):
+    scene = basic_scene()
+    expected = scene.render(24, 24)
+    scene.save(tmp_path / 'scene')
+    assert np.array_equal(Scene.load(tmp_path / 'scene', mmap=mmap).render(24, 24), expected)
+
+def test_saving_over_the_loaded_scene(tmp_path):
+    path = tmp_path / 'scene'
+    expected = basic_scene().render(24, 24)
+    basic_scene().save(path)
+    loaded = Scene.load(path)
+    loaded.save(path)
+    assert np.array_equal(loaded.render(24, 24), expected)
+    assert np.array_equal(Scene.load(path).render(24, 24), expected)
+    assert os.listdir(tmp_path) == ['scene']
+
+def test_other_directories_are_not_replaced(tmp_path):
+    (tmp_path / 'notes.txt').write_text('keep me')
+    with pytest.raises(ValueError):
+        basic_scene().save(tmp_path)
+    assert (tmp_path / 'notes.txt').read_text() == 'keep me'
+
+def test_interrupted_save_keeps_the_earlier_one(tmp_path, monkeypatch):
+    path = tmp_path / 'scene'
+    expected = basic_scene().render(24, 24)
+    basic_scene().save(path)
+
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+    monkeypatch.setattr(np, 'save', fail)
+    with pytest.raises(OSError):
+        basic_scene().save(path)
+    assert np.array_equal(Scene.load(path).render(24, 24), expected)
+    assert os.listdir(tmp_path) == ['scene']
+
+def test_newer_versions_are_refused(tmp_path):
+    path = tmp_path / 'scene'
+    basic_scene().save(path)
+    manifest = json.loads((path / 'manifest.json').read_text())
+    manifest['version'] = sceneio.VERSION + 1
+    (path / 'manifest.json').write_text(json.dumps(manifest))
+    with pytest.raises(ValueError, match='version'):
+        Scene.load(path)
@@ -0,0 +1,25 @@
+import os
+
+import numpy as np
+import pytest
+
+from spritz import Camera
+from spritz.bench import basic_scene
+from spritz.scene.imageio import to_rgb8
+
+Image = pytest.importorskip('PIL.Image')
+
+@pytest.mark.parametrize('engine', ['python', 'wavefront'])
+def test_frames_decode_to_the_rendered_images(tmp_path, engine):
+    scene = basic_scene()
+    scene.engine = engine
+    camera = scene.camera
+    path = [Camera(eye=(x, -5, 1), direction=(0, 0, 0), fov=60) for x in (-1.0, 0.0, 1.0, 2.0)]
+    paths = scene.render_sequence(path, os.path.join(tmp_path, 'ani', '{:03d}.png'), 24, 16, encoders=1, start=7)
+
+    assert paths == [os.path.join(tmp_path, 'ani', f'{number:03d}.png') for number in range(7, 11)]
+    assert scene.camera is camera
+    for frame_path, frame_camera in zip(paths, path):
+        scene.change_camera(frame_camera)
+        with Image.open(frame_path) as image:
+            assert np.array_equal(np.asarray(image.convert('RGB')), to_rgb8(scene.render(24, 16)))
@@ -0,0 +1,50 @@
+import http.client
+import json
+import threading
+
+import pytest
+
+from spritz.bench import basic_scene
+from spritz.server import RenderServer, http_server
+
+@pytest.fixture(scope='module')
+def connect():
+    server = http_server(RenderServer({'basic': basic_scene()}, warm=False), '127.0.0.1:0')
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    yield lambda: http.client.HTTPConnection(host, port, timeout=60)
+    server.shutdown()
+    server.server_close()
+
+def _post(connect, body):
+    connection = connect()
+    connection.request('POST', '/render', body if isinstance(body, bytes) else json.dumps(body))
+    response = connection.getresponse()
+    response.read()
+    connection.close()
+    return response.status
+
+def test_render(connect):
+    assert _post(connect, {'scene': 'basic', 'width': 8, 'height': 8, 'format': 'raw'}) == 200
+
+@pytest.mark.parametrize('request_, status', [
+    ({'scene': 'nowhere'}, 404),
+    ({}, 400),
+    (b'{"scene": ', 400),
+    ([1], 400),
+    ('basic', 400),
+    ({'scene': ['basic']}, 400),
+    ({'scene': {'basic': 1}}, 400),
+    ({'scene': 'basic', 'width': 'abc'}, 400),
+    ({'scene': 'basic', 'width': [1]}, 400),
+    ({'scene': 'basic', 'height': 8.5}, 400),
+    ({'scene': 'basic', 'height': True}, 400),
+    ({'scene': 'basic', 'width': 0}, 400),
+    ({'scene': 'basic', 'bounces': True}, 400),
+    ({'scene': 'basic', 'bounces': -1}, 400),
+    ({'scene': 'basic', 'format': 'gif'}, 400),
+    ({'scene': 'basic', 'camera': [1, 2]}, 400),
+    ({'scene': 'basic', 'camera': {'eye': (0, 0, 0)}}, 400),
+])
+def test_bad_requests(connect, request_, status):
+    assert _post(connect, request_) == status
@@ -0,0 +1,43 @@
+from spritz import Scene, Camera, Sphere, PointLight, Material, RenderStats, BLACK
+
+MATTE = Material((0.1, 0.1, 0.1), (0.6, 0.5, 0.4), (0.0, 0.0, 0.0), 0)
+SHINY = Material((0.1, 0.1, 0.1), (0.3, 0.3, 0.3), (0.5, 0.5, 0.5), 8)
+
+def _stats(material, **settings):
+    scene = Scene(background_color=BLACK, engine='wavefront', **settings)
+    scene.change_camera(Camera(eye=(0, -6, 0), direction=(0, 0, 0), fov=60))
+    scene.add_light(PointLight((3, -6, 4), (30, 30, 30)))
+    scene.add_surface(Sphere((0, 0, 0), 1, material))
+    stats = RenderStats()
+    scene.render(16, 16, stats=stats)
+    assert stats.hits > 0
+    return stats
+
+def test_matte_hits_are_not_terminated():
+    assert _stats(MATTE, max_bounces=0).terminated_rays == 0
+
+def test_reflections_cut_by_max_bounces_are_terminated():
+    stats = _stats(SHINY, max_bounces=0)
+    assert stats.terminated_rays == stats.hits
+
+def test_reflections_dropped_by_min_weight_are_terminated():
+    stats = _stats(SHINY, max_bounces=3, min_weight=0.6)
+    assert stats.secondary_rays == 0
+    assert stats.terminated_rays == stats.hits
+
+def test_engines_count_the_same_rays():
+    # the 'python' engine counts rays, not intersection tests or time
+    counted = {}
+    for engine in ('python', 'wavefront'):
+        scene = Scene(background_color=BLACK, engine=engine, max_bounces=2)
+        scene.change_camera(Camera(eye=(0, -6, 0), direction=(0, 0, 0), fov=60))
+        scene.add_light(PointLight((3, -6, 4), (30, 30, 30)))
+        scene.add_light(PointLight((-3, 2, 4), (30, 30, 30)))
+        scene.add_surface(Sphere((0, 0, 0), 1, SHINY))
+        scene.add_surface(Sphere((1.5, -3, 2), 0.5, MATTE)) # shadows the shiny one
+        stats = RenderStats()
+        scene.render(16, 16, max_samples=4, stats=stats)
+        counted[engine] = {name: getattr(stats, name) for name in (
+            'primary_rays', 'shadow_rays', 'secondary_rays', 'hits', 'shadow_hits', 'terminated_rays')}
+    assert counted['python'] == counted['wavefront']
+    assert counted['python']['shadow_hits'] > 0 and counted['python']['secondary_rays'] > 0
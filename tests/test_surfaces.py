@@ -0,0 +1,35 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from spritz import SurfaceGroup, Sphere, TriangleMesh, Material
+
+MATTE = Material((0.1, 0.1, 0.1), (0.6, 0.5, 0.4), (0.0, 0.0, 0.0), 0)
+
+def _rays(count, seed=5):
+    rng = np.random.default_rng(seed)
+    origins = rng.uniform(-12, 12, (count, 3))
+    return [(o, d) for o, d in zip(origins, rng.normal(size=(count, 3)))]
+
+def test_threads_share_a_group_and_a_mesh():
+    rng = np.random.default_rng(3)
+    group = SurfaceGroup([Sphere(c, r, MATTE) for c, r in zip(rng.uniform(-10, 10, (400, 3)),
+                                                               rng.uniform(0.2, 1.0, 400))], accel='bvh')
+    mesh = TriangleMesh(rng.uniform(-10, 10, (600, 3)), rng.integers(0, 600, (400, 3)), MATTE)
+    rays = _rays(4000)
+
+    def query(ray):
+        return group.occluded(ray, 0, 5.0), mesh.occluded(ray, 0, 5.0)
+
+    expected = [query(ray) for ray in rays]
+    with ThreadPoolExecutor(8) as pool:
+        for _ in range(3):
+            assert list(pool.map(query, rays)) == expected
+
+def test_occluded_agrees_with_hit():
+    rng = np.random.default_rng(8)
+    spheres = [Sphere(c, r, MATTE) for c, r in zip(rng.uniform(-8, 8, (50, 3)), rng.uniform(0.5, 3.0, 50))]
+    mesh = TriangleMesh(rng.uniform(-10, 10, (60, 3)), rng.integers(0, 60, (40, 3)), MATTE)
+    for surface in (*spheres, SurfaceGroup(list(spheres), accel='bvh'), mesh):
+        for ray in _rays(300):
+            assert surface.occluded(ray, 0, 5.0) == (surface.hit(ray, 0, 5.0) is not None)
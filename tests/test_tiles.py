@@ -0,0 +1,37 @@
+import threading
+
+import numpy as np
+import pytest
+
+from spritz.bench import basic_scene
+from spritz.engine.tiles import split_tiles, TileScheduler
+
+def test_tiles_cover_the_image_once():
+    covered = np.zeros((23, 37), dtype=int)
+    for x0, y0, x1, y1 in split_tiles(37, 23, 16):
+        covered[y0:y1, x0:x1] += 1
+    assert (covered == 1).all()
+
+def test_scheduler_hands_out_every_tile_once():
+    tiles = list(range(200))
+    scheduler = TileScheduler(tiles, 4)
+    taken = [[] for _ in range(4)]
+
+    def work(worker):
+        while (tile := scheduler.next(worker)) is not None:
+            taken[worker].append(tile)
+
+    threads = [threading.Thread(target=work, args=(k,)) for k in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(sum(taken, [])) == tiles
+
+@pytest.mark.parametrize('precision', ['float64', 'float32'])
+def test_parallel_tiles_render_the_same_image(precision):
+    scene = basic_scene()
+    scene.precision = precision
+    expected = scene.render(37, 23, workers=1)
+    assert np.array_equal(scene.render(37, 23, workers=4, tile_size=16), expected)
+    assert np.array_equal(scene.render(37, 23, workers=4, tile_size=5), expected)
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from spritz import Scene, Camera, Sphere, Triangle, TriangleMesh, SurfaceGroup, Instance, PointLight, Material, BLACK
+
+SHINY = Material((0.1, 0.1, 0.1), (0.6, 0.5, 0.4), (0.3, 0.3, 0.3), 8)
+
+def _scene(engine='wavefront'):
+    scene = Scene(background_color=BLACK, engine=engine, accel='bvh', max_bounces=1)
+    scene.change_camera(Camera(eye=(0, -8, 1), direction=(0, 0, 0), fov=60))
+    scene.add_light(PointLight((3, -6, 4), (30, 30, 30)))
+    return scene
+
+def test_refit_matches_a_fresh_compile():
+    scene = _scene()
+    spheres = [Sphere((x, 0, 0), 0.5, SHINY) for x in (-2, 0, 2)]
+    triangle = Triangle((-3, 2, -1), (3, 2, -1), (0, 2, 3), SHINY)
+    mesh = TriangleMesh([(-3, 1, -2), (3, 1, -2), (0, 1, -1)], [(0, 1, 2)], SHINY)
+    for surface in (*spheres, triangle, mesh):
+        scene.add_surface(surface)
+    scene.render(24, 24)
+    compiled = scene.compile()
+
+    spheres[0].center = np.array((-1.5, -1.0, 0.5))
+    spheres[2].radius = 0.8
+    triangle.v3 = np.array((0.0, 2.0, 2.0))
+    mesh.vertices = mesh.vertices + (0, 0, 0.5)
+    scene.update(spheres[0], spheres[2], triangle, mesh)
+    assert scene.compile() is compiled # refitted, not packed again
+    refitted = scene.render(24, 24)
+
+    scene._compiled = None
+    assert np.array_equal(scene.render(24, 24), refitted)
+
+def test_python_engine_sees_moves_inside_instances():
+    sphere = Sphere((0, 0, 0), 0.5, SHINY)
+    group = SurfaceGroup([sphere, Sphere((1, 0, 0), 0.3, SHINY)], accel='bvh')
+    scenes = [_scene(engine) for engine in ('python', 'wavefront')]
+    for scene in scenes:
+        scene.add_surface(Instance(group, np.diag((1.0, 1.0, 1.0, 1.0))))
+    before = scenes[0].render(16, 16)
+
+    sphere.center = np.array((-1.5, 0.0, 0.5))
+    for scene in scenes:
+        scene.update(sphere)
+    python, wavefront = (scene.render(16, 16) for scene in scenes)
+    assert not np.allclose(python, before)
+    assert np.abs(python - wavefront).max() < 1e-9
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from spritz import Camera, RenderStats, VisibilityCache
+from spritz.bench import basic_scene
+
+MOVED = Camera(eye=(2, 9, 2.5), direction=(-0.5, -3, -0.7))
+
+def _render(cache=None, camera=None):
+    scene = basic_scene()
+    scene.visibility_cache = cache
+    if camera is not None:
+        scene.change_camera(camera)
+    stats = RenderStats()
+    return scene, scene.render(48, 48, stats=stats), stats
+
+def test_tiny_cells_leave_the_image_unchanged():
+    # a cell per hit point, nothing is shared between pixels
+    _, plain, _ = _render()
+    _, cached, _ = _render(VisibilityCache(cell_size=1e-6))
+    assert np.array_equal(cached, plain)
+
+def test_cells_only_change_shadow_edges():
+    _, plain, _ = _render()
+    _, cached, stats = _render(VisibilityCache())
+    assert stats.visibility_cache_hits > 0
+    changed = np.abs(cached - plain).max(axis=2) > 1e-9
+    assert changed.mean() < 0.02
+
+@pytest.mark.parametrize('cell_size', [1e-6, 0.1])
+def test_camera_only_render_reuses_the_cache(cell_size):
+    cache = VisibilityCache(cell_size=cell_size)
+    scene, _, first = _render(cache)
+    scene.change_camera(MOVED)
+    stats = RenderStats()
+    moved = scene.render(48, 48, stats=stats)
+
+    _, fresh, _ = _render(VisibilityCache(cell_size=cell_size), MOVED)
+    if cell_size < 1e-3:
+        # the new hit points miss the old cells, but looking them up mustn't change anything
+        assert np.array_equal(moved, fresh)
+    else:
+        assert stats.visibility_cache_hits > 0
+        assert stats.shadow_rays < first.shadow_rays
+        # cells seen from both cameras keep the answer of the first render
+        assert (np.abs(moved - fresh).max(axis=2) > 1e-9).mean() < 0.02
+
+def test_same_camera_traces_no_shadow_rays():
+    scene, first, _ = _render(VisibilityCache())
+    stats = RenderStats()
+    again = scene.render(48, 48, stats=stats)
+    assert stats.shadow_rays == 0
+    assert np.array_equal(again, first)